@@ -0,0 +1,90 @@
+"""
+Time and peak-memory curves of the core operations, from a single vehicle
+up to 10,000 vehicles plus the bundled real-world attachments.
+
+Each benchmark fails if its median time or peak memory exceeds the budget
+stored in budgets.json; see conftest.py for the options.
+"""
+
+from functools import partial
+
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.meta_file_handler import MetaFileHandler
+
+from conftest import peak_memory_mb, rounds_for
+
+
+def _open_resolver(fresh_pair):
+    carcols, carvariations = fresh_pair()
+    return ConflictResolver(str(carcols), str(carvariations))
+
+
+# Setups for peak_memory_mb: run in the measuring process, return the operation
+
+def _load_operation(carcols):
+    return partial(MetaFileHandler(cache_dir=None).load_meta_file, carcols)
+
+
+def _resolver_operation(method, carcols, carvariations):
+    return getattr(ConflictResolver(carcols, carvariations), method)
+
+
+def _save_operation(carcols, target):
+    handler = MetaFileHandler(cache_dir=None)
+    root, _ = handler.load_meta_file(carcols)
+    return partial(handler.save_meta_file, target, root)
+
+
+def _pair_args(fresh_pair):
+    return tuple(str(path) for path in fresh_pair())
+
+
+def test_load_meta_file(benchmark, check_budget, case, fresh_pair):
+    handler = MetaFileHandler(cache_dir=None)
+
+    def setup():
+        carcols, _ = fresh_pair()
+        return (str(carcols),), {}
+
+    benchmark.pedantic(handler.load_meta_file, setup=setup, rounds=rounds_for(case))
+    check_budget(peak_memory_mb(_load_operation, *setup()[0]))
+
+
+def test_get_existing_ids(benchmark, check_budget, case, fresh_pair):
+    resolver = _open_resolver(fresh_pair)
+
+    benchmark.pedantic(resolver.get_existing_ids, rounds=rounds_for(case))
+    check_budget(peak_memory_mb(_resolver_operation, 'get_existing_ids', *_pair_args(fresh_pair)))
+
+
+def test_get_vehicle_list(benchmark, check_budget, case, fresh_pair):
+    resolver = _open_resolver(fresh_pair)
+
+    benchmark.pedantic(resolver.get_vehicle_list, rounds=rounds_for(case))
+    check_budget(peak_memory_mb(_resolver_operation, 'get_vehicle_list', *_pair_args(fresh_pair)))
+
+
+def test_resolve_carcols_conflicts(benchmark, check_budget, case, fresh_pair):
+    def setup():
+        return (_open_resolver(fresh_pair),), {}
+
+    benchmark.pedantic(lambda resolver: resolver.resolve_carcols_conflicts(), setup=setup, rounds=rounds_for(case))
+    check_budget(peak_memory_mb(_resolver_operation, 'resolve_carcols_conflicts', *_pair_args(fresh_pair)))
+
+
+def test_resolve_modkit_conflicts(benchmark, check_budget, case, fresh_pair):
+    def setup():
+        return (_open_resolver(fresh_pair),), {}
+
+    benchmark.pedantic(lambda resolver: resolver.resolve_modkit_conflicts(), setup=setup, rounds=rounds_for(case))
+    check_budget(peak_memory_mb(_resolver_operation, 'resolve_modkit_conflicts', *_pair_args(fresh_pair)))
+
+
+def test_save_meta_file(benchmark, check_budget, case, fresh_pair, tmp_path):
+    handler = MetaFileHandler(cache_dir=None)
+    carcols, _ = fresh_pair()
+    root, _ = handler.load_meta_file(str(carcols))
+    target = str(tmp_path / 'saved.meta')
+
+    benchmark.pedantic(handler.save_meta_file, args=(target, root), rounds=rounds_for(case))
+    check_budget(peak_memory_mb(_save_operation, str(carcols), target))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+Scaling benchmark for ConflictResolver.resolve_carcols_conflicts.
+
+Compares the indexed resolver against the previous per-siren ``.//id`` scan
+on synthetic meta files of doubling size. A linear algorithm shows a time
+ratio of ~2x per doubling, a quadratic one ~4x.
+
+Usage:
+    python benchmarks/bench_resolver_scaling.py [--max-vehicles 3200]
+"""
+
+import argparse
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.synthetic import write_meta_pair
+
+
+def legacy_resolve(resolver: ConflictResolver) -> int:
+    """Previous algorithm: rescan every carcols id for each sirenSettings."""
+    changed = 0
+    for item in resolver.carvariations_root.findall(".//variationData/Item"):
+        for siren in item.findall("sirenSettings"):
+            old_id = siren.attrib['value']
+            new_id = str(resolver.id_generator.generate_carcols_id())
+            siren.attrib['value'] = new_id
+            for id_elem in resolver.carcols_root.findall(".//id"):
+                if id_elem.attrib.get('value') == old_id:
+                    id_elem.attrib['value'] = new_id
+                    changed += 1
+    return changed
+
+
+def indexed_resolve(resolver: ConflictResolver) -> int:
+    """Current algorithm, with saving disabled so only resolution is timed."""
+    resolver.autosave = False
+    return len(resolver.resolve_carcols_conflicts()['carcols'])
+
+
+def time_run(func, carcols: Path, carvariations: Path) -> float:
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+    start = time.perf_counter()
+    func(resolver)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--min-vehicles', type=int, default=100)
+    parser.add_argument('--max-vehicles', type=int, default=3200)
+    args = parser.parse_args()
+
+    logging.getLogger('meta_tool').setLevel(logging.WARNING)
+
+    print(f"{'vehicles':>9} {'legacy (s)':>11} {'ratio':>6} {'indexed (s)':>12} {'ratio':>6}")
+    previous = None
+    vehicles = args.min_vehicles
+    with tempfile.TemporaryDirectory() as tmp:
+        while vehicles <= args.max_vehicles:
+            carcols, carvariations = write_meta_pair(Path(tmp) / str(vehicles), vehicles)
+            legacy = time_run(legacy_resolve, carcols, carvariations)
+            indexed = time_run(indexed_resolve, carcols, carvariations)
+            if previous:
+                legacy_ratio = f"{legacy / previous[0]:5.1f}x"
+                indexed_ratio = f"{indexed / previous[1]:5.1f}x"
+            else:
+                legacy_ratio = indexed_ratio = "     -"
+            print(f"{vehicles:>9} {legacy:>11.4f} {legacy_ratio:>6} {indexed:>12.4f} {indexed_ratio:>6}")
+            previous = (legacy, indexed)
+            vehicles *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Fixtures and budget checks for the pytest-benchmark suite.
+
+Usage:
+    pytest benchmarks/                                   # run and check budgets
+    pytest benchmarks/ --max-vehicles 1000               # skip the largest inputs
+    pytest benchmarks/ --benchmark-json=curves.json      # keep the time curves
+    pytest benchmarks/ --update-budgets                  # re-baseline budgets.json
+"""
+
+import gc
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from meta_tool.meta_file_handler import MetaFileHandler
+from meta_tool.synthetic import write_meta_pair
+
+ROOT = Path(__file__).resolve().parent.parent
+ATTACHMENTS = ROOT / 'attachments'
+BUDGETS_PATH = Path(__file__).resolve().parent / 'budgets.json'
+
+# Synthetic pack sizes, in vehicles; 'attachments' is the bundled real-world pair
+VEHICLE_COUNTS = (1, 100, 1000, 10000)
+CASES = ('attachments',) + tuple(f'synthetic-{count}' for count in VEHICLE_COUNTS)
+
+# Budgets are re-baselined at measured value x headroom, to absorb machine
+# noise; the floors keep sub-millisecond and tiny-allocation cases from flaking
+BUDGET_HEADROOM = 2.0
+MIN_TIME_BUDGET = 0.01
+MIN_MEMORY_BUDGET = 8.0
+
+
+def pytest_addoption(parser):
+    parser.addoption('--max-vehicles', type=int, default=max(VEHICLE_COUNTS),
+                     help='Largest synthetic pack to benchmark')
+    parser.addoption('--update-budgets', action='store_true',
+                     help='Write the measured times and memory peaks to budgets.json instead of checking them')
+
+
+def case_vehicles(case):
+    return int(case.split('-')[1]) if case.startswith('synthetic-') else None
+
+
+@pytest.fixture(params=CASES)
+def case(request):
+    vehicles = case_vehicles(request.param)
+    if vehicles is not None and vehicles > request.config.getoption('--max-vehicles'):
+        pytest.skip(f"{vehicles} vehicles is above --max-vehicles")
+    return request.param
+
+
+@pytest.fixture(scope='session')
+def sources(tmp_path_factory):
+    """Return a function mapping a case to its pristine (carcols, carvariations) pair."""
+    generated = {}
+
+    def get(case):
+        if case == 'attachments':
+            return ATTACHMENTS / 'carcols.meta', ATTACHMENTS / 'carvariations.meta'
+        if case not in generated:
+            generated[case] = write_meta_pair(tmp_path_factory.mktemp(case), case_vehicles(case))
+        return generated[case]
+
+    return get
+
+
+@pytest.fixture
+def fresh_pair(sources, case, tmp_path):
+    """Return a function that copies the case's pair into a new directory, for benchmarks that write."""
+    counter = iter(range(1 << 30))
+
+    def copy():
+        target = tmp_path / str(next(counter))
+        target.mkdir()
+        pair = []
+        for source in sources(case):
+            pair.append(target / source.name)
+            shutil.copyfile(source, pair[-1])
+        # Parsed trees are cached per path; every round must parse for real
+        MetaFileHandler.documents.clear()
+        return tuple(pair)
+
+    return copy
+
+
+def rounds_for(case):
+    vehicles = case_vehicles(case)
+    if vehicles is None or vehicles <= 100:
+        return 20
+    return 5 if vehicles <= 1000 else 3
+
+
+def _status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise ValueError(f"{field} missing from /proc/self/status")
+
+
+def _measure_child(conn, setup, args):
+    try:
+        fn = setup(*args)
+        gc.collect()
+        # Writing 5 resets the peak (VmHWM) to the current resident size
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        start = _status_kb('VmRSS')
+        fn()
+        conn.send((_status_kb('VmHWM') - start) * 1024)
+    except OSError:
+        conn.send(None)
+
+
+def peak_memory_mb(setup, *args):
+    """
+    Measure how far one operation raises peak resident memory.
+
+    setup(*args) runs in a freshly spawned process and returns the
+    operation as a callable; only the operation is measured. A fresh
+    process starts from the same heap every run, where a forked one would
+    inherit whatever free memory earlier benchmarks left behind, and RSS
+    counts the memory libxml2 allocates (invisible to tracemalloc). setup
+    must be a module-level function and args picklable.
+
+    Returns:
+        Peak growth in MB, or None where /proc cannot reset the peak (e.g. not Linux)
+    """
+    if not os.path.exists('/proc/self/clear_refs'):
+        return None
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_child, args=(sender, setup, args))
+    process.start()
+    peak = receiver.recv()
+    process.join()
+    if peak is None:
+        return None
+    return max(peak, 0) / 2 ** 20
+
+
+def pytest_configure(config):
+    config._bench_results = {}
+
+
+def pytest_sessionfinish(session):
+    if not session.config.getoption('--update-budgets', default=False):
+        return
+    results = session.config._bench_results
+    if not results:
+        return
+    budgets = json.loads(BUDGETS_PATH.read_text()) if BUDGETS_PATH.exists() else {}
+    for name, (median, peak) in results.items():
+        budgets[name] = {'median_s': round(max(median * BUDGET_HEADROOM, MIN_TIME_BUDGET), 6)}
+        if peak is not None:
+            budgets[name]['peak_mb'] = round(max(peak * BUDGET_HEADROOM, MIN_MEMORY_BUDGET), 1)
+    BUDGETS_PATH.write_text(json.dumps(dict(sorted(budgets.items())), indent=2) + '\n')
+
+
+@pytest.fixture
+def check_budget(request, benchmark):
+    """
+    Record a benchmark's peak memory and compare it and its median time to budgets.json.
+
+    Call after the benchmark ran, with the result of peak_memory_mb.
+    """
+    name = request.node.name
+    budgets = json.loads(BUDGETS_PATH.read_text()) if BUDGETS_PATH.exists() else {}
+
+    def check(peak_mb):
+        if benchmark.disabled:
+            return
+        median = benchmark.stats.stats.median
+        benchmark.extra_info['peak_mb'] = peak_mb
+        request.config._bench_results[name] = (median, peak_mb)
+        if request.config.getoption('--update-budgets'):
+            return
+
+        budget = budgets.get(name)
+        if budget is None:
+            pytest.fail(f"No budget for {name}; run with --update-budgets to record one")
+        assert median <= budget['median_s'], (
+            f"{name}: median {median:.4f}s exceeds budget {budget['median_s']:.4f}s"
+        )
+        if peak_mb is not None and 'peak_mb' in budget:
+            assert peak_mb <= budget['peak_mb'], (
+                f"{name}: peak {peak_mb:.1f} MB exceeds budget {budget['peak_mb']:.1f} MB"
+            )
+
+    return check
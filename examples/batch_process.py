@@ -2,6 +2,7 @@
 Example script demonstrating how to resolve conflicts for all vehicles.
 """
 from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.session import ResolverSession
 from pathlib import Path
 import logging
 
@@ -19,14 +20,18 @@ def main():
     # Process all vehicles
     print("\nProcessing all vehicles...")
 
-    # Resolve carcols conflicts
-    carcols_changes = resolver.resolve_carcols_conflicts()
+    # Both resolutions share one load; the files are backed up and written once at the end
+    with ResolverSession(resolver) as session:
+        # Resolve carcols conflicts
+        carcols_changes = session.resolve_carcols()
+
+        # Resolve modkit conflicts
+        modkit_changes = session.resolve_modkits()
+
     print("\nCarcols changes:")
     print(f"Changed {len(carcols_changes['carcols'])} IDs in carcols.meta")
     print(f"Changed {len(carcols_changes['variations'])} IDs in carvariations.meta")
 
-    # Resolve modkit conflicts
-    modkit_changes = resolver.resolve_modkit_conflicts()
     print("\nModkit changes:")
     print(f"Changed {len(modkit_changes['carcols'])} modkit IDs in carcols.meta")
     print(f"Changed {len(modkit_changes['variations'])} modkit IDs in carvariations.meta")
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+
+"""
+Local ID allocation service shared by concurrent tool runs.
+
+Every IDGenerator draws random IDs on its own, so two developers or CI jobs
+adding vehicles at the same time can hand out the same new ID. Pointing
+them at one AllocatorServer (see the `serve-allocator` command) makes the
+service the single owner of the set of used IDs: RemoteIDGenerator claims
+IDs from it in batches over HTTP/JSON on localhost.
+
+The protocol is HTTP/1.1 with keep-alive, one POST per batch:
+
+    /allocate  {"range": [low, high], "count": n, "block": false, "client": c} -> {"ids": [...]}
+    /reserve   {"ids": [...], "client": c} -> {"reserved": [IDs that were free and are now claimed]}
+    /release   {"ids": [...], "client": c} -> {"released": n}
+    /check     {"ids": [...]}  -> {"used": [IDs already claimed]}
+    /status    {}              -> {"used": number of claimed IDs}
+
+Errors are answered with status 409 and {"error": message}.
+
+Each AllocatorClient sends a random client token. A client may only
+release IDs it claimed itself and nobody else asked for since: an ID
+another client reserved too is in someone else's files, and the IDs the
+service was started with are never released.
+
+Claims and releases are appended to a state file as they happen, so a
+restarted service picks up where it stopped; the file is rewritten as one
+snapshot on a clean shutdown. Appends are flushed but not fsynced, which
+keeps a batch well under a millisecond; a power loss can lose the last
+claims, a crash of the service cannot. Which client claimed an ID is
+only kept in memory, so after a restart no claim can be released.
+
+Example:
+    server = AllocatorServer(('127.0.0.1', 8765), AllocatorState('ids.jsonl'))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    generator = RemoteIDGenerator('http://127.0.0.1:8765', existing_ids={10001})
+    print(generator.generate_carcols_ids(3))
+"""
+
+import http.client
+import json
+import logging
+import socket
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from .backup_store import atomic_write
+from .id_generator import CARCOLS_ID_RANGE, MODKIT_ID_RANGE, IDGenerator, IdAllocator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALLOCATOR_PORT = 8765
+
+
+class AllocatorState:
+    """The used IDs of a server, with one IdAllocator per requested range."""
+
+    def __init__(self, state_path: Optional[str] = None, used: Iterable[int] = ()):
+        """
+        Args:
+            state_path: Journal of claims and releases; None keeps the state in memory only
+            used: IDs that are always taken, e.g. the registry's
+        """
+        self.state_path = Path(state_path) if state_path else None
+        self.used: Set[int] = set(used)
+        # Given again on every start, so not written to the state file
+        self._seeded = frozenset(self.used)
+        # Claimed ID -> client token allowed to release it; seeded and shared IDs have none
+        self._owners: Dict[int, str] = {}
+        self._allocators: Dict[Tuple[int, int], IdAllocator] = {}
+        self._lock = threading.Lock()
+        self._journal = None
+
+        if self.state_path is not None:
+            if self.state_path.exists():
+                self._replay()
+            self._journal = open(self.state_path, 'a', encoding='utf-8')
+
+    def _replay(self) -> None:
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if 'claim' in entry:
+                        self.used.update(entry['claim'])
+                    else:
+                        self.used.difference_update(entry['release'])
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Failed to read allocator state {self.state_path}: {str(e)}")
+
+    def _log(self, action: str, ids: List[int]) -> None:
+        if self._journal is not None and ids:
+            self._journal.write(json.dumps({action: ids}) + '\n')
+            self._journal.flush()
+
+    def _allocator(self, low: int, high: int) -> IdAllocator:
+        allocator = self._allocators.get((low, high))
+        if allocator is None:
+            allocator = self._allocators[(low, high)] = IdAllocator(low, high, used=self.used)
+        return allocator
+
+    def _claim(self, ids: List[int], client: Optional[str]) -> None:
+        # Every range sees every claim, as in IDGenerator
+        self.used.update(ids)
+        if client is not None:
+            self._owners.update((id_value, client) for id_value in ids)
+        for allocator in self._allocators.values():
+            for id_value in ids:
+                allocator.reserve(id_value)
+        self._log('claim', ids)
+
+    def allocate(self, id_range: Tuple[int, int], count: int, block: bool = False,
+                 client: Optional[str] = None) -> List[int]:
+        """
+        Claim count free IDs from a range, at random or as one consecutive block.
+
+        Args:
+            id_range: Inclusive (low, high) range to claim from
+            count: Number of IDs to claim
+            block: Claim consecutive IDs
+            client: Token of the claiming client, which may release the IDs again
+
+        Raises:
+            ValueError: If the range does not have that many free IDs
+        """
+        with self._lock:
+            allocator = self._allocator(*id_range)
+            if block:
+                start = allocator.allocate_block(count)
+                ids = list(range(start, start + count))
+            else:
+                ids = allocator.allocate_many(count)
+            self._claim(ids, client)
+            return ids
+
+    def reserve(self, ids: Iterable[int], client: Optional[str] = None) -> List[int]:
+        """
+        Claim specific IDs; returns those that were free.
+
+        An ID another client claimed first is in use twice now, so neither
+        client may release it any more.
+        """
+        with self._lock:
+            free = []
+            for id_value in dict.fromkeys(ids):
+                if id_value not in self.used:
+                    free.append(id_value)
+                elif self._owners.get(id_value, client) != client:
+                    del self._owners[id_value]
+            self._claim(free, client)
+            return free
+
+    def release(self, ids: Iterable[int], client: str) -> int:
+        """
+        Return IDs a client claimed to the free pool; other IDs are left claimed.
+
+        Returns:
+            int: Number of IDs released
+        """
+        with self._lock:
+            released = [id_value for id_value in dict.fromkeys(ids) if self._owners.get(id_value) == client]
+            for id_value in released:
+                del self._owners[id_value]
+            self.used.difference_update(released)
+            for allocator in self._allocators.values():
+                for id_value in released:
+                    allocator.release(id_value)
+            self._log('release', released)
+            return len(released)
+
+    def check(self, ids: Iterable[int]) -> List[int]:
+        """Return the given IDs that are claimed."""
+        with self._lock:
+            return [id_value for id_value in ids if id_value in self.used]
+
+    def close(self) -> None:
+        """Rewrite the journal as a single snapshot and close it."""
+        with self._lock:
+            if self._journal is None:
+                return
+            self._journal.close()
+            self._journal = None
+            snapshot = json.dumps({'claim': sorted(self.used - self._seeded)}) + '\n'
+            atomic_write(self.state_path, lambda f: f.write(snapshot.encode('utf-8')))
+
+
+class _AllocatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; with Nagle's algorithm the body waits for a delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        state: AllocatorState = self.server.state
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if self.path == '/allocate':
+                low, high = request['range']
+                answer = {'ids': state.allocate((int(low), int(high)), int(request['count']),
+                                                bool(request.get('block')), request.get('client'))}
+            elif self.path == '/reserve':
+                answer = {'reserved': state.reserve((int(value) for value in request['ids']), request.get('client'))}
+            elif self.path == '/release':
+                answer = {'released': state.release((int(value) for value in request['ids']), str(request['client']))}
+            elif self.path == '/check':
+                answer = {'used': state.check(int(value) for value in request['ids'])}
+            elif self.path == '/status':
+                answer = {'used': len(state.used)}
+            else:
+                self._send(404, {'error': f"Unknown endpoint {self.path}"})
+                return
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(409, {'error': str(e)})
+            return
+        self._send(200, answer)
+
+    def _send(self, status: int, answer: dict) -> None:
+        body = json.dumps(answer).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class AllocatorServer(ThreadingHTTPServer):
+    """HTTP server answering allocation requests from an AllocatorState."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], state: AllocatorState):
+        """
+        Args:
+            address: (host, port) to listen on; port 0 picks a free one
+            state: The used IDs to serve
+        """
+        self.state = state
+        super().__init__(address, _AllocatorHandler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.state.close()
+
+
+class AllocatorClient:
+    """Keep-alive connection to an AllocatorServer; one instance per thread."""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        """
+        Args:
+            url: Service address, e.g. "http://127.0.0.1:8765"
+            timeout: Seconds to wait for an answer
+        """
+        parts = urlsplit(url if '//' in url else f"http://{url}")
+        if parts.scheme != 'http' or not parts.hostname:
+            raise ValueError(f"Invalid allocator URL: {url}")
+        self.url = url
+        # Identifies this client's claims, so it can only release its own
+        self.client_id = uuid.uuid4().hex
+        self._connection = http.client.HTTPConnection(
+            parts.hostname, parts.port or DEFAULT_ALLOCATOR_PORT, timeout=timeout
+        )
+
+    def request(self, endpoint: str, payload: dict) -> dict:
+        """
+        Send one request and return the decoded answer.
+
+        Raises:
+            ValueError: If the service cannot be reached or refuses the request
+        """
+        body = json.dumps(payload).encode('utf-8')
+        for attempt in range(2):
+            try:
+                if self._connection.sock is None:
+                    self._connection.connect()
+                    self._connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._connection.request('POST', endpoint, body, {'Content-Type': 'application/json'})
+                response = self._connection.getresponse()
+                answer = json.loads(response.read() or b'{}')
+                break
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self._connection.close()
+                # A kept-alive connection the service already closed fails once; retry on a fresh one
+                if attempt:
+                    raise ValueError(f"Failed to reach ID allocator {self.url}: {str(e)}")
+
+        if response.status != 200:
+            raise ValueError(f"ID allocator {self.url} refused {endpoint}: {answer.get('error', response.status)}")
+        return answer
+
+    def allocate(self, id_range: Tuple[int, int], count: int, block: bool = False) -> List[int]:
+        return self.request('/allocate', {
+            'range': list(id_range), 'count': count, 'block': block, 'client': self.client_id
+        })['ids']
+
+    def reserve(self, ids: Iterable[int]) -> List[int]:
+        return self.request('/reserve', {'ids': list(ids), 'client': self.client_id})['reserved']
+
+    def release(self, ids: Iterable[int]) -> int:
+        return self.request('/release', {'ids': list(ids), 'client': self.client_id})['released']
+
+    def check(self, ids: Iterable[int]) -> List[int]:
+        return self.request('/check', {'ids': list(ids)})['used']
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class RemoteIDGenerator(IDGenerator):
+    """IDGenerator that claims its IDs from an allocation service instead of drawing them locally."""
+
+    def __init__(self, url: str, existing_ids: Set[int] = None, registry=None,
+                 carcols_range: Tuple[int, int] = CARCOLS_ID_RANGE,
+                 modkit_range: Tuple[int, int] = MODKIT_ID_RANGE):
+        """
+        Args:
+            url: Address of the allocation service
+            existing_ids: IDs already in use in the files being edited; claimed at the service
+            registry: Optional IDRegistry; its IDs are claimed at the service too
+            carcols_range: Inclusive range for carcols (siren) IDs
+            modkit_range: Inclusive range for modkit IDs
+        """
+        self.client = AllocatorClient(url)
+        self.existing_ids = set(existing_ids or ())
+        if registry is not None:
+            self.existing_ids |= registry.used_ids()
+        self.ranges = {'carcols': carcols_range, 'modkit': modkit_range}
+        # IDs handed out by the service for this generator and not released since
+        self.allocated: Set[int] = set()
+        # The service must never hand out an ID these files already use
+        if self.existing_ids:
+            self.client.reserve(sorted(self.existing_ids))
+
+    def _allocate(self, kind: str, count: int, block: bool = False) -> List[int]:
+        ids = self.client.allocate(self.ranges[kind], count, block)
+        self.existing_ids.update(ids)
+        self.allocated.update(ids)
+        return ids
+
+    def generate_carcols_id(self) -> int:
+        return self._allocate('carcols', 1)[0]
+
+    def generate_modkit_id(self) -> int:
+        return self._allocate('modkit', 1)[0]
+
+    def generate_carcols_ids(self, count: int) -> List[int]:
+        return self._allocate('carcols', count)
+
+    def generate_modkit_ids(self, count: int) -> List[int]:
+        return self._allocate('modkit', count)
+
+    def generate_block(self, kind: str, count: int) -> List[int]:
+        return self._allocate(kind, count, block=True)
+
+    def reserve(self, id_value: int) -> bool:
+        if id_value in self.existing_ids:
+            return False
+        self.existing_ids.add(id_value)
+        return bool(self.client.reserve([id_value]))
+
+    def release(self, ids: Iterable[int]) -> None:
+        ids = list(ids)
+        self.existing_ids.difference_update(ids)
+        self.allocated.difference_update(ids)
+        if ids:
+            self.client.release(ids)
+
+    def close(self, release_allocated: bool = False) -> None:
+        """
+        Close the connection to the service.
+
+        Args:
+            release_allocated: First return every ID this generator allocated, e.g.
+                because the changes that used them were discarded
+        """
+        try:
+            if release_allocated and self.allocated:
+                self.release(sorted(self.allocated))
+        finally:
+            self.client.close()
+
+    def validate_id_availability(self, id_value: int) -> bool:
+        return id_value not in self.existing_ids and not self.client.check([id_value])
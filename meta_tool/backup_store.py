@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+
+"""
+Content-addressed backup store for meta files.
+
+Each backup is a snapshot manifest listing the backed-up paths and the
+SHA-256 of their contents. File contents are stored once per hash under
+objects/, so a file that has not changed since the last backup (same
+file_key: size, mtime, ctime and inode) costs a stat call and nothing more. Blobs are reflinked where the filesystem supports it
+(a copy-on-write clone that shares disk blocks with the original) and
+otherwise compressed with zstd, if installed, or gzip.
+
+Layout:
+    <root>/objects/<hash[:2]>/<hash>.<raw|zst|gz>
+    <root>/snapshots/<snapshot id>.json
+    <root>/index.json    path -> (size, mtime, ctime, inode, hash) of the last backup
+
+Example:
+    store = BackupStore('meta_backups')
+    snapshot_id = store.backup(['carcols.meta', 'carvariations.meta'])
+    store.restore(snapshot_id)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+DEFAULT_BACKUP_ROOT = 'meta_backups'
+
+# Linux ioctl that clones a file's extents (btrfs, XFS, bcachefs, ...)
+FICLONE = 0x40049409
+
+
+def sha256_file(file_path: str) -> str:
+    """Compute the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_key(file_path: str) -> Tuple[str, int, int, int, int]:
+    """
+    Return (resolved path, size, mtime, ctime, inode) of a file.
+
+    mtime alone misses an edit that keeps the size and lands within the
+    file system's timestamp resolution, or that sets the mtime back. ctime
+    changes on every write and cannot be set, and a file replaced by a
+    rename gets a new inode.
+    """
+    path = os.path.realpath(file_path)
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns, stat.st_ino
+
+
+def _reflink(source: Path, target: Path) -> bool:
+    """Try to create target as a copy-on-write clone of source."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        if target.exists():
+            target.unlink()
+        return False
+
+
+def new_file_mode() -> int:
+    """Return the permissions a newly created file gets under the current umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def fsync_directory(directory: Path) -> None:
+    """Flush a directory entry change (create, rename, unlink) to disk, where the OS allows it."""
+    try:
+        fd = os.open(str(directory), os.O_RDONLY)
+    except OSError:  # directories cannot be opened on Windows
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_temp(target: Path, write, durable: bool = True) -> str:
+    """
+    Call write(file) on a new temporary file next to target.
+
+    The temporary file gets target's permissions, or those of a newly
+    created file if target does not exist.
+
+    Args:
+        target: File the temporary file will replace
+        write: Callable writing the new contents to a binary file object
+        durable: fsync the temporary file before returning
+
+    Returns:
+        str: Path of the temporary file
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        mode = os.stat(target).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = new_file_mode()
+    fd, temp_path = tempfile.mkstemp(prefix=f".{target.name}.", suffix='.tmp', dir=str(target.parent))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(temp_path, mode)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return temp_path
+
+
+def atomic_write(target: Path, write, durable: bool = True) -> None:
+    """
+    Call write(file) on a temporary file and move it over target.
+
+    Readers see either the old or the new contents, never a partial file.
+    With durable, the data and the rename are also flushed to disk, so the
+    same holds after a crash or power loss.
+    """
+    temp_path = write_temp(target, write, durable)
+    try:
+        os.replace(temp_path, target)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    if durable:
+        fsync_directory(target.parent)
+
+
+class BackupStore:
+    """Deduplicated, compressed snapshots of meta files."""
+
+    def __init__(self, root: str = DEFAULT_BACKUP_ROOT):
+        self.root = Path(root)
+        self.objects = self.root / 'objects'
+        self.snapshots = self.root / 'snapshots'
+        self.index_path = self.root / 'index.json'
+
+    def _object_path(self, digest: str) -> Optional[Path]:
+        """Return the stored blob for a hash, whatever its encoding."""
+        for suffix in ('raw', 'zst', 'gz'):
+            path = self.objects / digest[:2] / f"{digest}.{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def _store_object(self, source: Path, digest: str) -> None:
+        if self._object_path(digest) is not None:
+            return
+
+        directory = self.objects / digest[:2]
+        directory.mkdir(parents=True, exist_ok=True)
+        if _reflink(source, directory / f"{digest}.raw"):
+            return
+
+        if zstandard is not None:
+            def write(f):
+                with open(source, 'rb') as src:
+                    zstandard.ZstdCompressor(level=10).copy_stream(src, f)
+            atomic_write(directory / f"{digest}.zst", write)
+        else:
+            def write(f):
+                with open(source, 'rb') as src, gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as gz:
+                    shutil.copyfileobj(src, gz)
+            atomic_write(directory / f"{digest}.gz", write)
+
+    def _read_index(self) -> Dict[str, list]:
+        try:
+            return json.loads(self.index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def backup(self, files: Iterable[str]) -> str:
+        """
+        Snapshot the given files.
+
+        Files whose file_key matches the previous backup are not read
+        again; files whose contents are already stored are not copied again.
+
+        Args:
+            files: Paths of the files to back up
+
+        Returns:
+            str: The snapshot id
+        """
+        index = self._read_index()
+        entries = []
+        for file_path in files:
+            path = Path(file_path).resolve()
+            if not path.exists():
+                raise ValueError(f"File not found: {file_path}")
+
+            stat = path.stat()
+            _, *key = file_key(str(path))
+            cached = index.get(str(path))
+            if cached and cached[:-1] == key and self._object_path(cached[-1]) is not None:
+                digest = cached[-1]
+            else:
+                digest = sha256_file(str(path))
+                self._store_object(path, digest)
+                index[str(path)] = [*key, digest]
+
+            entries.append({
+                'path': str(path),
+                'sha256': digest,
+                'size': stat.st_size,
+                'mode': stat.st_mode & 0o7777,
+            })
+
+        created = datetime.now()
+        snapshot_id = created.strftime("%Y%m%d_%H%M%S_%f")
+        manifest = {'id': snapshot_id, 'created': created.isoformat(), 'files': entries}
+        atomic_write(self.snapshots / f"{snapshot_id}.json",
+                      lambda f: f.write(json.dumps(manifest, indent=2).encode('utf-8')))
+        atomic_write(self.index_path, lambda f: f.write(json.dumps(index).encode('utf-8')))
+        return snapshot_id
+
+    def list_snapshots(self) -> List[dict]:
+        """Return every snapshot manifest, oldest first."""
+        if not self.snapshots.exists():
+            return []
+        manifests = []
+        for path in sorted(self.snapshots.glob('*.json')):
+            manifests.append(json.loads(path.read_text(encoding='utf-8')))
+        return manifests
+
+    def get_snapshot(self, snapshot_id: Optional[str] = None) -> dict:
+        """Return one snapshot manifest, or the latest one if no id is given."""
+        if snapshot_id is None:
+            snapshots = self.list_snapshots()
+            if not snapshots:
+                raise ValueError(f"No backups in {self.root}")
+            return snapshots[-1]
+        path = self.snapshots / f"{snapshot_id}.json"
+        if not path.exists():
+            raise ValueError(f"Backup snapshot not found: {snapshot_id}")
+        return json.loads(path.read_text(encoding='utf-8'))
+
+    def restore(self, snapshot_id: Optional[str] = None, target_dir: Optional[str] = None) -> List[str]:
+        """
+        Restore the files of a snapshot.
+
+        Files already matching the snapshot are left untouched.
+
+        Args:
+            snapshot_id: Snapshot to restore (default: latest)
+            target_dir: Restore into this directory instead of the original paths
+
+        Returns:
+            List of paths that were written
+        """
+        restored = []
+        for entry in self.get_snapshot(snapshot_id)['files']:
+            target = Path(target_dir) / Path(entry['path']).name if target_dir else Path(entry['path'])
+            if target.exists() and sha256_file(str(target)) == entry['sha256']:
+                continue
+
+            blob = self._object_path(entry['sha256'])
+            if blob is None:
+                raise ValueError(f"Backup data missing for {entry['path']} ({entry['sha256']})")
+
+            if blob.suffix == '.zst':
+                def write(f, blob=blob):
+                    with open(blob, 'rb') as src:
+                        zstandard.ZstdDecompressor().copy_stream(src, f)
+            elif blob.suffix == '.gz':
+                def write(f, blob=blob):
+                    with gzip.open(blob, 'rb') as src:
+                        shutil.copyfileobj(src, f)
+            else:
+                def write(f, blob=blob):
+                    with open(blob, 'rb') as src:
+                        shutil.copyfileobj(src, f)
+            atomic_write(target, write)
+            os.chmod(target, entry['mode'])
+            restored.append(str(target))
+        return restored
+
+    def prune(self, keep_last: Optional[int] = None, max_age_days: Optional[float] = None) -> Dict[str, int]:
+        """
+        Apply a retention policy and garbage-collect unreferenced blobs.
+
+        A snapshot is kept if it is among the keep_last newest or younger than
+        max_age_days; with neither set, all snapshots are kept and only
+        unreferenced blobs are removed.
+
+        Returns:
+            Dictionary of counts: {'snapshots', 'objects'} removed
+        """
+        snapshots = self.list_snapshots()
+        cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+        removed = {'snapshots': 0, 'objects': 0}
+
+        kept = []
+        for position, manifest in enumerate(reversed(snapshots)):
+            recent = keep_last is not None and position < keep_last
+            young = cutoff is not None and datetime.fromisoformat(manifest['created']).timestamp() >= cutoff
+            if recent or young or (keep_last is None and cutoff is None):
+                kept.append(manifest)
+            else:
+                (self.snapshots / f"{manifest['id']}.json").unlink()
+                removed['snapshots'] += 1
+
+        referenced = {entry['sha256'] for manifest in kept for entry in manifest['files']}
+        if self.objects.exists():
+            for blob in self.objects.glob('*/*'):
+                if blob.name.split('.')[0] not in referenced:
+                    blob.unlink()
+                    removed['objects'] += 1
+
+        index = self._read_index()
+        index = {path: value for path, value in index.items() if value[-1] in referenced}
+        atomic_write(self.index_path, lambda f: f.write(json.dumps(index).encode('utf-8')))
+        return removed
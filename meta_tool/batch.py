@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+
+"""
+Resolve many resources at once in a process pool.
+
+A batch first reads the identity values of every meta file (see
+MetaFileHandler.load_identity), which pairs each resource's carcols.meta
+with its carvariations.meta and collects every ID already in use. It then
+starts an ID coordinator: an in-process AllocatorServer seeded with those
+IDs, or an external one given with --allocator. Every worker process
+resolves one resource at a time with a ConflictResolver that claims its new
+IDs from the coordinator, so two resources never receive the same ID, and
+saves its files itself; one worker's writes overlap the others' parsing and
+planning. The workers' change journals are stored as one journal for the
+whole batch.
+
+Sources are resource directories (searched like `scan`) or manifest files
+listing one resource directory, or one "carcols.meta carvariations.meta"
+pair, per line.
+
+Example:
+    result = resolve_batch(['server/resources'], jobs=8)
+    for outcome in result.resources:
+        print(outcome.resource, outcome.changes, outcome.error)
+"""
+
+import logging
+import os
+import shlex
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .allocator import AllocatorClient, AllocatorServer, AllocatorState
+from .backup_store import DEFAULT_BACKUP_ROOT, BackupStore
+from .conflict_resolver import ConflictResolver
+from .id_generator import CARCOLS_ID_RANGE, MODKIT_ID_RANGE
+from .identity import CARCOLS_ROOT, CARVARIATIONS_ROOT
+from .journal import ChangeJournal, JournalStore
+from .metrics import metrics
+from .scanner import discover_meta_files, parse_files
+from .session import ResolverSession
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ResourcePair:
+    """One resource's carcols.meta and carvariations.meta."""
+    resource: str
+    carcols: str
+    carvariations: str
+
+
+@dataclass
+class BatchOutcome:
+    """What resolving one resource did."""
+    resource: str
+    changes: Dict[str, int] = field(default_factory=dict)  # 'carcols' / 'variations' -> values rewritten
+    error: Optional[str] = None
+    journal: Optional[dict] = None  # ChangeJournal.to_dict() of the resource's writes
+
+
+@dataclass
+class BatchResult:
+    """Outcome of resolve_batch."""
+    resources: List[BatchOutcome] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)  # resource or path -> why it was skipped
+    snapshot_id: Optional[str] = None
+    journal_id: Optional[str] = None
+
+    @property
+    def failed(self) -> List[BatchOutcome]:
+        return [outcome for outcome in self.resources if outcome.error is not None]
+
+
+def read_sources(sources: List[str]) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Expand directories and manifest files into (resource, meta file paths).
+
+    Args:
+        sources: Resource directories, directories of resources, or manifest files
+    """
+    for source in sources:
+        path = Path(source)
+        if path.is_dir():
+            for resource, files in discover_meta_files(source).items():
+                yield resource, [str(file) for file in files]
+            continue
+
+        try:
+            lines = path.read_text(encoding='utf-8').splitlines()
+        except OSError as e:
+            raise ValueError(f"Failed to read batch manifest {source}: {str(e)}")
+        for line in lines:
+            fields = shlex.split(line, comments=True)
+            if not fields:
+                continue
+            entries = [path.parent / entry for entry in fields]
+            if len(entries) == 1 and entries[0].is_dir():
+                yield from read_sources([str(entries[0])])
+            else:
+                yield entries[0].parent.name, [str(entry) for entry in entries]
+
+
+def _resolve_pair(pair: ResourcePair, allocator: str, options: dict) -> BatchOutcome:
+    """Resolve one resource; runs in a worker process, so errors are returned rather than raised."""
+    outcome = BatchOutcome(pair.resource)
+    resolver = None
+    try:
+        resolver = ConflictResolver(pair.carcols, pair.carvariations, allocator=allocator,
+                                    carcols_range=options['carcols_range'], modkit_range=options['modkit_range'])
+        with ResolverSession(resolver, backup=False, store_journal=False) as session:
+            if options['carcols']:
+                session.resolve_carcols()
+            if options['modkits']:
+                session.resolve_modkits()
+        outcome.changes = {key: len(values) for key, values in session.changes.items()}
+        if session.journal is not None:
+            outcome.journal = session.journal.to_dict()
+    except Exception as e:
+        outcome.error = str(e)
+    finally:
+        if resolver is not None:
+            try:
+                # The session rolled back on failure, so nothing uses the IDs it claimed
+                resolver.id_generator.close(release_allocated=outcome.error is not None)
+            except ValueError as e:
+                logger.warning("Failed to release the IDs claimed for %s: %s", pair.resource, e)
+    return outcome
+
+
+def resolve_batch(sources: List[str], jobs: Optional[int] = None, registry=None,
+                  allocator: Optional[str] = None,
+                  carcols_range: Tuple[int, int] = CARCOLS_ID_RANGE,
+                  modkit_range: Tuple[int, int] = MODKIT_ID_RANGE,
+                  carcols: bool = True, modkits: bool = True,
+                  backup_root: Optional[str] = DEFAULT_BACKUP_ROOT) -> BatchResult:
+    """
+    Resolve the carcols and/or modkit IDs of every resource in the sources.
+
+    Args:
+        sources: Resource directories, directories of resources, or manifest files
+        jobs: Number of worker processes (default: CPU count)
+        registry: Optional IDRegistry; IDs used anywhere on the server are never handed out
+        allocator: Address of an ID allocation service to use instead of a private coordinator
+        carcols_range: Inclusive range for new carcols (siren) IDs
+        modkit_range: Inclusive range for new modkit IDs
+        carcols: Resolve carcols (siren) IDs
+        modkits: Resolve modkit IDs
+        backup_root: BackupStore that gets one snapshot of every file first and the batch's
+            change journal afterwards; None for neither
+
+    Returns:
+        BatchResult: One outcome per resource
+    """
+    result = BatchResult()
+
+    # Pair each resource's files and collect every ID in use, in one streaming pass
+    with metrics.span('batch.index') as span:
+        resources = list(read_sources(sources))
+        # Files by root tag, per position in resources
+        roots: Dict[int, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        used = set(registry.used_ids()) if registry is not None else set()
+        owners = {file_path: position for position, (_, files) in enumerate(resources) for file_path in files}
+        for file_path, identity, error in parse_files(list(owners), jobs=jobs):
+            if identity is None:
+                result.errors[file_path] = error
+                continue
+            roots[owners[file_path]][identity.root_tag].append(file_path)
+            used.update(identity.siren_ids, identity.modkit_ids, identity.siren_refs)
+
+        pairs = []
+        for position, (resource, files) in enumerate(resources):
+            found = roots[position]
+            if any(file_path in result.errors for file_path in files):
+                continue
+            if len(found[CARCOLS_ROOT]) == 1 and len(found[CARVARIATIONS_ROOT]) == 1:
+                pairs.append(ResourcePair(resource, found[CARCOLS_ROOT][0], found[CARVARIATIONS_ROOT][0]))
+            else:
+                result.errors[resource] = (f"Expected one carcols and one carvariations file, found "
+                                           f"{len(found[CARCOLS_ROOT])} and {len(found[CARVARIATIONS_ROOT])}")
+        span.add(resources=len(pairs), ids=len(used))
+
+    if not pairs:
+        return result
+
+    if backup_root:
+        with metrics.span('batch.backup'):
+            files = [path for pair in pairs for path in (pair.carcols, pair.carvariations)]
+            result.snapshot_id = BackupStore(backup_root).backup(files)
+
+    server = None
+    if allocator:
+        # Claim every ID the batch already uses before any worker draws a new one
+        client = AllocatorClient(allocator)
+        try:
+            client.reserve(sorted(used))
+        finally:
+            client.close()
+    else:
+        server = AllocatorServer(('127.0.0.1', 0), AllocatorState(used=used))
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        allocator = server.url
+
+    options = {'carcols_range': carcols_range, 'modkit_range': modkit_range,
+               'carcols': carcols, 'modkits': modkits}
+    try:
+        with metrics.span('batch.resolve') as span:
+            workers = min(jobs or os.cpu_count() or 1, len(pairs))
+            if workers == 1:
+                result.resources.extend(_resolve_pair(pair, allocator, options) for pair in pairs)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(_resolve_pair, pair, allocator, options) for pair in pairs]
+                    result.resources.extend(future.result() for future in futures)
+            span.add(resources=len(pairs), failed=len(result.failed), workers=workers)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    # One journal for the whole batch, so it can be undone as one
+    journal = ChangeJournal(result.snapshot_id)
+    for outcome in result.resources:
+        if outcome.journal is not None:
+            journal.extend(ChangeJournal.from_dict(outcome.journal))
+    if backup_root and len(journal):
+        result.journal_id = JournalStore(backup_root).record(journal)
+    return result
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+"""
+Caches that let repeated loads of unchanged meta files skip XML parsing.
+
+DocumentCache keeps parsed trees in memory for the life of the process, so
+a file the GUI parsed while it was being selected is not parsed again when
+the resolver loads it. Each cached tree is handed out once: whoever takes
+it may edit it, and edits that are never saved cannot leak into later
+loads. IdentityCache stores the extracted identity values of each file on
+disk, so scans in later runs only parse files that changed.
+
+Both are keyed by the file's resolved path and stat data (see file_key);
+IdentityCache also records a content hash, so a file that was touched but
+not modified is still a hit.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from lxml import etree
+
+from .backup_store import atomic_write, file_key
+from .identity import _KIND_FIELDS, IdentityNode, MetaIdentity
+
+# Parsed trees kept per process; a large carcols.meta tree can take hundreds of MB
+DOCUMENT_CACHE_SIZE = 4
+
+DEFAULT_CACHE_DIR = os.environ.get('META_TOOL_CACHE') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'meta_tool'
+)
+
+# Bump when the serialized identity format changes
+IDENTITY_CACHE_VERSION = 2
+
+# MetaIdentity list fields, stored as they are
+_VALUE_FIELDS = tuple(name for name, _ in _KIND_FIELDS.values())
+
+
+class DocumentCache:
+    """Least-recently-used cache of parsed meta file trees, each handed out once."""
+
+    def __init__(self, maxsize: int = DOCUMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[str, Tuple[tuple, etree._Element]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, file_path: str) -> bool:
+        """Check whether an unchanged tree of a file is cached, without taking it."""
+        path, *stat = file_key(file_path)
+        with self._lock:
+            entry = self._entries.get(path)
+            return entry is not None and entry[0] == tuple(stat)
+
+    def take(self, file_path: str) -> Optional[etree._Element]:
+        """
+        Remove and return the cached tree of a file, if the file has not changed since it was stored.
+
+        The caller owns the tree from then on; no other load gets it.
+        """
+        path, *stat = file_key(file_path)
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is None or entry[0] != tuple(stat):
+                return None
+            return entry[1]
+
+    def put(self, file_path: str, root: etree._Element, key: Optional[tuple] = None) -> None:
+        """
+        Store the tree of a file.
+
+        Args:
+            file_path: Path the tree was loaded from
+            root: XML root element, matching the file's current contents and not held by anyone else
+            key: file_key() taken before the file was read (default: now)
+        """
+        path, *stat = key or file_key(file_path)
+        with self._lock:
+            self._entries[path] = (tuple(stat), root)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, file_path: str) -> None:
+        """Drop a file's tree, e.g. after the file was rewritten."""
+        with self._lock:
+            self._entries.pop(os.path.realpath(file_path), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class IdentityCache:
+    """Extracted identities of meta files, stored on disk between runs."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.directory = Path(cache_dir) / 'identity'
+
+    def _entry_path(self, path: str) -> Path:
+        return self.directory / f"{hashlib.sha1(path.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, file_path: str, positions: bool = True) -> Optional[MetaIdentity]:
+        """
+        Return the cached identity of a file if its contents are unchanged.
+
+        A stat mismatch (see file_key) costs one hash of the file; the
+        entry is still used if the hash matches.
+
+        Args:
+            file_path: Path to the meta file
+            positions: Whether node spans are needed
+
+        Returns:
+            The identity, or None on a miss
+        """
+        path, *stat = file_key(file_path)
+        entry_path = self._entry_path(path)
+        try:
+            entry = json.loads(entry_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != IDENTITY_CACHE_VERSION or entry.get('path') != path:
+            return None
+        if positions and not entry.get('positions'):
+            return None
+
+        if entry.get('stat') != stat:
+            with open(path, 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest() != entry.get('sha256'):
+                    return None
+            # Touched but not modified; only the stat data is stale
+            entry['stat'] = stat
+            try:
+                self._write(entry_path, entry)
+            except OSError:
+                pass
+
+        try:
+            identity = MetaIdentity(path=str(file_path), root_tag=entry['root_tag'])
+            for name in _VALUE_FIELDS:
+                setattr(identity, name, entry[name])
+            nodes = entry['nodes']
+            if positions:
+                spans = [tuple(span) if span else None for span in nodes['span']]
+            else:
+                spans = [None] * len(nodes['kind'])
+            identity.nodes = list(map(IdentityNode, nodes['kind'], nodes['value'], nodes['item'], nodes['line'], spans))
+        except (KeyError, TypeError):
+            # Damaged entry
+            return None
+        return identity
+
+    def put(self, key: Tuple[str, int, int, int, int], digest: str, identity: MetaIdentity, positions: bool) -> None:
+        """
+        Store the identity of a file.
+
+        Args:
+            key: file_key() taken before the file was read
+            digest: SHA-256 of the contents the identity was extracted from
+            identity: The extracted identity
+            positions: Whether node spans were recorded
+        """
+        path, *stat = key
+        entry = {
+            'version': IDENTITY_CACHE_VERSION,
+            'path': path,
+            'stat': stat,
+            'sha256': digest,
+            'positions': positions,
+            'root_tag': identity.root_tag,
+            # Column per node field keeps the file small and fast to load
+            'nodes': {
+                'kind': [node.kind for node in identity.nodes],
+                'value': [node.value for node in identity.nodes],
+                'item': [node.item for node in identity.nodes],
+                'line': [node.line for node in identity.nodes],
+                'span': [node.span for node in identity.nodes] if positions else None,
+            },
+        }
+        entry.update((name, getattr(identity, name)) for name in _VALUE_FIELDS)
+        try:
+            self._write(self._entry_path(path), entry)
+        except OSError:
+            # The cache is an optimization; a read-only home must not break loading
+            pass
+
+    @staticmethod
+    def _write(entry_path: Path, entry: dict) -> None:
+        data = json.dumps(entry, separators=(',', ':')).encode('utf-8')
+        # A lost entry is only a cache miss, so skip the fsyncs
+        atomic_write(entry_path, lambda f: f.write(data), durable=False)
@@ -1,14 +1,35 @@
 #!/usr/bin/env python3
 
 import click
+import cProfile
+import json
 import logging
+import time
 from pathlib import Path
 from typing import Optional, Tuple
 
+from .allocator import DEFAULT_ALLOCATOR_PORT, AllocatorServer, AllocatorState
+from .backup_store import DEFAULT_BACKUP_ROOT, BackupStore
+from .batch import resolve_batch
 from .conflict_resolver import ConflictResolver
+from .conflicts import find_conflicts
+from .id_generator import CARCOLS_ID_RANGE, MODKIT_ID_RANGE
+from .journal import ChangeJournal, JournalStore, apply_journal
+from .lint import iter_rules, lint_paths
+from .merge import merge_resources
 from .meta_file_handler import MetaFileHandler
+from .metrics import metrics
+from .occupancy import ID_KINDS, conflict_matrix, occupancy_by_resource
+from .registry import IDRegistry
+from .scanner import DUPLICATE_KINDS, discover_meta_files, parse_files, scan_resources
+from .session import ResolverSession
+from .split import split_meta_files, update_manifest
+from .vehicle_index import MATCH_MODES
+from .watch import MAX_DELAY, QUIET_PERIOD, MetaWatcher
 
-logging.basicConfig(level=logging.DEBUG)
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+KIND_LABELS = {'siren_ids': 'siren IDs', 'modkit_ids': 'modkit IDs', 'kit_names': 'kitNames'}
 
 def validate_files(carcols_path: str, carvariations_path: str) -> Tuple[Path, Path]:
     """Validate input files exist and are proper meta files."""
@@ -29,39 +50,179 @@ def validate_files(carcols_path: str, carvariations_path: str) -> Tuple[Path, Pa
 
     return carcols, carvariations
 
+def parse_id_range(ctx, param, value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Parse a LOW-HIGH option value into an inclusive (low, high) tuple."""
+    if value is None:
+        return None
+    try:
+        low, high = (int(part) for part in value.split('-', 1))
+    except ValueError:
+        raise click.BadParameter(f"Expected LOW-HIGH, got {value!r}")
+    if low > high:
+        raise click.BadParameter(f"Empty range {value!r}")
+    return low, high
+
+def id_options(func):
+    """Add the ID allocation options shared by every command that rewrites IDs."""
+    func = click.option('--modkit-range', callback=parse_id_range, metavar='LOW-HIGH',
+                        help=f'Modkit ID range (default: {MODKIT_ID_RANGE[0]}-{MODKIT_ID_RANGE[1]})')(func)
+    func = click.option('--carcols-range', callback=parse_id_range, metavar='LOW-HIGH',
+                        help=f'Carcols (siren) ID range (default: {CARCOLS_ID_RANGE[0]}-{CARCOLS_ID_RANGE[1]}; '
+                             f'the base game only honors 1-255)')(func)
+    func = click.option('--registry', type=click.Path(dir_okay=False),
+                        help='ID registry to avoid server-wide IDs (see `index`)')(func)
+    func = click.option('--allocator', metavar='URL', envvar='META_TOOL_ALLOCATOR',
+                        help='Claim new IDs from a shared allocation service (see `serve-allocator`)')(func)
+    return func
+
+def scope_options(func):
+    """Add the options choosing what the resolve commands remap."""
+    func = click.option('--only-conflicts', is_flag=True,
+                        help='Remap only IDs defined twice or used elsewhere on the server (see --registry)')(func)
+    func = click.option('--match', type=click.Choice(MATCH_MODES), default='exact', show_default=True,
+                        help='Match vehicle names exactly or by prefix (globs always work)')(func)
+    func = click.option('--vehicle', '-v', 'vehicles', multiple=True,
+                        help='Process only this vehicle or glob pattern, e.g. "valor*" (repeatable)')(func)
+    return func
+
+def open_resolver(carcols: Path, carvariations: Path, registry_path: Optional[str] = None,
+                  carcols_range: Optional[Tuple[int, int]] = None,
+                  modkit_range: Optional[Tuple[int, int]] = None,
+                  only_conflicts: bool = False, allocator: Optional[str] = None) -> ConflictResolver:
+    """Create a resolver, seeding its ID generator from a registry if one is given."""
+    options = {
+        'carcols_range': carcols_range or CARCOLS_ID_RANGE,
+        'modkit_range': modkit_range or MODKIT_ID_RANGE,
+        'only_conflicts': only_conflicts,
+        'allocator': allocator,
+    }
+    if not registry_path:
+        return ConflictResolver(str(carcols), str(carvariations), **options)
+    with IDRegistry(registry_path) as registry:
+        return ConflictResolver(str(carcols), str(carvariations), registry=registry, **options)
+
+def echo_changes(changes) -> None:
+    """Print a resolver's {type: [(old, new)]} change report."""
+    click.echo("\nChanges made:")
+    click.echo("\nCarcols.meta changes:")
+    for old, new in changes['carcols']:
+        click.echo(f"  {old} → {new}")
+
+    click.echo("\nCarvariations.meta changes:")
+    for old, new in changes['variations']:
+        click.echo(f"  {old} → {new}")
+
+def echo_session(session: ResolverSession) -> None:
+    """Print a committed session's changes and where its backup went."""
+    echo_changes(session.changes)
+    if session.snapshot_id:
+        click.echo(f"\nBackup snapshot {session.snapshot_id} stored in {session.resolver.file_handler.backup_root}")
+        if session.journal_id:
+            click.echo(f"Change journal {session.journal_id} (undo with `undo {session.journal_id}`)")
+    else:
+        click.echo("\nNo changes needed")
+
+def echo_conflicts(heading: str, conflicts) -> None:
+    """Print conflicts grouped by kind, e.g. "Conflicting siren IDs (2):"."""
+    for kind in DUPLICATE_KINDS:
+        of_kind = [conflict for conflict in conflicts if conflict.kind == kind]
+        if of_kind:
+            click.echo(f"\n{heading} {KIND_LABELS[kind]} ({len(of_kind)}):")
+        for conflict in of_kind:
+            click.echo(f"  {conflict.value}: {', '.join(conflict.owners)}")
+
+def start_instrumentation(ctx: click.Context, profile_path: Optional[str], metrics_path: Optional[str],
+                          trace_memory: bool) -> None:
+    """
+    Collect stage metrics for the command, and a cProfile profile if asked.
+
+    The report is printed to stderr and/or written as JSON when the command
+    exits, whether or not it succeeded.
+    """
+    metrics.enable(memory=trace_memory)
+    profiler = None
+    if profile_path:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def finish():
+        metrics.disable()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        if profiler is not None or not metrics_path:
+            click.echo(metrics.format_report(), err=True)
+        if profiler is not None:
+            click.echo(f"Profile written to {profile_path} (view with `python -m pstats {profile_path}`)", err=True)
+        if metrics_path:
+            report = {'command': ctx.invoked_subcommand, **metrics.report()}
+            Path(metrics_path).write_text(json.dumps(report, indent=2) + '\n', encoding='utf-8')
+
+    ctx.call_on_close(finish)
+
 @click.group()
 @click.version_option()
-def cli():
+@click.option('--log-level', type=click.Choice(LOG_LEVELS, case_sensitive=False), default='WARNING',
+              show_default=True, help='Logging verbosity')
+@click.option('--profile', 'profile_path', type=click.Path(dir_okay=False),
+              help='Write a cProfile dump here and print per-stage timings to stderr')
+@click.option('--metrics-json', 'metrics_path', type=click.Path(dir_okay=False),
+              help='Write per-stage timings and counts here as JSON')
+@click.option('--trace-memory', is_flag=True,
+              help='Also record peak Python memory per stage with tracemalloc (slower)')
+@click.pass_context
+def cli(ctx: click.Context, log_level: str, profile_path: Optional[str], metrics_path: Optional[str],
+        trace_memory: bool):
     """GTA V FiveM Meta File Conflict Resolution Tool"""
-    pass
+    logging.basicConfig(level=log_level.upper())
+    if profile_path or metrics_path or trace_memory:
+        start_instrumentation(ctx, profile_path, metrics_path, trace_memory)
 
 @cli.command()
 @click.argument('carcols_path', type=click.Path(exists=True))
 @click.argument('carvariations_path', type=click.Path(exists=True))
-@click.option('--vehicle', '-v', help='Process specific vehicle (optional)')
-def resolve_carcols(carcols_path: str, carvariations_path: str, vehicle: Optional[str]):
+@scope_options
+@id_options
+def resolve_carcols(carcols_path: str, carvariations_path: str, vehicles: Tuple[str, ...], match: str,
+                    only_conflicts: bool, registry: Optional[str], carcols_range: Optional[Tuple[int, int]],
+                    modkit_range: Optional[Tuple[int, int]], allocator: Optional[str]):
     """Resolve carcols ID conflicts in meta files."""
     try:
         carcols, carvariations = validate_files(carcols_path, carvariations_path)
 
-        # Create resolver and backup files
-        resolver = ConflictResolver(str(carcols), str(carvariations))
-        resolver.file_handler.backup_files([str(carcols), str(carvariations)])
-
-        # Resolve conflicts
-        changes = resolver.resolve_carcols_conflicts(vehicle)
+        # Resolve conflicts; files are backed up and written once at the end
+        resolver = open_resolver(carcols, carvariations, registry, carcols_range, modkit_range,
+                                 only_conflicts, allocator)
+        with ResolverSession(resolver) as session:
+            session.resolve_carcols(vehicles, match)
 
         # Report changes
-        click.echo("\nChanges made:")
-        click.echo("\nCarcols.meta changes:")
-        for old, new in changes['carcols']:
-            click.echo(f"  {old} → {new}")
+        echo_session(session)
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
 
-        click.echo("\nCarvariations.meta changes:")
-        for old, new in changes['variations']:
-            click.echo(f"  {old} → {new}")
+@cli.command()
+@click.argument('carcols_path', type=click.Path(exists=True))
+@click.argument('carvariations_path', type=click.Path(exists=True))
+@scope_options
+@id_options
+def resolve_modkits(carcols_path: str, carvariations_path: str, vehicles: Tuple[str, ...], match: str,
+                    only_conflicts: bool, registry: Optional[str], carcols_range: Optional[Tuple[int, int]],
+                    modkit_range: Optional[Tuple[int, int]], allocator: Optional[str]):
+    """Resolve modkit ID conflicts in meta files."""
+    try:
+        carcols, carvariations = validate_files(carcols_path, carvariations_path)
+
+        # Resolve conflicts; files are backed up and written once at the end
+        resolver = open_resolver(carcols, carvariations, registry, carcols_range, modkit_range,
+                                 only_conflicts, allocator)
+        with ResolverSession(resolver) as session:
+            session.resolve_modkits(vehicles, match)
 
-        click.echo("\nBackups created in backups_* directory")
+        # Report changes
+        echo_session(session)
 
     except Exception as e:
         click.echo(f"Error: {str(e)}", err=True)
@@ -70,31 +231,504 @@ def resolve_carcols(carcols_path: str, carvariations_path: str, vehicle: Optiona
 @cli.command()
 @click.argument('carcols_path', type=click.Path(exists=True))
 @click.argument('carvariations_path', type=click.Path(exists=True))
-@click.option('--vehicle', '-v', help='Process specific vehicle (optional)')
-def resolve_modkits(carcols_path: str, carvariations_path: str, vehicle: Optional[str]):
-    """Resolve modkit ID conflicts in meta files."""
+@scope_options
+@click.option('--carcols/--no-carcols', 'do_carcols', default=True, help='Resolve carcols (siren) IDs')
+@click.option('--modkits/--no-modkits', 'do_modkits', default=True, help='Resolve modkit IDs')
+@id_options
+def resolve_all(carcols_path: str, carvariations_path: str, vehicles: Tuple[str, ...], match: str,
+                only_conflicts: bool, do_carcols: bool, do_modkits: bool, registry: Optional[str],
+                carcols_range: Optional[Tuple[int, int]], modkit_range: Optional[Tuple[int, int]],
+                allocator: Optional[str]):
+    """Resolve carcols and modkit conflicts with one load, one backup and one write per file."""
     try:
         carcols, carvariations = validate_files(carcols_path, carvariations_path)
 
-        # Create resolver and backup files
-        resolver = ConflictResolver(str(carcols), str(carvariations))
-        resolver.file_handler.backup_files([str(carcols), str(carvariations)])
+        resolver = open_resolver(carcols, carvariations, registry, carcols_range, modkit_range,
+                                 only_conflicts, allocator)
+        with ResolverSession(resolver) as session:
+            if do_carcols:
+                session.resolve_carcols(vehicles, match)
+            if do_modkits:
+                session.resolve_modkits(vehicles, match)
+
+        # Report changes
+        echo_session(session)
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+@cli.command('resolve-batch')
+@click.argument('sources', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--jobs', '-j', type=int, help='Number of worker processes (default: CPU count)')
+@click.option('--carcols/--no-carcols', 'do_carcols', default=True, help='Resolve carcols (siren) IDs')
+@click.option('--modkits/--no-modkits', 'do_modkits', default=True, help='Resolve modkit IDs')
+@click.option('--no-backup', is_flag=True, help='Do not snapshot the files first or record a change journal')
+@id_options
+@click.pass_context
+def resolve_many(ctx: click.Context, sources: Tuple[str, ...], jobs: Optional[int], do_carcols: bool,
+                 do_modkits: bool, no_backup: bool, registry: Optional[str],
+                 carcols_range: Optional[Tuple[int, int]], modkit_range: Optional[Tuple[int, int]],
+                 allocator: Optional[str]):
+    """Resolve every resource in directories or manifest files, in parallel, without shared IDs."""
+    try:
+        options = {
+            'jobs': jobs,
+            'allocator': allocator,
+            'carcols_range': carcols_range or CARCOLS_ID_RANGE,
+            'modkit_range': modkit_range or MODKIT_ID_RANGE,
+            'carcols': do_carcols,
+            'modkits': do_modkits,
+            'backup_root': None if no_backup else DEFAULT_BACKUP_ROOT,
+        }
+        if registry:
+            with IDRegistry(registry) as id_registry:
+                result = resolve_batch(list(sources), registry=id_registry, **options)
+        else:
+            result = resolve_batch(list(sources), **options)
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+    for outcome in result.resources:
+        if outcome.error is not None:
+            click.echo(f"{outcome.resource}: failed: {outcome.error}")
+        else:
+            changed = ', '.join(f"{count} {key}" for key, count in outcome.changes.items() if count)
+            click.echo(f"{outcome.resource}: {changed or 'no changes'}")
+    if result.errors:
+        click.echo(f"\nSkipped ({len(result.errors)}):")
+        for source, error in result.errors.items():
+            click.echo(f"  {source}: {error}")
+    if result.snapshot_id:
+        click.echo(f"\nBackup snapshot: {result.snapshot_id}")
+    if result.journal_id:
+        click.echo(f"Change journal: {result.journal_id} (undo with `undo {result.journal_id}`)")
+
+    if result.failed or result.errors:
+        ctx.exit(1)
+
+@cli.command()
+@click.argument('carcols_path', type=click.Path(exists=True))
+@click.argument('carvariations_path', type=click.Path(exists=True))
+@click.option('--kind', type=click.Choice(['carcols', 'modkit', 'all']), default='all', show_default=True,
+              help='Which IDs to renumber')
+@id_options
+def compact(carcols_path: str, carvariations_path: str, kind: str, registry: Optional[str],
+            carcols_range: Optional[Tuple[int, int]], modkit_range: Optional[Tuple[int, int]],
+            allocator: Optional[str]):
+    """Renumber a resource's IDs into dense consecutive blocks."""
+    try:
+        carcols, carvariations = validate_files(carcols_path, carvariations_path)
 
-        # Resolve conflicts
-        changes = resolver.resolve_modkit_conflicts(vehicle)
+        resolver = open_resolver(carcols, carvariations, registry, carcols_range, modkit_range,
+                                 allocator=allocator)
+        with ResolverSession(resolver) as session:
+            for id_kind in (['carcols', 'modkit'] if kind == 'all' else [kind]):
+                session.compact(id_kind)
 
         # Report changes
-        click.echo("\nChanges made:")
-        click.echo("\nCarcols.meta changes:")
-        for old, new in changes['carcols']:
-            click.echo(f"  {old} → {new}")
+        echo_session(session)
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+@cli.command()
+@click.argument('resources_dir', type=click.Path(exists=True, file_okay=False))
+@click.option('--jobs', '-j', type=int, help='Number of parser processes (default: CPU count)')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+def scan(resources_dir: str, jobs: Optional[int], as_json: bool):
+    """Report duplicate IDs and kitNames across a resources directory (read-only)."""
+    try:
+        start = time.perf_counter()
+        report = scan_resources(resources_dir, jobs=jobs)
+        elapsed = time.perf_counter() - start
+
+        if as_json:
+            click.echo(json.dumps(report.to_dict(), indent=2))
+            return
+
+        file_count = sum(len(paths) for paths in report.resources.values())
+        click.echo(f"Scanned {file_count} meta files in {len(report.resources)} resources ({elapsed:.2f}s)")
+
+        for kind in DUPLICATE_KINDS:
+            duplicates = report.duplicates(kind)
+            click.echo(f"\nDuplicate {KIND_LABELS[kind]} ({len(duplicates)}):")
+            for value, resources in duplicates.items():
+                click.echo(f"  {value}: {', '.join(resources)}")
+
+        if report.errors:
+            click.echo(f"\nFiles that could not be parsed ({len(report.errors)}):")
+            for file_path, error in report.errors.items():
+                click.echo(f"  {file_path}: {error}")
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+@cli.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--registry', type=click.Path(exists=True, dir_okay=False),
+              help='ID registry to also check against the rest of the server (see `index`)')
+@click.option('--jobs', '-j', type=int, help='Number of parser processes (default: CPU count)')
+@click.option('--matrix', 'show_matrix', is_flag=True, help='Also list which resources share IDs, per pair')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+@click.pass_context
+def check(ctx: click.Context, paths: Tuple[str, ...], registry: Optional[str], jobs: Optional[int],
+          show_matrix: bool, as_json: bool):
+    """Exit non-zero if the given meta files or resources define an ID or kitName twice (read-only)."""
+    try:
+        resources = {}
+        for path in paths:
+            if Path(path).is_dir():
+                for resource, found in discover_meta_files(path).items():
+                    resources.update((str(file), resource) for file in found)
+            else:
+                resources[path] = Path(path).parent.name
+        files = list(resources)
+
+        identities, errors = {}, {}
+        for file_path, identity, error in parse_files(files, jobs=jobs):
+            if identity is None:
+                errors[file_path] = error
+            else:
+                identities[file_path] = identity
+
+        if registry:
+            with IDRegistry(registry) as id_registry:
+                report = find_conflicts(identities, id_registry)
+        else:
+            report = find_conflicts(identities)
+        report.errors.update(errors)
+
+        shared = {}
+        if show_matrix:
+            for kind in ID_KINDS:
+                matrix = conflict_matrix(occupancy_by_resource(identities, kind, resources))
+                shared[kind] = list(matrix.pairs())
+
+        if as_json:
+            output = report.to_dict()
+            if show_matrix:
+                output['shared'] = {kind: [list(pair) for pair in pairs] for kind, pairs in shared.items()}
+            click.echo(json.dumps(output, indent=2))
+        else:
+            click.echo(f"Checked {len(identities)} meta files: {len(report.conflicts)} conflicts")
+            echo_conflicts("Conflicting", report.conflicts)
+            for kind, pairs in shared.items():
+                if pairs:
+                    click.echo(f"\nResources sharing {KIND_LABELS[kind]} ({len(pairs)} pairs):")
+                    for first, second, count in sorted(pairs, key=lambda pair: -pair[2]):
+                        click.echo(f"  {first} and {second}: {count}")
+            if report.errors:
+                click.echo(f"\nFiles that could not be parsed ({len(report.errors)}):")
+                for file_path, error in report.errors.items():
+                    click.echo(f"  {file_path}: {error}")
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+    if report.conflicts or report.errors:
+        ctx.exit(1)
+
+@cli.command()
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--rule', '-r', 'rule_names', multiple=True, help='Run only this rule (repeatable)')
+@click.option('--disable', '-d', multiple=True, help='Skip this rule (repeatable)')
+@click.option('--registry', type=click.Path(exists=True, dir_okay=False),
+              help='ID registry; sirens and kits defined elsewhere on the server count as defined')
+@click.option('--jobs', '-j', type=int, help='Number of parser processes (default: CPU count)')
+@click.option('--json', 'as_json', is_flag=True, help='Print the issues as JSON')
+@click.pass_context
+def lint(ctx: click.Context, paths: Tuple[str, ...], rule_names: Tuple[str, ...], disable: Tuple[str, ...],
+         registry: Optional[str], jobs: Optional[int], as_json: bool):
+    """Check meta files for broken references and malformed values; exit non-zero on errors (read-only)."""
+    try:
+        rules = list(iter_rules(rule_names, disable))
+        if registry:
+            with IDRegistry(registry) as id_registry:
+                report = lint_paths(paths, jobs=jobs, rules=rules, registry=id_registry)
+        else:
+            report = lint_paths(paths, jobs=jobs, rules=rules)
+
+        if as_json:
+            click.echo(json.dumps(report.to_dict(), indent=2))
+        else:
+            for issue in report.issues:
+                location = f"{issue.path}:{issue.line}" if issue.line else issue.path
+                click.echo(f"{location}: {issue.severity} [{issue.rule}] {issue.message}")
+            click.echo(f"Linted {len(report.files)} meta files: {len(report.errors)} errors, "
+                       f"{len(report.issues) - len(report.errors)} warnings")
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+    if report.errors:
+        ctx.exit(1)
+
+@cli.command()
+@click.argument('resources_dir', type=click.Path(exists=True, file_okay=False))
+@click.option('--registry', default='meta_registry.db', show_default=True,
+              type=click.Path(dir_okay=False), help='SQLite registry file')
+@click.option('--jobs', '-j', type=int, help='Number of parser processes (default: CPU count)')
+def index(resources_dir: str, registry: str, jobs: Optional[int]):
+    """Build or refresh the server-wide ID registry."""
+    try:
+        start = time.perf_counter()
+        with IDRegistry(registry) as id_registry:
+            stats = id_registry.refresh(resources_dir, jobs=jobs)
+        elapsed = time.perf_counter() - start
+
+        click.echo(
+            f"Registry {registry} refreshed in {elapsed:.2f}s: "
+            f"{stats['added']} added, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['removed']} removed"
+        )
+        if stats['errors']:
+            click.echo(f"{stats['errors']} files could not be parsed", err=True)
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+@cli.command()
+@click.argument('resources_dir', type=click.Path(exists=True, file_okay=False))
+@click.option('--quiet', 'quiet_period', type=float, default=QUIET_PERIOD, show_default=True,
+              help='Seconds without further saves before changes are checked')
+@click.option('--max-delay', type=float, default=MAX_DELAY, show_default=True,
+              help='Seconds after the first save of a burst it is checked at the latest')
+@click.option('--jobs', '-j', type=int, help='Number of parser processes for the first pass (default: CPU count)')
+def watch(resources_dir: str, quiet_period: float, max_delay: float, jobs: Optional[int]):
+    """Re-check meta files for ID and kitName conflicts whenever they are saved."""
+    try:
+        watcher = MetaWatcher(resources_dir, quiet=quiet_period, max_delay=max_delay)
+        start = time.perf_counter()
+        conflicts = watcher.start(jobs=jobs)
+        click.echo(f"Watching {len(watcher.index)} meta files ({time.perf_counter() - start:.2f}s), "
+                   f"{len(conflicts)} conflicts; press Ctrl+C to stop")
+        echo_conflicts("Conflicting", conflicts)
+
+        for batch in watcher.watch():
+            stamp = time.strftime('%H:%M:%S')
+            click.echo(f"\n[{stamp}] {len(batch.changed)} changed, {len(batch.removed)} removed "
+                       f"(checked in {batch.latency * 1000:.0f} ms)")
+            echo_conflicts("New conflicting", batch.new_conflicts)
+            echo_conflicts("Resolved conflicting", batch.resolved)
+            for file_path, error in batch.errors.items():
+                click.echo(f"Could not parse {file_path}: {error}")
+
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+@cli.command()
+@click.argument('sources', nargs=-1, required=True, type=click.Path(exists=True, file_okay=False))
+@click.option('--output', '-o', required=True, type=click.Path(file_okay=False),
+              help='Directory for the merged carcols.meta and carvariations.meta')
+@click.option('--jobs', '-j', type=int, help='Number of parser processes (default: CPU count)')
+@id_options
+def merge(sources: Tuple[str, ...], output: str, jobs: Optional[int], registry: Optional[str],
+          carcols_range: Optional[Tuple[int, int]], modkit_range: Optional[Tuple[int, int]],
+          allocator: Optional[str]):
+    """Merge the meta files of many resources into one conflict-free pack."""
+    try:
+        options = {
+            'carcols_range': carcols_range or CARCOLS_ID_RANGE,
+            'modkit_range': modkit_range or MODKIT_ID_RANGE,
+            'jobs': jobs,
+            'allocator': allocator,
+        }
+        if registry:
+            with IDRegistry(registry) as id_registry:
+                result = merge_resources(list(sources), output, registry=id_registry, **options)
+        else:
+            result = merge_resources(list(sources), output, **options)
+
+        click.echo(f"Merged {len(result.resources)} resources "
+                   f"({', '.join(f'{count} {section}' for section, count in result.items.items())})")
+        for path in result.outputs.values():
+            click.echo(f"  wrote {path}")
+
+        for resource in result.resources:
+            if resource.sirens or resource.kits:
+                click.echo(f"\n{resource.name}:")
+                for old, new in resource.sirens.items():
+                    click.echo(f"  siren {old} → {new}")
+                for old, (new_name, _) in resource.kits.items():
+                    click.echo(f"  kit {old} → {new_name}")
+
+        if result.duplicate_models:
+            click.echo(f"\nVehicles defined by more than one resource ({len(result.duplicate_models)}):")
+            for model, owners in result.duplicate_models.items():
+                click.echo(f"  {model}: {', '.join(owners)}")
+        if result.errors:
+            click.echo(f"\nFiles skipped ({len(result.errors)}):")
+            for file_path, error in result.errors.items():
+                click.echo(f"  {file_path}: {error}")
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+@cli.command()
+@click.argument('carcols_path', type=click.Path(exists=True))
+@click.argument('carvariations_path', type=click.Path(exists=True))
+@click.option('--output', '-o', required=True, type=click.Path(file_okay=False),
+              help='Directory for the per-vehicle fragment directories')
+@click.option('--manifest', type=click.Path(exists=True, dir_okay=False),
+              help='fxmanifest.lua whose data_file lines for the input files are replaced by the fragments')
+@click.option('--jobs', '-j', type=int, help='Number of processes writing fragments (default: CPU count)')
+def split(carcols_path: str, carvariations_path: str, output: str, manifest: Optional[str], jobs: Optional[int]):
+    """Split a carcols/carvariations pair into per-vehicle fragments."""
+    try:
+        carcols, carvariations = validate_files(carcols_path, carvariations_path)
+        result = split_meta_files(str(carcols), str(carvariations), output, jobs=jobs)
+
+        shared = sum(result.shared_items.values())
+        click.echo(f"Split {result.vehicles} vehicles into {len(result.files)} files "
+                   f"({shared} Items shared by several vehicles or none)")
+
+        resource_dir = Path(manifest).parent if manifest else Path.cwd()
+        lines = result.data_files(resource_dir)
+        if manifest:
+            removed = update_manifest(manifest, [str(carcols), str(carvariations)], lines)
+            click.echo(f"Replaced {removed} data_file lines in {manifest} with {len(lines)}")
+        else:
+            click.echo("\nfxmanifest.lua data_file lines:")
+            for line in lines:
+                click.echo(line)
+
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+@cli.command('serve-allocator')
+@click.option('--host', default='127.0.0.1', show_default=True, help='Address to listen on')
+@click.option('--port', type=int, default=DEFAULT_ALLOCATOR_PORT, show_default=True, help='Port to listen on')
+@click.option('--state', 'state_path', default='allocator_state.jsonl', show_default=True,
+              type=click.Path(dir_okay=False), help='File the claimed IDs are kept in across restarts')
+@click.option('--registry', type=click.Path(exists=True, dir_okay=False),
+              help='ID registry whose IDs are never handed out (see `index`)')
+def serve_allocator(host: str, port: int, state_path: str, registry: Optional[str]):
+    """Run a shared ID allocation service for concurrent tool runs (see --allocator)."""
+    try:
+        used = set()
+        if registry:
+            with IDRegistry(registry) as id_registry:
+                used = id_registry.used_ids()
+        server = AllocatorServer((host, port), AllocatorState(state_path, used=used))
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+    click.echo(f"Allocating IDs at {server.url} ({len(server.state.used)} in use); press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+@cli.group()
+def backups():
+    """List, restore and prune backup snapshots."""
+    pass
+
+store_option = click.option('--store', default=DEFAULT_BACKUP_ROOT, show_default=True,
+                            type=click.Path(file_okay=False), help='Backup store directory')
+
+@backups.command('list')
+@store_option
+def list_backups(store: str):
+    """List backup snapshots, oldest first."""
+    try:
+        for manifest in BackupStore(store).list_snapshots():
+            files = ', '.join(Path(entry['path']).name for entry in manifest['files'])
+            click.echo(f"{manifest['id']}  {files}")
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+@backups.command('restore')
+@click.argument('snapshot_id', required=False)
+@click.option('--to', 'target_dir', type=click.Path(file_okay=False), help='Restore into this directory instead')
+@store_option
+def restore_backup(snapshot_id: Optional[str], target_dir: Optional[str], store: str):
+    """Restore a backup snapshot (default: the latest)."""
+    try:
+        restored = BackupStore(store).restore(snapshot_id, target_dir)
+        for file_path in restored:
+            click.echo(f"Restored {file_path}")
+        if not restored:
+            click.echo("All files already match the snapshot")
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+@backups.command('prune')
+@click.option('--keep', type=int, help='Keep the N newest snapshots')
+@click.option('--max-age', type=float, help='Keep snapshots younger than this many days')
+@store_option
+def prune_backups(keep: Optional[int], max_age: Optional[float], store: str):
+    """Delete old snapshots and unreferenced backup data."""
+    try:
+        removed = BackupStore(store).prune(keep_last=keep, max_age_days=max_age)
+        click.echo(f"Removed {removed['snapshots']} snapshots and {removed['objects']} blobs")
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
+
+def echo_journal(verb: str, applied: ChangeJournal, journal_id: Optional[str]) -> None:
+    """Print the files an undo or replay changed."""
+    for entry in applied.files:
+        click.echo(f"{verb} {len(entry.changes)} values in {entry.path}")
+    if journal_id:
+        click.echo(f"\nRecorded as change journal {journal_id}")
+    else:
+        click.echo("All files already match the journal")
 
-        click.echo("\nCarvariations.meta changes:")
-        for old, new in changes['variations']:
-            click.echo(f"  {old} → {new}")
+@cli.command()
+@click.argument('journal_id', required=False)
+@store_option
+def undo(journal_id: Optional[str], store: str):
+    """Revert the changes of a run (default: the latest one not undone yet)."""
+    try:
+        journals = JournalStore(store)
+        applied = apply_journal(journals.get(journal_id), reverse=True)
+        echo_journal("Reverted", applied, journals.record(applied) if len(applied) else None)
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
 
-        click.echo("\nBackups created in backups_* directory")
+@cli.command()
+@click.argument('journal_id')
+@click.option('--root', type=click.Path(exists=True, file_okay=False),
+              help="Apply to the same files below this directory, e.g. a production copy "
+                   "(paths are taken relative to the journal's common directory)")
+@store_option
+def replay(journal_id: str, root: Optional[str], store: str):
+    """Make the changes of a recorded run again, on the same files or a copy of them."""
+    try:
+        journals = JournalStore(store)
+        applied = apply_journal(journals.get(journal_id), root=root)
+        echo_journal("Changed", applied, journals.record(applied) if len(applied) else None)
+    except Exception as e:
+        click.echo(f"Error: {str(e)}", err=True)
+        raise click.Abort()
 
+@cli.command()
+@store_option
+def history(store: str):
+    """List recorded change journals, oldest first."""
+    try:
+        for journal in JournalStore(store).list():
+            note = f"  (undoes {journal.reverts})" if journal.reverts else ''
+            click.echo(f"{journal.id}  {len(journal)} changes in {len(journal.files)} files{note}")
     except Exception as e:
         click.echo(f"Error: {str(e)}", err=True)
         raise click.Abort()
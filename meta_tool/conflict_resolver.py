@@ -23,35 +23,212 @@ Note:
 """
 
 import logging
-from typing import Optional, Set, Dict, List, Tuple
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Iterable, Optional, Set, Dict, List, Tuple, Union
 from pathlib import Path
 from lxml import etree
-import re
 
 from .meta_file_handler import MetaFileHandler
-from .id_generator import IDGenerator
+from .allocator import RemoteIDGenerator
+from .cache import file_key
+from .id_generator import CARCOLS_ID_RANGE, IDGenerator, MODKIT_ID_RANGE
+from .metrics import metrics
+from .transaction import FileTransaction
+from .vehicle_index import VehicleEntry, VehicleIndex
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+@dataclass
+class ModkitEntry:
+    """Every element carrying one modkit name across both meta files."""
+    name_elems: List[etree._Element] = field(default_factory=list)
+    id_elems: List[etree._Element] = field(default_factory=list)
+    variation_items: List[etree._Element] = field(default_factory=list)
+
+
+@dataclass
+class PlannedChange:
+    """One value a resolution plan will rewrite."""
+    vehicle: str
+    kind: str  # identity node kind: siren_id, siren_ref, kit_name, modkit_id or kit_ref
+    file: str  # 'carcols' or 'variations'
+    old_value: str
+    new_value: str
+
+
+@dataclass
+class ResolutionPlan:
+    """New IDs worked out by a resolver, not yet written to the files."""
+    kind: str  # 'carcols' or 'modkit'
+    mapping: Dict[str, str]
+    changes: List[PlannedChange] = field(default_factory=list)
+    applied: bool = False  # set by apply_plan; a plan can only be applied once
+
+
 class ConflictResolver:
     """Resolves ID conflicts in GTA V meta files."""
 
-    def __init__(self, carcols_path: str, carvariations_path: str):
+    def __init__(self, carcols_path: str, carvariations_path: str, registry=None,
+                 carcols_range: Tuple[int, int] = CARCOLS_ID_RANGE,
+                 modkit_range: Tuple[int, int] = MODKIT_ID_RANGE,
+                 carcols_root: Optional[etree._Element] = None,
+                 carvariations_root: Optional[etree._Element] = None,
+                 only_conflicts: bool = False,
+                 allocator: Optional[str] = None):
+        """
+        Args:
+            carcols_path: Path to carcols.meta
+            carvariations_path: Path to carvariations.meta
+            registry: Optional IDRegistry of IDs used elsewhere on the server
+            carcols_range: Inclusive range for new carcols (siren) IDs
+            modkit_range: Inclusive range for new modkit IDs
+            carcols_root: Already parsed carcols.meta, to skip loading it again
+            carvariations_root: Already parsed carvariations.meta, to skip loading it again
+            only_conflicts: Remap only IDs that collide (see conflicting_siren_ids and
+                conflicting_kits) instead of every ID in scope
+            allocator: Optional address of an ID allocation service to claim new IDs from
+        """
         self.file_handler = MetaFileHandler()
         self.carcols_path = Path(carcols_path)
         self.carvariations_path = Path(carvariations_path)
 
+        # Stat before reading, so a change made while loading is caught on save
+        self._loaded_keys = {path: file_key(str(path)) for path in (self.carcols_path, self.carvariations_path)}
+
         # Load and validate files
-        self.carcols_root, _ = self.file_handler.load_meta_file(str(carcols_path))
-        self.carvariations_root, _ = self.file_handler.load_meta_file(str(carvariations_path))
+        if carcols_root is None:
+            carcols_root, _ = self.file_handler.load_meta_file(str(carcols_path))
+        if carvariations_root is None:
+            carvariations_root, _ = self.file_handler.load_meta_file(str(carvariations_path))
+        self.carcols_root = carcols_root
+        self.carvariations_root = carvariations_root
+
+        # Write each resolution to disk as soon as it is applied; a
+        # ResolverSession turns this off and saves once at the end
+        self.autosave = True
+        self.only_conflicts = only_conflicts
+
+        # Values other files on the server define, for conflict detection
+        self.external: Dict[str, Set[str]] = {'siren_ids': set(), 'modkit_ids': set(), 'kit_names': set()}
+        if registry is not None:
+            own_files = [str(self.carcols_path), str(self.carvariations_path)]
+            for kind in self.external:
+                self.external[kind] = set(registry.definitions(kind, exclude=own_files))
+
+        # Original values of modified elements, per file, for in-place saving
+        self._pending: Dict[Path, Dict[etree._Element, Tuple[str, bool]]] = {
+            self.carcols_path: {},
+            self.carvariations_path: {},
+        }
+
+        # Index siren IDs and modkits once so lookups during resolution are O(1)
+        with metrics.span('resolver.index') as span:
+            self._build_siren_index()
+            self._build_modkit_index()
+            self.vehicle_index = VehicleIndex(self.carcols_root, self.carvariations_root)
+            span.add(siren_ids=len(self.siren_settings_index), kits=len(self.modkit_index),
+                     vehicles=len(self.vehicle_index))
+
+        # Initialize ID generator with existing IDs (and server-wide ones, if known)
+        options = {'registry': registry, 'carcols_range': carcols_range, 'modkit_range': modkit_range}
+        if allocator:
+            self.id_generator = RemoteIDGenerator(allocator, self.get_existing_ids(), **options)
+        else:
+            self.id_generator = IDGenerator(self.get_existing_ids(), **options)
+
+    def _build_siren_index(self) -> None:
+        """Build value -> elements indexes for siren IDs in both meta files."""
+        self.siren_id_index: Dict[str, List[etree._Element]] = defaultdict(list)
+        for id_elem in self.carcols_root.iterfind(".//Sirens/Item/id"):
+            value = id_elem.attrib.get('value')
+            if value is not None:
+                self.siren_id_index[value].append(id_elem)
+
+        self.siren_settings_index: Dict[str, List[etree._Element]] = defaultdict(list)
+        for siren in self.carvariations_root.iterfind(".//variationData/Item/sirenSettings"):
+            value = siren.attrib.get('value')
+            if value is not None:
+                self.siren_settings_index[value].append(siren)
+
+    def _build_modkit_index(self) -> None:
+        """Build a kitName -> ModkitEntry index over both meta files."""
+        self.modkit_index: Dict[str, ModkitEntry] = defaultdict(ModkitEntry)
+        for kit in self.carcols_root.iterfind(".//Kits/Item"):
+            name_elem = kit.find("kitName")
+            if name_elem is None or not name_elem.text:
+                continue
+            entry = self.modkit_index[name_elem.text]
+            entry.name_elems.append(name_elem)
+            id_elem = kit.find("id")
+            if id_elem is not None:
+                entry.id_elems.append(id_elem)
+
+        for item in self.carvariations_root.iterfind(".//kits/Item"):
+            if item.text:
+                self.modkit_index[item.text].variation_items.append(item)
+
+    def _set_value(self, file_path: Path, elem: etree._Element, value: str, attribute: bool = True) -> None:
+        """Set an element's value attribute (or text) and remember the original for saving."""
+        if elem not in self._pending[file_path]:
+            original = elem.attrib.get('value', '') if attribute else (elem.text or '').strip()
+            self._pending[file_path][elem] = (original, attribute)
+        if attribute:
+            elem.attrib['value'] = value
+        else:
+            elem.text = value
+
+    @metrics.timed('resolver.save')
+    def save(self, journal=None) -> None:
+        """
+        Write pending changes, patching only the modified values where possible.
 
-        # Initialize ID generator with existing IDs
-        self.id_generator = IDGenerator(self.get_existing_ids())
+        Both files are replaced in one FileTransaction: under a lock on their
+        resource, and either both or neither.
+
+        Args:
+            journal: Optional ChangeJournal to record the written changes in
+
+        Raises:
+            ValueError: If a file changed on disk since it was loaded, its
+                resource stays locked by another run, or writing fails
+        """
+        roots = {self.carcols_path: self.carcols_root, self.carvariations_path: self.carvariations_root}
+        changed = [file_path for file_path, pending in self._pending.items() if pending]
+        if not changed:
+            return
+
+        try:
+            with FileTransaction(changed) as transaction:
+                for file_path in changed:
+                    if file_key(str(file_path)) != self._loaded_keys[file_path]:
+                        raise ValueError(f"{file_path} was changed on disk by another run since it was loaded")
+                    patched = self.file_handler.save_changes(str(file_path), roots[file_path],
+                                                             self._pending[file_path], transaction, journal)
+                    logger.debug("Saving %d changes to %s (%s)", len(self._pending[file_path]), file_path,
+                                 'patched' if patched else 'rewritten')
+        except Exception:
+            # The cached trees hold edits the files do not; parse them again next time
+            for file_path in changed:
+                self.file_handler.documents.forget(str(file_path))
+            raise
+
+        for file_path in changed:
+            self._pending[file_path].clear()
+            self._loaded_keys[file_path] = file_key(str(file_path))
+
+    def has_pending_changes(self) -> bool:
+        """Return True if values were changed in memory but not saved yet."""
+        return any(self._pending.values())
 
     def get_existing_ids(self) -> Set[int]:
         """Collect all existing IDs from both meta files."""
+        with metrics.span('resolver.collect_ids') as span:
+            ids = self._collect_ids()
+            span.add(ids=len(ids))
+        return ids
+
+    def _collect_ids(self) -> Set[int]:
         ids = set()
 
         # Collect from carcols.meta
@@ -66,153 +243,346 @@ class ConflictResolver:
 
         return ids
 
-    def resolve_carcols_conflicts(self, vehicle_name: Optional[str] = None) -> Dict[str, List[Tuple[str, str]]]:
+    def conflicting_siren_ids(self) -> Set[str]:
+        """Return the siren IDs defined here that another file on the server defines too."""
+        conflicting = set()
+        for value, id_elems in self.siren_id_index.items():
+            if value in self.external['siren_ids']:
+                conflicting.add(value)
+            elif len(id_elems) > 1:
+                # Remapping moves every definition of a value together, so this cannot be fixed here
+                logger.warning("Siren ID %s is defined %d times in %s", value, len(id_elems), self.carcols_path)
+        return conflicting
+
+    def conflicting_kits(self) -> Set[str]:
         """
-        Resolve carcols ID conflicts for specified vehicle or all vehicles.
+        Return the kits whose modkit ID or kitName collides.
+
+        A kit collides if another file on the server defines its ID or name,
+        or if an earlier kit in this file already uses its ID.
+        """
+        conflicting = set()
+        seen_ids: Set[str] = set()
+        for kit_name in self._modkit_names():
+            entry = self.modkit_index[kit_name]
+            ids = {kit_name.split('_')[0]} | {elem.attrib.get('value', '') for elem in entry.id_elems}
+            ids.discard('')
+            if kit_name in self.external['kit_names'] or ids & self.external['modkit_ids'] or ids & seen_ids:
+                conflicting.add(kit_name)
+            seen_ids |= ids
+        return conflicting
+
+    def select_vehicles(self, vehicles: Union[str, Iterable[str], None],
+                        match: str = 'exact') -> Optional[List[VehicleEntry]]:
+        """
+        Look up the vehicles a resolution is limited to.
 
         Args:
-            vehicle_name: Optional name of specific vehicle to process
+            vehicles: A vehicle name or glob pattern, several of them, or None for all vehicles
+            match: 'exact' or 'prefix' matching of plain names (see VehicleIndex.select)
 
         Returns:
-            Dictionary of changes made {type: [(old_value, new_value)]}
+            The selected vehicles, or None if every vehicle is in scope
         """
-        changes = {'carcols': [], 'variations': []}
-        logger.debug(f"Starting carcols conflict resolution for vehicle: {vehicle_name if vehicle_name else 'all'}")
+        if isinstance(vehicles, str):
+            vehicles = [vehicles]
+        if not vehicles:
+            return None
+        return self.vehicle_index.select(vehicles, match)
+
+    def plan_carcols_conflicts(self, vehicles: Union[str, Iterable[str], None] = None,
+                               match: str = 'exact') -> ResolutionPlan:
+        """
+        Work out new carcols IDs for the given vehicles or all vehicles without changing anything.
+
+        The new IDs are reserved until the plan is applied or discarded.
 
-        # Find all Items in carvariations.meta that have sirenSettings
-        items = self.carvariations_root.findall(".//variationData/Item")
-        logger.debug(f"Found {len(items)} Items in carvariations.meta")
+        Args:
+            vehicles: Optional vehicle name, glob pattern or list of them to process
+            match: 'exact' or 'prefix' matching of plain vehicle names
 
-        for item in items:
-            # Check if this Item is for our vehicle
-            if vehicle_name and not self._is_vehicle_element(item, vehicle_name):
+        Returns:
+            ResolutionPlan: The old -> new siren IDs and every value they will rewrite
+        """
+        selection = self.select_vehicles(vehicles, match)
+        logger.debug("Starting carcols conflict resolution for %s vehicles",
+                     len(selection) if selection is not None else 'all')
+        with metrics.span('resolver.plan') as span:
+            plan = self._plan_carcols(selection)
+            span.add(ids=len(plan.mapping), changes=len(plan.changes))
+        return plan
+
+    def _plan_carcols(self, selection: Optional[List[VehicleEntry]]) -> ResolutionPlan:
+        # Collect the siren IDs in scope, in document order
+        if selection is not None:
+            old_ids = [value for entry in selection for value in entry.siren_ids()]
+        else:
+            old_ids = list(self.siren_settings_index)
+        if self.only_conflicts:
+            conflicting = self.conflicting_siren_ids()
+            if selection is None:
+                # Colliding definitions move even if nothing references them
+                old_ids = list(self.siren_id_index)
+            old_ids = [value for value in old_ids if value in conflicting]
+
+        # Remap each siren ID once; every sirenSettings and carcols id sharing
+        # the old value moves with it so references stay consistent
+        old_ids = list(dict.fromkeys(old_ids))
+        with metrics.span('ids.allocate') as span:
+            # One batch, so a remote allocator is asked once per plan
+            new_ids = self.id_generator.generate_carcols_ids(len(old_ids)) if old_ids else []
+            mapping: Dict[str, str] = {old_id: str(new_id) for old_id, new_id in zip(old_ids, new_ids)}
+            span.add(ids=len(mapping))
+
+        changes = []
+        for old_id, new_id in mapping.items():
+            sirens = self.siren_settings_index.get(old_id, [])
+            vehicles = [self._model_name(siren.getparent()) for siren in sirens]
+            for vehicle in vehicles:
+                changes.append(PlannedChange(vehicle, 'siren_ref', 'variations', old_id, new_id))
+            shared_by = ', '.join(sorted({vehicle for vehicle in vehicles if vehicle}))
+            for _ in self.siren_id_index.get(old_id, []):
+                changes.append(PlannedChange(shared_by, 'siren_id', 'carcols', old_id, new_id))
+
+        return ResolutionPlan('carcols', mapping, changes)
+
+    def plan_modkit_conflicts(self, vehicles: Union[str, Iterable[str], None] = None,
+                              match: str = 'exact') -> ResolutionPlan:
+        """
+        Work out new modkit IDs for the given vehicles or all vehicles without changing anything.
+
+        A vehicle's kits are those named after it and those its variations
+        reference. The new IDs are reserved until the plan is applied or
+        discarded.
+
+        Args:
+            vehicles: Optional vehicle name, glob pattern or list of them to process
+            match: 'exact' or 'prefix' matching of plain vehicle names
+
+        Returns:
+            ResolutionPlan: The kit name -> new modkit IDs and every value they will rewrite
+        """
+        selection = self.select_vehicles(vehicles, match)
+        with metrics.span('resolver.plan') as span:
+            plan = self._plan_modkits(selection)
+            span.add(ids=len(plan.mapping), changes=len(plan.changes))
+        return plan
+
+    def _plan_modkits(self, selection: Optional[List[VehicleEntry]]) -> ResolutionPlan:
+        kit_names = self._modkit_names()
+        if selection is not None:
+            wanted = {kit_name for entry in selection for kit_name in entry.kit_names()}
+            kit_names = [kit_name for kit_name in kit_names if kit_name in wanted]
+        if self.only_conflicts:
+            conflicting = self.conflicting_kits()
+            kit_names = [kit_name for kit_name in kit_names if kit_name in conflicting]
+
+        # Process each modkit defined in carcols.meta exactly once
+        with metrics.span('ids.allocate') as span:
+            new_ids = self.id_generator.generate_modkit_ids(len(kit_names)) if kit_names else []
+            mapping: Dict[str, str] = {kit_name: str(new_id) for kit_name, new_id in zip(kit_names, new_ids)}
+            span.add(ids=len(mapping))
+
+        changes = []
+        for kit_name, new_id in mapping.items():
+            entry = self.modkit_index[kit_name]
+            old_id = kit_name.split('_')[0]
+            new_kit_name = self._renamed_kit(kit_name, new_id)
+            if new_kit_name == kit_name:
                 continue
+            vehicle = kit_name.split('_')[1] if '_' in kit_name else ''
+            for _ in entry.name_elems:
+                changes.append(PlannedChange(vehicle, 'kit_name', 'carcols', kit_name, new_kit_name))
+            for id_elem in entry.id_elems:
+                if id_elem.attrib.get('value') == old_id:
+                    changes.append(PlannedChange(vehicle, 'modkit_id', 'carcols', old_id, new_id))
+            for _ in entry.variation_items:
+                changes.append(PlannedChange(vehicle, 'kit_ref', 'variations', kit_name, new_kit_name))
+
+        return ResolutionPlan('modkit', mapping, changes)
+
+    def apply_plan(self, plan: ResolutionPlan) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        Apply a plan from plan_carcols_conflicts / plan_modkit_conflicts and save both files.
+
+        The plan must have been made by this resolver, with no other plan
+        applied since.
 
-            # Find sirenSettings directly under this Item
-            siren_settings = item.findall("sirenSettings")
-            if siren_settings:
-                logger.debug(f"Found {len(siren_settings)} sirenSettings elements")
-                for siren in siren_settings:
-                    if 'value' not in siren.attrib:
-                        continue
-
-                    old_id = siren.attrib['value']
-                    new_id = str(self.id_generator.generate_carcols_id())
-                    logger.debug(f"Replacing sirenSettings ID {old_id} with {new_id}")
-
-                    # Update sirenSettings in carvariations.meta
-                    siren.attrib['value'] = new_id
-                    changes['variations'].append((old_id, new_id))
-
-                    # Find and update corresponding id in carcols.meta
-                    for id_elem in self.carcols_root.findall(".//id"):
-                        if id_elem.attrib.get('value') == old_id:
-                            id_elem.attrib['value'] = new_id
-                            changes['carcols'].append((old_id, new_id))
-                            logger.debug(f"Updated corresponding ID in carcols.meta")
+        Args:
+            plan: The plan to apply
+
+        Returns:
+            Dictionary of changes made {type: [(old_value, new_value)]}
+
+        Raises:
+            ValueError: If the plan has already been applied
+        """
+        if plan.applied:
+            raise ValueError(f"The {plan.kind} plan has already been applied")
+        changes = {'carcols': [], 'variations': []}
+        with metrics.span('resolver.apply') as span:
+            if plan.kind == 'carcols':
+                self._remap_sirens(plan.mapping, changes)
+            else:
+                self._remap_modkits(plan.mapping, changes)
+            span.add(changes=len(changes['carcols']) + len(changes['variations']))
+        plan.applied = True
 
         # Save changes if any were made
-        if changes['carcols'] or changes['variations']:
-            self.file_handler.save_meta_file(str(self.carcols_path), self.carcols_root)
-            self.file_handler.save_meta_file(str(self.carvariations_path), self.carvariations_root)
-            logger.debug("Changes saved to both files")
+        if self.autosave:
+            self.save()
 
         return changes
 
-    def resolve_modkit_conflicts(self, vehicle_name: Optional[str] = None) -> Dict[str, List[Tuple[str, str]]]:
+    def discard_plan(self, plan: ResolutionPlan) -> None:
+        """Return the IDs reserved by a plan that will not be applied; an applied plan's IDs stay in use."""
+        if plan.applied:
+            return
+        self.id_generator.release(int(new_id) for new_id in plan.mapping.values())
+
+    def resolve_carcols_conflicts(self, vehicles: Union[str, Iterable[str], None] = None,
+                                  match: str = 'exact') -> Dict[str, List[Tuple[str, str]]]:
         """
-        Resolve modkit ID conflicts for specified vehicle or all vehicles.
+        Resolve carcols ID conflicts for the given vehicles or all vehicles.
 
         Args:
-            vehicle_name: Optional name of specific vehicle to process
+            vehicles: Optional vehicle name, glob pattern or list of them to process
+            match: 'exact' or 'prefix' matching of plain vehicle names
 
         Returns:
             Dictionary of changes made {type: [(old_value, new_value)]}
         """
-        changes = {'carcols': [], 'variations': []}
+        return self.apply_plan(self.plan_carcols_conflicts(vehicles, match))
 
-        # Process modkits in carcols.meta
-        for kit_elem in self.carcols_root.findall(".//kitName"):
-            if vehicle_name and not self._is_vehicle_element(kit_elem, vehicle_name):
-                continue
+    def resolve_modkit_conflicts(self, vehicles: Union[str, Iterable[str], None] = None,
+                                 match: str = 'exact') -> Dict[str, List[Tuple[str, str]]]:
+        """
+        Resolve modkit ID conflicts for the given vehicles or all vehicles.
 
-            old_kit_name = kit_elem.text
-            if not old_kit_name or '_modkit' not in old_kit_name:
-                continue
+        Args:
+            vehicles: Optional vehicle name, glob pattern or list of them to process
+            match: 'exact' or 'prefix' matching of plain vehicle names
 
+        Returns:
+            Dictionary of changes made {type: [(old_value, new_value)]}
+        """
+        return self.apply_plan(self.plan_modkit_conflicts(vehicles, match))
+
+    @metrics.timed('resolver.compact')
+    def compact_ids(self, kind: str = 'carcols') -> Dict[str, List[Tuple[str, str]]]:
+        """
+        Renumber this file pair's siren or modkit IDs into one dense block.
+
+        Current IDs used only by this kind in this file pair are released
+        first, so the block may reuse them. IDs that are also used as the
+        other kind, or by other files on the server, stay claimed.
+
+        Args:
+            kind: 'carcols' for siren IDs or 'modkit' for modkit IDs
+
+        Returns:
+            Dictionary of changes made {type: [(old_value, new_value)]}
+        """
+        changes = {'carcols': [], 'variations': []}
+        elsewhere = self.external['siren_ids'] | self.external['modkit_ids']
+
+        if kind == 'carcols':
+            old_ids = sorted(
+                {value for value in (*self.siren_id_index, *self.siren_settings_index) if value.isdigit()},
+                key=int
+            )
+            shared = elsewhere | {
+                id_elem.attrib.get('value') for entry in self.modkit_index.values() for id_elem in entry.id_elems
+            }
+            self.id_generator.release(int(value) for value in old_ids if value not in shared)
+            new_ids = self.id_generator.generate_block('carcols', len(old_ids)) if old_ids else []
+            self._remap_sirens(dict(zip(old_ids, map(str, new_ids))), changes)
+        elif kind == 'modkit':
+            kit_names = sorted(
+                (name for name in self._modkit_names() if name.split('_')[0].isdigit()),
+                key=lambda name: int(name.split('_')[0])
+            )
+            shared = elsewhere | set(self.siren_id_index) | set(self.siren_settings_index)
+            self.id_generator.release(
+                int(name.split('_')[0]) for name in kit_names if name.split('_')[0] not in shared
+            )
+            new_ids = self.id_generator.generate_block('modkit', len(kit_names)) if kit_names else []
+            self._remap_modkits(dict(zip(kit_names, map(str, new_ids))), changes)
+        else:
+            raise ValueError(f"Unknown ID kind: {kind}")
+
+        if self.autosave:
+            self.save()
+        return changes
+
+    def _modkit_names(self) -> List[str]:
+        """Return the kit names defined in carcols.meta that follow the modkit pattern."""
+        return [
+            name for name, entry in self.modkit_index.items()
+            if entry.name_elems and '_modkit' in name
+        ]
+
+    def _remap_sirens(self, mapping: Dict[str, str], changes: Dict[str, List[Tuple[str, str]]]) -> None:
+        """Apply old -> new siren IDs to both files and keep the indexes current."""
+        mapping = {old: new for old, new in mapping.items() if old != new}
+        # Detach everything first so a new ID may reuse another entry's old one
+        detached = [
+            (old_id, new_id, self.siren_settings_index.pop(old_id, []), self.siren_id_index.pop(old_id, []))
+            for old_id, new_id in mapping.items()
+        ]
+        for old_id, new_id, sirens, id_elems in detached:
+            logger.debug("Replacing sirenSettings ID %s with %s", old_id, new_id)
+
+            # Update sirenSettings in carvariations.meta
+            for siren in sirens:
+                self._set_value(self.carvariations_path, siren, new_id)
+                changes['variations'].append((old_id, new_id))
+            self.siren_settings_index[new_id].extend(sirens)
+
+            # Update corresponding id in carcols.meta
+            for id_elem in id_elems:
+                self._set_value(self.carcols_path, id_elem, new_id)
+                changes['carcols'].append((old_id, new_id))
+            self.siren_id_index[new_id].extend(id_elems)
+
+    def _remap_modkits(self, mapping: Dict[str, str], changes: Dict[str, List[Tuple[str, str]]]) -> None:
+        """Apply kit name -> new modkit ID to both files and keep the index current."""
+        detached = [
+            (old_kit_name, new_id, self.modkit_index.pop(old_kit_name))
+            for old_kit_name, new_id in mapping.items()
+        ]
+        for old_kit_name, new_id, entry in detached:
             # Extract the old ID from the kit name
             old_id = old_kit_name.split('_')[0]
-            new_id = str(self.id_generator.generate_modkit_id())
-
-            # Update kitName
-            new_kit_name = old_kit_name.replace(old_id, new_id, 1)
-            kit_elem.text = new_kit_name
-            changes['carcols'].append((old_kit_name, new_kit_name))
-
-            # Update corresponding id value
-            parent = kit_elem.getparent()
-            if parent is not None:
-                id_elem = parent.find("id")
-                if id_elem is not None and id_elem.attrib.get('value') == old_id:
-                    id_elem.attrib['value'] = new_id
-
-            # Update corresponding Item in carvariations.meta
-            for item in self.carvariations_root.findall(".//kits/Item"):
-                if item.text == old_kit_name:
-                    item.text = new_kit_name
+            new_kit_name = self._renamed_kit(old_kit_name, new_id)
+            if new_kit_name != old_kit_name:
+                # Update kitName
+                for name_elem in entry.name_elems:
+                    self._set_value(self.carcols_path, name_elem, new_kit_name, attribute=False)
+                    changes['carcols'].append((old_kit_name, new_kit_name))
+
+                # Update corresponding id value
+                for id_elem in entry.id_elems:
+                    if id_elem.attrib.get('value') == old_id:
+                        self._set_value(self.carcols_path, id_elem, new_id)
+
+                # Update corresponding Items in carvariations.meta
+                for item in entry.variation_items:
+                    self._set_value(self.carvariations_path, item, new_kit_name, attribute=False)
                     changes['variations'].append((old_kit_name, new_kit_name))
 
-        # Save changes
-        self.file_handler.save_meta_file(str(self.carcols_path), self.carcols_root)
-        self.file_handler.save_meta_file(str(self.carvariations_path), self.carvariations_root)
-
-        return changes
+            self.modkit_index[new_kit_name] = entry
 
-    def _is_vehicle_element(self, element: etree._Element, vehicle_name: str) -> bool:
-        """
-        Check if an XML element belongs to the specified vehicle.
+    @staticmethod
+    def _renamed_kit(kit_name: str, new_id: str) -> str:
+        """Swap the leading modkit ID of a kit name (e.g. "680357_24valor18sedan_modkit")."""
+        return kit_name.replace(kit_name.split('_')[0], new_id, 1)
 
-        Args:
-            element: XML element to check
-            vehicle_name: Name of the vehicle to match
+    @staticmethod
+    def _model_name(item: etree._Element) -> str:
+        """Return the modelName of a carvariations variationData Item."""
+        return (item.findtext("modelName") or '').strip()
 
-        Returns:
-            bool: True if element belongs to vehicle, False otherwise
-        """
-        # Check kitName elements
-        kit_name = element.find(".//kitName")
-        if kit_name is not None and kit_name.text:
-            # Extract vehicle name from kitName pattern (e.g., "680357_24valor18sedan_modkit")
-            parts = kit_name.text.split('_')
-            if len(parts) >= 2:
-                element_vehicle = parts[1]
-                return vehicle_name.lower() in element_vehicle.lower()
-
-        # Check kits/Item elements
-        kits = element.find(".//kits")
-        if kits is not None:
-            for kit_item in kits.findall("Item"):
-                if kit_item.text:
-                    parts = kit_item.text.split('_')
-                    if len(parts) >= 2:
-                        element_vehicle = parts[1]
-                        return vehicle_name.lower() in element_vehicle.lower()
-
-        return False
-    
-    def get_vehicle_list(self):
-        """Extract vehicle names from kitName patterns in carcols.meta."""
-        vehicles = set()
-
-        # Find all kitName elements in carcols.meta
-        kit_names = self.carcols_root.findall(".//kitName")
-
-        for kit_name in kit_names:
-            if kit_name.text:
-                # Pattern: NUMBER_VEHICLENAME_modkit
-                match = re.match(r'\d+_([^_]+)_modkit', kit_name.text)
-                if match:
-                    vehicle_name = match.group(1)
-                    vehicles.add(vehicle_name)
-
-        return sorted(list(vehicles))
+    def get_vehicle_list(self) -> List[str]:
+        """Return the names of every vehicle in the file pair, sorted."""
+        return self.vehicle_index.names()
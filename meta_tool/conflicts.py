@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+Conflict detection: which IDs and kitNames are really defined more than once.
+
+find_conflicts hash-joins the siren IDs, modkit IDs and kitNames defined by
+a set of meta files, and optionally those recorded in an IDRegistry for the
+rest of the server, and reports each value with more than one definition.
+It reads only identity values (see MetaFileHandler.load_identity), so
+checking a server costs one streaming pass per changed file.
+
+Example:
+    report = find_conflicts(identities, registry)
+    for conflict in report.conflicts:
+        print(conflict.kind, conflict.value, conflict.owners)
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+from .identity import MetaIdentity
+from .scanner import DUPLICATE_KINDS
+
+
+@dataclass
+class Conflict:
+    """One value defined more than once."""
+    kind: str  # 'siren_ids', 'modkit_ids' or 'kit_names'
+    value: str
+    owners: List[str]  # one entry per definition: a checked file, or "resource (path)" from the registry
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.kind, self.value
+
+
+@dataclass
+class ConflictReport:
+    """Result of find_conflicts."""
+    conflicts: List[Conflict] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)  # path -> why it could not be read
+
+    def values(self, kind: str) -> Set[str]:
+        """Return the conflicting values of one kind."""
+        return {conflict.value for conflict in self.conflicts if conflict.kind == kind}
+
+    def to_dict(self) -> dict:
+        return {
+            'conflicts': [
+                {'kind': conflict.kind, 'value': conflict.value, 'owners': conflict.owners}
+                for conflict in self.conflicts
+            ],
+            'errors': self.errors,
+        }
+
+
+def _value_order(value: str):
+    # Numeric IDs in numeric order, then names
+    return (0, int(value), '') if value.isdigit() else (1, 0, value)
+
+
+def find_conflicts(identities: Dict[str, MetaIdentity], registry=None) -> ConflictReport:
+    """
+    Find values defined more than once among the given files and the server.
+
+    A value defined twice within one file counts as a conflict as well.
+
+    Args:
+        identities: {path: identity} of the files to check
+        registry: Optional IDRegistry; its other files' definitions join the check
+
+    Returns:
+        ConflictReport: Conflicts sorted by kind and value
+    """
+    report = ConflictReport()
+    for kind in DUPLICATE_KINDS:
+        owners: Dict[str, List[str]] = defaultdict(list)
+        for file_path, identity in identities.items():
+            for value in getattr(identity, kind):
+                owners[str(value)].append(file_path)
+
+        if registry is not None:
+            elsewhere = registry.definitions(kind, exclude=identities)
+            for value, files in owners.items():
+                files.extend(f"{resource} ({file_path})" for resource, file_path in elsewhere.get(value, ()))
+
+        for value in sorted(owners, key=_value_order):
+            if len(owners[value]) > 1:
+                report.conflicts.append(Conflict(kind, value, owners[value]))
+    return report
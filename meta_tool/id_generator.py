@@ -1,41 +1,374 @@
 #!/usr/bin/env python3
 
 import random
-from typing import Set
+from typing import Iterable, List, Optional, Set, Tuple
+
+from .metrics import metrics
+
+# Default inclusive ID ranges per kind
+CARCOLS_ID_RANGE = (10000, 99999)
+MODKIT_ID_RANGE = (10, 999999)
+
+# Siren IDs the base game stores in a single byte; use this range for
+# servers whose game build does not support extended siren settings
+GAME_SIREN_ID_RANGE = (1, 255)
+
+
+# Priority band of the root of a freshly built treap; more than any balanced tree's depth
+_DEPTH_BAND = 64
+
+
+class _Interval:
+    """A run of free IDs; node of IdAllocator's treap."""
+
+    __slots__ = ('start', 'end', 'priority', 'left', 'right', 'longest')
+
+    def __init__(self, start: int, end: int, priority: float):
+        self.start = start
+        self.end = end
+        self.priority = priority
+        self.left: Optional['_Interval'] = None
+        self.right: Optional['_Interval'] = None
+        self.longest = end - start + 1  # longest run in this subtree
+
+
+def _refresh(node: _Interval) -> _Interval:
+    longest = node.end - node.start + 1
+    if node.left is not None and node.left.longest > longest:
+        longest = node.left.longest
+    if node.right is not None and node.right.longest > longest:
+        longest = node.right.longest
+    node.longest = longest
+    return node
+
+
+def _split(node: Optional[_Interval], key: int) -> Tuple[Optional[_Interval], Optional[_Interval]]:
+    """Split a treap into the intervals starting before key and the rest."""
+    if node is None:
+        return None, None
+    if node.start < key:
+        node.right, rest = _split(node.right, key)
+        return _refresh(node), rest
+    before, node.left = _split(node.left, key)
+    return before, _refresh(node)
+
+
+def _merge(left: Optional[_Interval], right: Optional[_Interval]) -> Optional[_Interval]:
+    """Join two treaps whose intervals all lie before / after each other."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _refresh(left)
+    right.left = _merge(left, right.left)
+    return _refresh(right)
+
+
+class IdAllocator:
+    """
+    Allocates unused IDs from an inclusive range.
+
+    Free IDs are kept as disjoint intervals in a treap (a binary search tree
+    kept balanced by random priorities) ordered by start, where every node
+    also knows the longest interval below it. Finding, reserving and
+    releasing an ID and allocating a block are O(log n) in the number of
+    intervals, and allocation always terminates: it either returns an ID or
+    raises once the range is exhausted.
+    """
+
+    def __init__(self, low: int, high: int, used: Iterable[int] = (), rng: Optional[random.Random] = None):
+        if low > high:
+            raise ValueError(f"Invalid ID range {low}-{high}")
+        self.low = low
+        self.high = high
+        self._rng = rng or random
+        # Tree shape only; kept apart from _rng so seeded allocations stay reproducible
+        self._priorities = random.Random()
+
+        intervals = []
+        start = low
+        for value in sorted({value for value in used if low <= value <= high}):
+            if value > start:
+                intervals.append((start, value - 1))
+            start = value + 1
+        if start <= high:
+            intervals.append((start, high))
+
+        self.free_count = sum(end - start + 1 for start, end in intervals)
+        self._root = self._build(intervals)
+
+    def _build(self, intervals: List[Tuple[int, int]]) -> Optional[_Interval]:
+        """
+        Build a balanced treap in O(n).
+
+        A node at depth d gets a priority in [_DEPTH_BAND - d, _DEPTH_BAND - d + 1),
+        above every node below it; intervals inserted later get [0, 1) and
+        settle below the initial ones.
+        """
+        random_priority = self._priorities.random
+
+        def build(first: int, last: int, band: int) -> Optional[_Interval]:
+            if first > last:
+                return None
+            middle = (first + last) // 2
+            start, end = intervals[middle]
+            node = _Interval(start, end, band + random_priority())
+            left = node.left = build(first, middle - 1, band - 1)
+            right = node.right = build(middle + 1, last, band - 1)
+            node.longest = max(node.longest, left.longest if left else 0, right.longest if right else 0)
+            return node
+
+        return build(0, len(intervals) - 1, _DEPTH_BAND)
+
+    def _floor(self, value: int) -> Optional[_Interval]:
+        """Return the interval with the largest start <= value."""
+        node, found = self._root, None
+        while node is not None:
+            if node.start <= value:
+                found, node = node, node.right
+            else:
+                node = node.left
+        return found
+
+    def _ceiling(self, value: int) -> Optional[_Interval]:
+        """Return the interval with the smallest start > value."""
+        node, found = self._root, None
+        while node is not None:
+            if node.start > value:
+                found, node = node, node.left
+            else:
+                node = node.right
+        return found
+
+    def _replace(self, first: int, last: int, pieces: List[Tuple[int, int]]) -> None:
+        """Swap the intervals starting in first..last for pieces, which must fit in their place."""
+        before, rest = _split(self._root, first)
+        _, after = _split(rest, last + 1)
+        for start, end in pieces:
+            before = _merge(before, _Interval(start, end, self._priorities.random()))
+        self._root = _merge(before, after)
+
+    def _find(self, value: int) -> Optional[_Interval]:
+        """Return the free interval holding value, or None."""
+        node = self._floor(value)
+        return node if node is not None and value <= node.end else None
+
+    def is_free(self, value: int) -> bool:
+        """Check whether an ID is inside the range and not in use."""
+        return self._find(value) is not None
+
+    def free_intervals(self) -> List[Tuple[int, int]]:
+        """Return the free IDs as inclusive (start, end) intervals."""
+        intervals, stack, node = [], [], self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            intervals.append((node.start, node.end))
+            node = node.right
+        return intervals
+
+    def reserve(self, value: int) -> bool:
+        """
+        Mark an ID as used.
+
+        Returns:
+            bool: True if the ID was free, False if it was already used or out of range
+        """
+        node = self._find(value)
+        if node is None:
+            return False
+
+        start, end = node.start, node.end
+        pieces = [(start, value - 1)] if value > start else []
+        if value < end:
+            pieces.append((value + 1, end))
+        self._replace(start, start, pieces)
+        self.free_count -= 1
+        return True
+
+    def release(self, value: int) -> None:
+        """Return an ID to the free pool."""
+        if not self.low <= value <= self.high or self.is_free(value):
+            return
+
+        before, after = self._floor(value), self._ceiling(value)
+        joins_left = before is not None and before.end == value - 1
+        joins_right = after is not None and after.start == value + 1
+        first = before.start if joins_left else value
+        last = after.start if joins_right else value
+        self._replace(first, last, [(first, after.end if joins_right else value)])
+        self.free_count += 1
+
+    def allocate(self) -> int:
+        """
+        Allocate a random free ID.
+
+        A random point in the range is drawn; if it is taken, the next free ID
+        after it is used instead (wrapping around), so a single allocation
+        never needs more than one search of the tree.
+
+        Raises:
+            ValueError: If the range is exhausted
+        """
+        if self._root is None:
+            raise ValueError(f"No free IDs left in range {self.low}-{self.high}")
+
+        candidate = self._rng.randint(self.low, self.high)
+        if self._find(candidate) is None:
+            node = self._ceiling(candidate)
+            if node is None:
+                node = self._root
+                while node.left is not None:
+                    node = node.left
+            candidate = node.start
+
+        self.reserve(candidate)
+        return candidate
+
+    def allocate_many(self, count: int) -> List[int]:
+        """
+        Allocate several random free IDs.
+
+        Raises:
+            ValueError: If fewer than count IDs are free
+        """
+        if count > self.free_count:
+            raise ValueError(
+                f"Cannot allocate {count} IDs, only {self.free_count} free in range {self.low}-{self.high}"
+            )
+        return [self.allocate() for _ in range(count)]
+
+    def allocate_block(self, count: int) -> int:
+        """
+        Allocate a contiguous run of IDs: the lowest free run that is long enough.
+
+        Returns:
+            int: The first ID of the run; the run is start .. start + count - 1
+
+        Raises:
+            ValueError: If no free run of that length exists
+        """
+        node = self._root
+        if node is None or node.longest < count:
+            raise ValueError(f"No free block of {count} IDs in range {self.low}-{self.high}")
+        # Leftmost interval that is long enough; the longest values say which side has one
+        while True:
+            if node.left is not None and node.left.longest >= count:
+                node = node.left
+            elif node.end - node.start + 1 >= count:
+                break
+            else:
+                node = node.right
+
+        start, end = node.start, node.end
+        self._replace(start, start, [(start + count, end)] if start + count <= end else [])
+        self.free_count -= count
+        return start
+
 
 class IDGenerator:
     """Generates unique IDs for GTA V meta files."""
 
-    def __init__(self, existing_ids: Set[int] = None):
-        self.existing_ids = existing_ids or set()
+    def __init__(self, existing_ids: Set[int] = None, registry=None,
+                 carcols_range: Tuple[int, int] = CARCOLS_ID_RANGE,
+                 modkit_range: Tuple[int, int] = MODKIT_ID_RANGE):
+        """
+        Args:
+            existing_ids: IDs already in use in the files being edited
+            registry: Optional IDRegistry; IDs used anywhere on the server are avoided too
+            carcols_range: Inclusive range for carcols (siren) IDs
+            modkit_range: Inclusive range for modkit IDs
+        """
+        with metrics.span('ids.init') as span:
+            self.existing_ids = existing_ids or set()
+            if registry is not None:
+                self.existing_ids |= registry.used_ids()
+
+            self.carcols_ids = IdAllocator(*carcols_range, used=self.existing_ids)
+            self.modkit_ids = IdAllocator(*modkit_range, used=self.existing_ids)
+            span.add(used_ids=len(self.existing_ids))
+
+    def _claim(self, new_id: int) -> int:
+        # IDs stay unique across kinds, so mark the ID used in both allocators
+        self.existing_ids.add(new_id)
+        self.carcols_ids.reserve(new_id)
+        self.modkit_ids.reserve(new_id)
+        return new_id
 
     def generate_carcols_id(self) -> int:
         """
         Generate a unique random number for carcols ID.
 
         Returns:
-            int: A unique random number
+            int: A unique number within the carcols range
+
+        Raises:
+            ValueError: If the carcols range is exhausted
         """
-        while True:
-            # Generate a random number (wide range for uniqueness)
-            new_id = random.randint(10000, 99999)
-            if new_id not in self.existing_ids:
-                self.existing_ids.add(new_id)
-                return new_id
+        return self._claim(self.carcols_ids.allocate())
 
     def generate_modkit_id(self) -> int:
         """
         Generate a unique 2-6 digit number for modkit ID.
 
         Returns:
-            int: A unique number between 10 and 999999
+            int: A unique number within the modkit range (10-999999 by default)
+
+        Raises:
+            ValueError: If the modkit range is exhausted
         """
-        while True:
-            # Generate a random 2-6 digit number
-            new_id = random.randint(10, 999999)
-            if new_id not in self.existing_ids:
-                self.existing_ids.add(new_id)
-                return new_id
+        return self._claim(self.modkit_ids.allocate())
+
+    def generate_carcols_ids(self, count: int) -> List[int]:
+        """Generate several unique carcols IDs at once."""
+        return [self._claim(new_id) for new_id in self.carcols_ids.allocate_many(count)]
+
+    def generate_modkit_ids(self, count: int) -> List[int]:
+        """Generate several unique modkit IDs at once."""
+        return [self._claim(new_id) for new_id in self.modkit_ids.allocate_many(count)]
+
+    def generate_block(self, kind: str, count: int) -> List[int]:
+        """
+        Allocate a dense block of consecutive IDs.
+
+        Args:
+            kind: 'carcols' or 'modkit'
+            count: Number of IDs
+
+        Returns:
+            List of consecutive IDs
+        """
+        allocator = self.carcols_ids if kind == 'carcols' else self.modkit_ids
+        with metrics.span('ids.allocate') as span:
+            start = allocator.allocate_block(count)
+            span.add(ids=count)
+            return [self._claim(new_id) for new_id in range(start, start + count)]
+
+    def reserve(self, id_value: int) -> bool:
+        """
+        Claim a specific ID, e.g. one a file being merged already uses.
+
+        Args:
+            id_value: The ID to claim
+
+        Returns:
+            bool: True if the ID was free and is now claimed, False if it is already in use
+        """
+        if id_value in self.existing_ids:
+            return False
+        self._claim(id_value)
+        return True
+
+    def release(self, ids: Iterable[int]) -> None:
+        """Return IDs that are about to be rewritten to the free pool."""
+        for id_value in ids:
+            self.existing_ids.discard(id_value)
+            self.carcols_ids.release(id_value)
+            self.modkit_ids.release(id_value)
 
     def validate_id_availability(self, id_value: int) -> bool:
         """
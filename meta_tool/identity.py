@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Identity data extracted from GTA V meta files.
+
+Conflict detection only cares about a handful of values per file: the siren
+and modkit IDs defined in carcols.meta, the kitNames that go with them, and
+the sirenSettings / kits references in carvariations.meta. MetaIdentity
+holds just those values so they can be compared across many resources
+without keeping full XML trees around.
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from lxml import etree
+
+CARCOLS_ROOT = 'CVehicleModelInfoVarGlobal'
+CARVARIATIONS_ROOT = 'CVehicleModelInfoVariation'
+
+# (section, tags below the section Item) -> identity node kind
+IDENTITY_PATHS = {
+    ('Kits', 'kitName'): 'kit_name',
+    ('Kits', 'id'): 'modkit_id',
+    ('Sirens', 'id'): 'siren_id',
+    ('variationData', 'modelName'): 'model_name',
+    ('variationData', 'kits', 'Item'): 'kit_ref',
+    ('variationData', 'sirenSettings'): 'siren_ref',
+}
+
+# Node kinds stored in an attribute rather than element text
+VALUE_ATTRIBUTE_KINDS = {'modkit_id', 'siren_id', 'siren_ref'}
+
+# Node kind -> (MetaIdentity list field, whether the value is numeric)
+_KIND_FIELDS = {
+    'kit_name': ('kit_names', False),
+    'modkit_id': ('modkit_ids', True),
+    'siren_id': ('siren_ids', True),
+    'model_name': ('model_names', False),
+    'kit_ref': ('kit_refs', False),
+    'siren_ref': ('siren_refs', True),
+}
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class IdentityNode:
+    """One identity-bearing value and where it lives in the file."""
+    kind: str
+    value: str
+    item: int
+    line: Optional[int] = None
+    span: Optional[Tuple[int, int]] = None
+
+
+@dataclass
+class MetaIdentity:
+    """Identity-bearing values of a single meta file."""
+    path: str
+    root_tag: str
+    siren_ids: List[int] = field(default_factory=list)
+    modkit_ids: List[int] = field(default_factory=list)
+    kit_names: List[str] = field(default_factory=list)
+    siren_refs: List[int] = field(default_factory=list)
+    kit_refs: List[str] = field(default_factory=list)
+    model_names: List[str] = field(default_factory=list)
+    nodes: List[IdentityNode] = field(default_factory=list)
+
+    def add(self, node: IdentityNode) -> None:
+        """Record a node and its value in the matching list field."""
+        name, numeric = _KIND_FIELDS[node.kind]
+        if numeric:
+            value = _to_int(node.value)
+            if value is None:
+                return
+        else:
+            value = node.value
+            if not value:
+                return
+        getattr(self, name).append(value)
+        self.nodes.append(node)
+
+    @property
+    def kind(self) -> str:
+        """Return 'carcols', 'carvariations' or 'unknown' based on the root tag."""
+        if self.root_tag == CARCOLS_ROOT:
+            return 'carcols'
+        if self.root_tag == CARVARIATIONS_ROOT:
+            return 'carvariations'
+        return 'unknown'
+
+
+def extract_identity(root: etree._Element, path: str) -> MetaIdentity:
+    """
+    Extract identity values from a parsed meta file.
+
+    Args:
+        root: XML root element
+        path: Path the root was loaded from
+
+    Returns:
+        MetaIdentity: The extracted values
+    """
+    identity = MetaIdentity(path=str(path), root_tag=root.tag)
+
+    for section in root:
+        for item_index, item in enumerate(section.iterfind("Item")):
+            for elem in item.iter('kitName', 'id', 'modelName', 'sirenSettings', 'Item'):
+                kind = identity_kind(section.tag, elem, item)
+                if kind:
+                    identity.add(IdentityNode(kind, node_value(kind, elem), item_index, elem.sourceline))
+
+    return identity
+
+
+def identity_kind(section: str, elem: etree._Element, item: etree._Element) -> Optional[str]:
+    """
+    Classify an element below a section Item (e.g. Kits/Item) as an identity node.
+
+    Args:
+        section: Tag of the section the Item belongs to
+        elem: Element to classify
+        item: The section Item containing elem
+
+    Returns:
+        The node kind, or None if elem carries no identity value
+    """
+    tags = []
+    current = elem
+    while current is not item:
+        if current is None or len(tags) > 2:
+            return None
+        tags.append(current.tag)
+        current = current.getparent()
+    return IDENTITY_PATHS.get((section, *reversed(tags)))
+
+
+def node_value(kind: str, elem: etree._Element) -> str:
+    """Return the stripped value of an identity node."""
+    if kind in VALUE_ATTRIBUTE_KINDS:
+        return elem.attrib.get('value', '').strip()
+    return (elem.text or '').strip()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+
+"""
+Change journals: what a run changed, so it can be undone or replayed.
+
+Every committed ResolverSession records, per file, the element path, old
+and new value of each changed value, the byte span the old value had in
+the file, and the SHA-256 of the file before and after. Journals are kept
+next to the backups, in <backup store>/journal/<id>.json.
+
+apply_journal plays a journal backwards (undo) or forwards again (replay,
+e.g. onto a staging or production copy of the resources):
+
+- If a file's hash is exactly the one the journal expects, the recorded
+  spans are patched directly: the file is streamed once and never parsed.
+- Otherwise the file is parsed and each value is found by its element
+  path; it must still hold the value the journal expects.
+
+All files of a journal are replaced in one FileTransaction, so an undo or
+replay either applies completely or not at all. Applying a journal is
+recorded as a journal of its own.
+
+Example:
+    store = JournalStore('meta_backups')
+    journal = store.get()                      # the latest run
+    undone = apply_journal(journal, reverse=True)
+    store.record(undone)
+"""
+
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from lxml import etree
+
+from .backup_store import DEFAULT_BACKUP_ROOT, atomic_write, sha256_file
+from .meta_file_handler import MetaFileHandler
+from .transaction import FileTransaction
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = 'journal'
+
+
+@dataclass
+class JournalChange:
+    """One value changed in a file."""
+    element: str  # element path, e.g. /CVehicleModelInfoVarGlobal/Kits/Item[3]/id
+    attribute: bool  # value stored in the value attribute rather than the text
+    old: str
+    new: str
+    span: Optional[Tuple[int, int]] = None  # bytes of the old value in the file before the change
+
+
+@dataclass
+class JournalFile:
+    """The changes made to one file."""
+    path: str
+    pre_hash: str
+    post_hash: Optional[str] = None
+    changes: List[JournalChange] = field(default_factory=list)
+
+
+class ChangeJournal:
+    """The changes of one run, across any number of files."""
+
+    def __init__(self, snapshot_id: Optional[str] = None, reverts: Optional[str] = None):
+        """
+        Args:
+            snapshot_id: Backup snapshot taken before the run, if any
+            reverts: Id of the journal this one undoes, if it is an undo
+        """
+        self.id: Optional[str] = None
+        self.created: Optional[str] = None
+        self.snapshot_id = snapshot_id
+        self.reverts = reverts
+        self.files: List[JournalFile] = []
+
+    def __len__(self) -> int:
+        return sum(len(entry.changes) for entry in self.files)
+
+    def record(self, file_path: str, root: etree._Element, changes: Dict[etree._Element, Tuple[str, bool]],
+               spans: Optional[Dict[etree._Element, Tuple[int, int]]], transaction=None) -> None:
+        """
+        Record the changes written to a file; called by MetaFileHandler.save_changes before the write.
+
+        Args:
+            file_path: File being written
+            root: Its XML root
+            changes: {element: (original value, True if stored in the value attribute)}
+            spans: Byte span of each element's original value, or None if the file is re-serialized
+            transaction: FileTransaction the write is staged in; the new hash is taken once it commits
+        """
+        tree = root.getroottree()
+        entry = JournalFile(os.path.realpath(file_path), sha256_file(file_path))
+        for elem, (old_value, attribute) in sorted(changes.items(), key=lambda change: change[0].sourceline or 0):
+            new_value = elem.attrib.get('value', '') if attribute else (elem.text or '').strip()
+            if old_value != new_value:
+                span = spans.get(elem) if spans is not None else None
+                entry.changes.append(JournalChange(tree.getpath(elem), attribute, old_value, new_value, span))
+        if not entry.changes:
+            return
+        self.files.append(entry)
+
+        def finish():
+            entry.post_hash = sha256_file(entry.path)
+        if transaction is not None:
+            transaction.on_commit(finish)
+        else:
+            finish()
+
+    def extend(self, other: 'ChangeJournal') -> None:
+        """Add the files of another journal, e.g. one resource of a batch."""
+        self.files.extend(other.files)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'created': self.created,
+            'snapshot': self.snapshot_id,
+            'reverts': self.reverts,
+            'files': [asdict(entry) for entry in self.files],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ChangeJournal':
+        journal = cls(data.get('snapshot'), data.get('reverts'))
+        journal.id = data.get('id')
+        journal.created = data.get('created')
+        for entry in data['files']:
+            changes = [
+                JournalChange(change['element'], change['attribute'], change['old'], change['new'],
+                              tuple(change['span']) if change.get('span') else None)
+                for change in entry['changes']
+            ]
+            journal.files.append(JournalFile(entry['path'], entry['pre_hash'], entry.get('post_hash'), changes))
+        return journal
+
+
+class JournalStore:
+    """Journals of past runs, kept in the backup store."""
+
+    def __init__(self, root: str = DEFAULT_BACKUP_ROOT):
+        """
+        Args:
+            root: Backup store directory; journals go into its journal/ subdirectory
+        """
+        self.directory = Path(root) / JOURNAL_DIR
+
+    def record(self, journal: ChangeJournal) -> str:
+        """
+        Store a journal.
+
+        Returns:
+            str: The journal id
+        """
+        created = datetime.now()
+        journal.id = created.strftime("%Y%m%d_%H%M%S_%f")
+        journal.created = created.isoformat()
+        data = json.dumps(journal.to_dict(), separators=(',', ':')).encode('utf-8')
+        atomic_write(self.directory / f"{journal.id}.json", lambda f: f.write(data))
+        return journal.id
+
+    def list(self) -> List[ChangeJournal]:
+        """Return every journal, oldest first."""
+        if not self.directory.exists():
+            return []
+        return [self._read(path) for path in sorted(self.directory.glob('*.json'))]
+
+    def get(self, journal_id: Optional[str] = None) -> ChangeJournal:
+        """
+        Return one journal, or without an id the latest run that has not been undone.
+
+        Raises:
+            ValueError: If the journal does not exist
+        """
+        if journal_id is not None:
+            path = self.directory / f"{journal_id}.json"
+            if not path.exists():
+                raise ValueError(f"Change journal not found: {journal_id}")
+            return self._read(path)
+
+        journals = self.list()
+        undone = {journal.reverts for journal in journals}
+        for journal in reversed(journals):
+            if journal.reverts is None and journal.id not in undone:
+                return journal
+        raise ValueError(f"No change journal left to undo in {self.directory}")
+
+    def _read(self, path: Path) -> ChangeJournal:
+        try:
+            return ChangeJournal.from_dict(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError, KeyError) as e:
+            raise ValueError(f"Failed to read change journal {path}: {str(e)}")
+
+
+def _relocate(journal: ChangeJournal, root: Optional[str]) -> Dict[str, str]:
+    """Map each journal path to the file to apply it to: itself, or the same place below another root."""
+    paths = [entry.path for entry in journal.files]
+    if root is None:
+        return {path: path for path in paths}
+    base = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return {path: os.path.join(os.path.realpath(root), os.path.relpath(path, base)) for path in paths}
+
+
+def _span_edits(entry: JournalFile, reverse: bool) -> List[Tuple[int, int, bytes, bytes]]:
+    """Byte edits applying an entry's changes to its pre-image, or undoing them on its post-image."""
+    encode = MetaFileHandler._encode_value
+    edits = []
+    shift = 0
+    for change in sorted(entry.changes, key=lambda change: change.span[0]):
+        old, new = encode(change.old, change.attribute), encode(change.new, change.attribute)
+        start = change.span[0]
+        if reverse:
+            # Every earlier edit moved this value by the difference in length
+            edits.append((start + shift, start + shift + len(new), new, old))
+        else:
+            edits.append((start, change.span[1], old, new))
+        shift += len(new) - len(old)
+    return edits
+
+
+def apply_journal(journal: ChangeJournal, reverse: bool = False, root: Optional[str] = None,
+                  file_handler: Optional[MetaFileHandler] = None) -> ChangeJournal:
+    """
+    Undo or replay a journal, all files or none.
+
+    Files that already hold the result are skipped.
+
+    Args:
+        journal: Journal to apply
+        reverse: Undo the changes instead of making them
+        root: Apply to the same files below this directory instead (e.g. a production copy);
+            the journal's files are located relative to their common directory
+        file_handler: Handler used to parse and patch; a new one by default
+
+    Returns:
+        ChangeJournal: What was changed, to be recorded in a JournalStore
+
+    Raises:
+        ValueError: If a file holds neither the expected content nor the expected values
+    """
+    handler = file_handler or MetaFileHandler()
+    targets = _relocate(journal, root)
+    applied = ChangeJournal(reverts=journal.id if reverse else None)
+
+    try:
+        with FileTransaction(list(targets.values())) as transaction:
+            for entry in journal.files:
+                _apply_entry(entry, targets[entry.path], reverse, handler, transaction, applied)
+    except Exception:
+        # Trees edited in the element path fallback no longer match their files
+        for target in targets.values():
+            handler.documents.forget(target)
+        raise
+    return applied
+
+
+def _apply_entry(entry: JournalFile, target: str, reverse: bool, handler: MetaFileHandler,
+                 transaction: FileTransaction, applied: ChangeJournal) -> None:
+    """Stage one file's part of apply_journal."""
+    expected, result = (entry.post_hash, entry.pre_hash) if reverse else (entry.pre_hash, entry.post_hash)
+    try:
+        current = sha256_file(target)
+    except OSError as e:
+        raise ValueError(f"Failed to read meta file {target}: {str(e)}")
+    if current == result:
+        logger.info("%s already matches the journal, skipping", target)
+        return
+
+    if current == expected and all(change.span for change in entry.changes):
+        edits = _span_edits(entry, reverse)
+        handler.patch_meta_file(target, edits, transaction)
+        transaction.on_commit(lambda: handler.documents.forget(target))
+        ordered = sorted(entry.changes, key=lambda change: change.span[0])
+        applied.files.append(JournalFile(os.path.realpath(target), current, result, [
+            JournalChange(change.element, change.attribute, edit_old, edit_new, (start, end))
+            for change, (start, end, _, _), (edit_old, edit_new) in zip(
+                ordered, edits,
+                ((change.new, change.old) if reverse else (change.old, change.new) for change in ordered))
+        ]))
+        return
+
+    # The file differs from what the journal saw: find every value by its element path
+    logger.debug("%s does not match the journal's hash, locating values by element path", target)
+    root, _ = handler.load_meta_file(target)
+    changes = {}
+    for change in entry.changes:
+        before, after = (change.new, change.old) if reverse else (change.old, change.new)
+        found = root.getroottree().xpath(change.element)
+        if len(found) != 1:
+            raise ValueError(f"{target}: element {change.element} not found")
+        elem = found[0]
+        value = elem.attrib.get('value', '') if change.attribute else (elem.text or '').strip()
+        if value != before:
+            raise ValueError(f"{target}: {change.element} is {value!r}, expected {before!r}")
+        if change.attribute:
+            elem.set('value', after)
+        else:
+            elem.text = after
+        changes[elem] = (before, change.attribute)
+    handler.save_changes(target, root, changes, transaction, applied)
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+
+"""
+Lint meta files with pluggable rules in one streaming pass per file.
+
+Each LintRule names the element paths it wants to see, relative to the
+root (e.g. "Kits/Item/kitName"; fnmatch patterns such as "*/sequencer"
+match at any depth). lint_file parses a file once with iterparse, only
+stopping at the tags some rule subscribed to, hands every matching element
+to its rules and frees each section Item once it is done, so memory stays
+bounded by the largest Item. A fresh instance of every rule is created per
+file, so rules can keep per-file state in attributes.
+
+Checks that need more than one file, such as sirenSettings pointing at a
+siren no carcols.meta defines, work in two steps: the rule stores facts
+about its file in context.facts during the pass, and its check_resource
+classmethod compares the facts of all files of a resource afterwards.
+
+New rules subclass LintRule and are added with @register_rule:
+
+    @register_rule
+    class NoEmptyModelName(LintRule):
+        name = 'empty-model-name'
+        paths = ('variationData/Item/modelName',)
+
+        def element(self, elem, context):
+            if not (elem.text or '').strip():
+                context.report(self, elem, "Empty modelName")
+
+Example:
+    report = lint_paths(['server/resources'], jobs=8)
+    for issue in report.issues:
+        print(issue.path, issue.line, issue.rule, issue.message)
+"""
+
+import io
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from fnmatch import fnmatchcase
+from functools import partial
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Type
+
+from lxml import etree
+
+from .identity import CARCOLS_ROOT, CARVARIATIONS_ROOT
+from .metrics import metrics
+from .scanner import discover_meta_files
+
+SEVERITIES = ('error', 'warning')
+
+# Kits every vehicle may use without defining them
+BASE_GAME_KITS = {'0_default_modkit'}
+
+# sequencer values are 32-bit flash patterns
+SEQUENCER_MAX = 2 ** 32 - 1
+
+
+@dataclass
+class LintIssue:
+    """One problem found in a meta file."""
+    path: str
+    line: Optional[int]
+    rule: str
+    severity: str  # 'error' or 'warning'
+    message: str
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class FileLint:
+    """Result of linting one file; returned from worker processes."""
+    path: str
+    root_tag: str = ''
+    issues: List[LintIssue] = field(default_factory=list)
+    facts: Dict[str, object] = field(default_factory=dict)  # rule name -> what check_resource needs
+
+
+class LintContext:
+    """The file being linted, handed to every rule callback."""
+
+    def __init__(self, path: str, result: FileLint):
+        self.path = path
+        self.result = result
+        self.facts = result.facts
+
+    @property
+    def root_tag(self) -> str:
+        return self.result.root_tag
+
+    def report(self, rule: 'LintRule', where, message: str, severity: Optional[str] = None) -> None:
+        """
+        Record an issue.
+
+        Args:
+            rule: Rule reporting it
+            where: Element the issue is about, a line number, or None
+            message: Human-readable description
+            severity: Overrides the rule's severity
+        """
+        line = where.sourceline if isinstance(where, etree._Element) else where
+        self.result.issues.append(LintIssue(self.path, line, rule.name, severity or rule.severity, message))
+
+
+class LintRule:
+    """Base class of lint rules; see the module docstring."""
+
+    name = ''
+    severity = 'error'
+    # Element paths below the root this rule wants to see; fnmatch patterns allowed
+    paths: Tuple[str, ...] = ()
+
+    def element(self, elem: etree._Element, context: LintContext) -> None:
+        """Inspect one subscribed element; its children are complete, its later siblings are not."""
+
+    def finish(self, context: LintContext) -> None:
+        """Called once the whole file has been read."""
+
+    @classmethod
+    def check_resource(cls, files: List[FileLint], known: Dict[str, Set[str]]) -> Iterable[LintIssue]:
+        """
+        Compare the facts of all files of one resource.
+
+        Args:
+            files: Lint results of the resource's files
+            known: Values defined elsewhere on the server, by identity kind (empty without a registry)
+        """
+        return ()
+
+
+RULES: Dict[str, Type[LintRule]] = {}
+
+
+def register_rule(rule: Type[LintRule]) -> Type[LintRule]:
+    """Class decorator adding a rule to the ones lint runs by default."""
+    if rule.severity not in SEVERITIES:
+        raise ValueError(f"Invalid severity {rule.severity!r} for lint rule {rule.name}")
+    RULES[rule.name] = rule
+    return rule
+
+
+def _attribute_value(elem: etree._Element) -> str:
+    return elem.attrib.get('value', '').strip()
+
+
+@register_rule
+class RootTagRule(LintRule):
+    name = 'root-tag'
+
+    def finish(self, context: LintContext) -> None:
+        if context.root_tag not in (CARCOLS_ROOT, CARVARIATIONS_ROOT):
+            context.report(self, 1, f"Root element is {context.root_tag or 'missing'}, expected "
+                                    f"{CARCOLS_ROOT} or {CARVARIATIONS_ROOT}")
+
+
+@register_rule
+class InvalidIdRule(LintRule):
+    """IDs and siren references must be non-negative integers."""
+    name = 'invalid-id'
+    paths = ('Kits/Item/id', 'Sirens/Item/id', 'variationData/Item/sirenSettings')
+
+    def element(self, elem: etree._Element, context: LintContext) -> None:
+        value = _attribute_value(elem)
+        if not value.isdigit():
+            context.report(self, elem, f"{elem.tag} value {value!r} is not a non-negative integer")
+
+
+@register_rule
+class DuplicateIdRule(LintRule):
+    """A siren or modkit ID defined twice in one file."""
+    name = 'duplicate-id'
+    paths = ('Kits/Item/id', 'Sirens/Item/id')
+
+    def __init__(self):
+        self.seen: Dict[Tuple[str, str], int] = {}
+
+    def element(self, elem: etree._Element, context: LintContext) -> None:
+        section = elem.getparent().getparent().tag
+        key = (section, _attribute_value(elem))
+        if key in self.seen:
+            kind = 'modkit' if section == 'Kits' else 'siren'
+            context.report(self, elem, f"{kind} ID {key[1]} is already defined on line {self.seen[key]}")
+        else:
+            self.seen[key] = elem.sourceline
+
+
+@register_rule
+class KitNameRule(LintRule):
+    """kitNames are "<id>_<name>"; the resolver derives the kit's ID from the prefix."""
+    name = 'kit-name'
+    paths = ('Kits/Item',)
+
+    def element(self, elem: etree._Element, context: LintContext) -> None:
+        name_elem = elem.find('kitName')
+        kit_name = (name_elem.text or '').strip() if name_elem is not None else ''
+        if not kit_name:
+            context.report(self, elem, "Kit has no kitName")
+            return
+        prefix, _, rest = kit_name.partition('_')
+        if not prefix.isdigit() or not rest:
+            context.report(self, name_elem, f"kitName {kit_name!r} does not look like <id>_<name>")
+            return
+        id_elem = elem.find('id')
+        if id_elem is not None and _attribute_value(id_elem) != prefix:
+            context.report(self, id_elem, f"Kit {kit_name} has id {_attribute_value(id_elem)!r}, "
+                                          f"not its kitName prefix {prefix}", severity='warning')
+
+
+@register_rule
+class SequencerRule(LintRule):
+    """Light sequencers are 32-bit patterns and need a positive BPM."""
+    name = 'sequencer-range'
+    paths = ('*/sequencer', '*/sequencerBpm')
+
+    def element(self, elem: etree._Element, context: LintContext) -> None:
+        value = _attribute_value(elem)
+        maximum = SEQUENCER_MAX if elem.tag == 'sequencer' else None
+        minimum = 0 if elem.tag == 'sequencer' else 1
+        if not value.isdigit() or int(value) < minimum or (maximum is not None and int(value) > maximum):
+            limit = f"{minimum}-{maximum}" if maximum is not None else f"at least {minimum}"
+            context.report(self, elem, f"{elem.tag} value {value!r} is out of range ({limit})")
+
+
+@register_rule
+class MissingSirenRule(LintRule):
+    """sirenSettings must point at a siren defined by the resource (or, with a registry, the server)."""
+    name = 'missing-siren'
+    paths = ('Sirens/Item/id', 'variationData/Item/sirenSettings')
+
+    def element(self, elem: etree._Element, context: LintContext) -> None:
+        facts = context.facts.setdefault(self.name, {'defined': [], 'refs': []})
+        value = _attribute_value(elem)
+        if elem.tag == 'id':
+            facts['defined'].append(value)
+        elif value != '0':  # no sirens
+            facts['refs'].append((value, elem.sourceline))
+
+    @classmethod
+    def check_resource(cls, files: List[FileLint], known: Dict[str, Set[str]]) -> Iterable[LintIssue]:
+        facts = [(result, result.facts.get(cls.name)) for result in files]
+        defined = {value for _, fact in facts if fact for value in fact['defined']} | known.get('siren_ids', set())
+        for result, fact in facts:
+            for value, line in fact['refs'] if fact else ():
+                if value not in defined:
+                    yield LintIssue(result.path, line, cls.name, cls.severity,
+                                    f"sirenSettings {value} refers to a siren that is not defined")
+
+
+@register_rule
+class MissingKitRule(LintRule):
+    """Kits referenced in carvariations.meta should be defined in carcols.meta."""
+    name = 'missing-kit'
+    severity = 'warning'  # the kit may come from the base game or another resource
+    paths = ('Kits/Item/kitName', 'variationData/Item/kits/Item')
+
+    def element(self, elem: etree._Element, context: LintContext) -> None:
+        facts = context.facts.setdefault(self.name, {'defined': [], 'refs': []})
+        value = (elem.text or '').strip()
+        if elem.tag == 'kitName':
+            facts['defined'].append(value)
+        elif value and value not in BASE_GAME_KITS:
+            facts['refs'].append((value, elem.sourceline))
+
+    @classmethod
+    def check_resource(cls, files: List[FileLint], known: Dict[str, Set[str]]) -> Iterable[LintIssue]:
+        facts = [(result, result.facts.get(cls.name)) for result in files]
+        defined = {value for _, fact in facts if fact for value in fact['defined']} | known.get('kit_names', set())
+        for result, fact in facts:
+            for value, line in fact['refs'] if fact else ():
+                if value not in defined:
+                    yield LintIssue(result.path, line, cls.name, cls.severity,
+                                    f"Kit {value} is referenced but not defined")
+
+
+def _element_path(elem: etree._Element, root: etree._Element) -> Optional[str]:
+    tags = []
+    while elem is not root:
+        if elem is None:
+            return None
+        tags.append(elem.tag)
+        elem = elem.getparent()
+    return '/'.join(reversed(tags))
+
+
+def lint_file(file_path: str, rules: Sequence[Type[LintRule]] = ()) -> FileLint:
+    """
+    Lint one file in a single streaming pass.
+
+    Runs in worker processes, so unreadable files are reported as issues rather than raised.
+
+    Args:
+        file_path: Meta file to lint
+        rules: Rule classes to run (default: every registered rule)
+
+    Returns:
+        FileLint: Issues and cross-file facts of the file
+    """
+    result = FileLint(str(file_path))
+    context = LintContext(str(file_path), result)
+    instances = [rule() for rule in (rules or RULES.values())]
+
+    # Stop only at tags some rule wants; a wildcard in a last path segment needs every tag
+    tags: Optional[Set[str]] = {'Item'}
+    for rule in instances:
+        for pattern in rule.paths:
+            last = pattern.rsplit('/', 1)[-1]
+            if tags is not None and not any(char in last for char in '*?['):
+                tags.add(last)
+            else:
+                tags = None
+    dispatch: Dict[str, List[LintRule]] = {}
+
+    with metrics.span('lint.file') as span:
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            parser = etree.iterparse(io.BytesIO(data), events=('end',), tag=tags,
+                                     remove_blank_text=True, huge_tree=True)
+            root = None
+            elements = 0
+            for _, elem in parser:
+                if root is None:
+                    root = elem.getroottree().getroot()
+                    result.root_tag = root.tag
+                path = _element_path(elem, root)
+                if not path:
+                    continue
+                subscribed = dispatch.get(path)
+                if subscribed is None:
+                    subscribed = dispatch[path] = [
+                        rule for rule in instances if any(fnmatchcase(path, pattern) for pattern in rule.paths)
+                    ]
+                for rule in subscribed:
+                    rule.element(elem, context)
+                elements += 1
+
+                if elem.tag == 'Item' and path.count('/') == 1:
+                    # Section Item finished: drop it and anything before it
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+            if root is None:
+                result.root_tag = parser.root.tag
+            span.add(files=1, bytes=len(data), elements=elements)
+        except OSError as e:
+            result.issues.append(LintIssue(str(file_path), None, 'read-error', 'error', str(e)))
+            return result
+        except etree.XMLSyntaxError as e:
+            result.issues.append(LintIssue(str(file_path), e.lineno, 'xml-syntax', 'error', str(e)))
+            return result
+
+    for rule in instances:
+        rule.finish(context)
+    return result
+
+
+@dataclass
+class LintReport:
+    """Result of lint_paths."""
+    files: List[str] = field(default_factory=list)
+    issues: List[LintIssue] = field(default_factory=list)
+
+    @property
+    def errors(self) -> List[LintIssue]:
+        return [issue for issue in self.issues if issue.severity == 'error']
+
+    def to_dict(self) -> dict:
+        return {'files': self.files, 'issues': [issue.to_dict() for issue in self.issues]}
+
+
+def _group_by_resource(paths: Iterable[str]) -> Dict[str, List[str]]:
+    """Expand directories into their resources' meta files; single files form a resource with their siblings."""
+    resources: Dict[str, List[str]] = defaultdict(list)
+    for path in paths:
+        if Path(path).is_dir():
+            for resource, files in discover_meta_files(path).items():
+                resources[str(Path(path) / resource)].extend(str(file) for file in files)
+        else:
+            resources[str(Path(path).parent)].append(str(path))
+    return resources
+
+
+def lint_paths(paths: Iterable[str], jobs: Optional[int] = None,
+               rules: Sequence[Type[LintRule]] = (), registry=None) -> LintReport:
+    """
+    Lint meta files and resources, files in parallel.
+
+    Args:
+        paths: Meta files, resource directories or directories of resources
+        jobs: Number of worker processes (default: CPU count)
+        rules: Rule classes to run (default: every registered rule)
+        registry: Optional IDRegistry; sirens and kits defined anywhere on the server count as defined
+
+    Returns:
+        LintReport: Issues sorted by file and line
+    """
+    rules = list(rules or RULES.values())
+    resources = _group_by_resource(paths)
+    files = [file_path for found in resources.values() for file_path in found]
+    report = LintReport(files=files)
+    if not files:
+        return report
+
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(files)))
+    lint = partial(lint_file, rules=rules)
+    if workers == 1:
+        results = dict(zip(files, map(lint, files)))
+    else:
+        chunksize = max(1, len(files) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = dict(zip(files, executor.map(lint, files, chunksize=chunksize)))
+
+    known: Dict[str, Set[str]] = {}
+    if registry is not None:
+        known = {kind: set(registry.definitions(kind, exclude=())) for kind in ('siren_ids', 'kit_names')}
+
+    with metrics.span('lint.resources'):
+        for found in resources.values():
+            results_of_resource = [results[file_path] for file_path in found]
+            for result in results_of_resource:
+                report.issues.extend(result.issues)
+            for rule in rules:
+                report.issues.extend(rule.check_resource(results_of_resource, known))
+
+    report.issues.sort(key=lambda issue: (issue.path, issue.line or 0, issue.rule))
+    return report
+
+
+def iter_rules(names: Iterable[str] = (), disabled: Iterable[str] = ()) -> Iterator[Type[LintRule]]:
+    """
+    Select registered rules by name.
+
+    Raises:
+        ValueError: If a name is not a registered rule
+    """
+    names, disabled = list(names), set(disabled)
+    for name in [*names, *disabled]:
+        if name not in RULES:
+            raise ValueError(f"Unknown lint rule {name!r}; known rules: {', '.join(sorted(RULES))}")
+    for name, rule in RULES.items():
+        if (not names or name in names) and name not in disabled:
+            yield rule
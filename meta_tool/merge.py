@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+
+"""
+Streaming merge of many vehicle resources into one carcols/carvariations pair.
+
+Merging takes two passes over the inputs. The first reads only the identity
+values of each resource (see MetaFileHandler.load_identity) and decides,
+resource by resource, which siren IDs, modkit IDs and kitNames collide with
+a resource merged before it, and what they become. The second streams every
+section Item (Kits, Lights, Sirens, variationData, ...) of every file
+through iterparse, rewrites it with its resource's mapping and appends it
+to a spool file per section; the spools are then concatenated into the
+output files. Only one Item and the mappings are in memory at any time, so
+the number of inputs does not bound what can be merged.
+
+References are remapped within a resource only: a carvariations file's
+sirenSettings and kits follow the carcols file of the same resource.
+
+Example:
+    result = merge_resources(['resources/[cars]'], 'resources/carpack')
+    for resource in result.resources:
+        print(resource.name, resource.sirens, resource.kits)
+"""
+
+import logging
+import shutil
+import tempfile
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional, Set, Tuple
+
+from lxml import etree
+
+from .allocator import RemoteIDGenerator
+from .backup_store import atomic_write
+from .conflict_resolver import ConflictResolver
+from .id_generator import CARCOLS_ID_RANGE, IDGenerator, MODKIT_ID_RANGE
+from .identity import CARCOLS_ROOT, CARVARIATIONS_ROOT, MetaIdentity
+from .meta_file_handler import MetaFileHandler
+from .metrics import metrics
+from .scanner import discover_meta_files, parse_files
+
+logger = logging.getLogger(__name__)
+
+# Output file per root tag
+OUTPUT_NAMES = {
+    CARCOLS_ROOT: 'carcols.meta',
+    CARVARIATIONS_ROOT: 'carvariations.meta',
+}
+
+
+@dataclass
+class ResourceMapping:
+    """How one input resource's IDs were renumbered in the merged pack."""
+    name: str
+    files: List[str] = field(default_factory=list)
+    sirens: Dict[str, str] = field(default_factory=dict)  # old siren ID -> new
+    kits: Dict[str, Tuple[str, str]] = field(default_factory=dict)  # old kitName -> (new kitName, new ID)
+
+
+@dataclass
+class MergeResult:
+    """Outcome of merge_resources."""
+    outputs: Dict[str, str] = field(default_factory=dict)  # root tag -> written path
+    resources: List[ResourceMapping] = field(default_factory=list)
+    items: Dict[str, int] = field(default_factory=dict)  # section -> merged Items
+    duplicate_models: Dict[str, List[str]] = field(default_factory=dict)  # modelName -> resources
+    errors: Dict[str, str] = field(default_factory=dict)  # path -> skipped because
+
+
+def iter_section_items(file_path: str) -> Iterator[Tuple[str, Optional[etree._Element]]]:
+    """
+    Stream the Items of each section below a meta file's root.
+
+    Yields (section tag, None) when a section starts, then (section tag,
+    item) for each of its Items. An Item is cleared as soon as the consumer
+    resumes the generator, so it must be used before then.
+
+    Args:
+        file_path: Path to the meta file
+    """
+    context = etree.iterparse(
+        file_path, events=('start', 'end'), remove_blank_text=True, remove_comments=True, huge_tree=True
+    )
+    depth = 0
+    for event, elem in context:
+        if event == 'start':
+            depth += 1
+            if depth == 2:
+                yield elem.tag, None
+            continue
+
+        depth -= 1
+        if depth == 2:
+            parent = elem.getparent()
+            yield parent.tag, elem
+            # Drop the Item and its already-merged siblings
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+
+class PackMerger:
+    """Merges resources into one pack; see merge_resources."""
+
+    def __init__(self, generator: IDGenerator, used_kit_names: Optional[Set[str]] = None):
+        """
+        Args:
+            generator: Allocates IDs and tracks every ID claimed so far
+            used_kit_names: kitNames already taken, e.g. by other resources on the server
+        """
+        self.generator = generator
+        self.used_kit_names = set(used_kit_names or ())
+        self.model_owners: Dict[str, List[str]] = defaultdict(list)
+
+    def plan_resource(self, mapping: ResourceMapping, identities: List[MetaIdentity]) -> None:
+        """
+        Claim a resource's IDs and kitNames, renumbering those taken by an earlier resource.
+
+        Args:
+            mapping: The resource's mapping, filled in place
+            identities: Identities of the resource's meta files
+        """
+        seen_sirens: Set[str] = set()
+        seen_kits: Set[str] = set()
+        for identity in identities:
+            kit_items: Dict[int, Dict[str, str]] = defaultdict(dict)
+            for node in identity.nodes:
+                if node.kind == 'siren_id' and node.value not in seen_sirens:
+                    seen_sirens.add(node.value)
+                    if node.value.isdigit() and not self.generator.reserve(int(node.value)):
+                        mapping.sirens[node.value] = str(self.generator.generate_carcols_id())
+                elif node.kind in ('kit_name', 'modkit_id'):
+                    kit_items[node.item][node.kind] = node.value
+                elif node.kind == 'model_name':
+                    owners = self.model_owners[node.value.lower()]
+                    if mapping.name not in owners:
+                        owners.append(mapping.name)
+
+            for kit in kit_items.values():
+                kit_name = kit.get('kit_name')
+                if kit_name is None or kit_name in seen_kits:
+                    continue
+                seen_kits.add(kit_name)
+                self._plan_kit(mapping, kit_name, kit.get('modkit_id'))
+
+    def _plan_kit(self, mapping: ResourceMapping, kit_name: str, kit_id: Optional[str]) -> None:
+        numeric_id = kit_id is not None and kit_id.isdigit()
+        id_free = not numeric_id or self.generator.reserve(int(kit_id))
+        name_free = kit_name not in self.used_kit_names
+        # kitNames carry their modkit ID (e.g. "680357_24valor18sedan_modkit"), so a new ID renames them
+        renamable = kit_name.split('_')[0].isdigit()
+
+        if not name_free and not renamable:
+            logger.warning("kitName %s in %s is already used and cannot be renamed", kit_name, mapping.name)
+        if id_free and (name_free or not renamable):
+            self.used_kit_names.add(kit_name)
+            return
+
+        new_id = str(self.generator.generate_modkit_id())
+        if id_free and numeric_id:
+            # Claimed above, but the kit needs a new name and with it a new ID
+            self.generator.release([int(kit_id)])
+        new_name = ConflictResolver._renamed_kit(kit_name, new_id) if renamable else kit_name
+        self.used_kit_names.add(new_name)
+        mapping.kits[kit_name] = (new_name, new_id)
+
+    @staticmethod
+    def rewrite_item(section: str, item: etree._Element, mapping: ResourceMapping) -> None:
+        """Apply a resource's mapping to one section Item."""
+        if section == 'Kits':
+            name_elem = item.find('kitName')
+            renamed = mapping.kits.get((name_elem.text or '').strip()) if name_elem is not None else None
+            if renamed is not None:
+                name_elem.text = renamed[0]
+                id_elem = item.find('id')
+                if id_elem is not None:
+                    id_elem.attrib['value'] = renamed[1]
+        elif section == 'Sirens':
+            id_elem = item.find('id')
+            if id_elem is not None and id_elem.attrib.get('value') in mapping.sirens:
+                id_elem.attrib['value'] = mapping.sirens[id_elem.attrib['value']]
+        elif section == 'variationData':
+            for siren in item.iterfind('sirenSettings'):
+                if siren.attrib.get('value') in mapping.sirens:
+                    siren.attrib['value'] = mapping.sirens[siren.attrib['value']]
+            for kit in item.iterfind('kits/Item'):
+                renamed = mapping.kits.get((kit.text or '').strip())
+                if renamed is not None:
+                    kit.text = renamed[0]
+
+
+def _write_output(target: Path, root_tag: str, sections: 'OrderedDict[str, IO[bytes]]') -> None:
+    def write(f):
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<{root_tag}>\n'.encode('utf-8'))
+        for section, spool in sections.items():
+            if spool.tell() == 0:
+                f.write(f'  <{section}/>\n'.encode('utf-8'))
+                continue
+            f.write(f'  <{section}>\n'.encode('utf-8'))
+            spool.seek(0)
+            shutil.copyfileobj(spool, f)
+            f.write(f'  </{section}>\n'.encode('utf-8'))
+        f.write(f'</{root_tag}>\n'.encode('utf-8'))
+    atomic_write(target, write)
+
+
+def merge_resources(sources: List[str], output_dir: str, registry=None,
+                    carcols_range: Tuple[int, int] = CARCOLS_ID_RANGE,
+                    modkit_range: Tuple[int, int] = MODKIT_ID_RANGE,
+                    jobs: Optional[int] = None, allocator: Optional[str] = None) -> MergeResult:
+    """
+    Merge the meta files of many resources into one carcols.meta and carvariations.meta.
+
+    Resources are merged in order; the first to use an ID or kitName keeps
+    it and later ones are renumbered.
+
+    Args:
+        sources: Resource directories, or directories of resources
+        output_dir: Directory the merged carcols.meta and carvariations.meta are written to
+        registry: Optional IDRegistry of IDs used by other resources on the server
+        carcols_range: Inclusive range for new carcols (siren) IDs
+        modkit_range: Inclusive range for new modkit IDs
+        jobs: Number of processes reading identities (default: CPU count)
+        allocator: Optional address of an ID allocation service to claim IDs from
+
+    Returns:
+        MergeResult: Written files and every resource's renumbering
+    """
+    result = MergeResult()
+    handler = MetaFileHandler()
+
+    # Resource -> files, classified by root tag
+    files: List[Tuple[ResourceMapping, str, str]] = []
+    for source in sources:
+        for resource, paths in discover_meta_files(source).items():
+            mapping = ResourceMapping(name=resource)
+            for path in paths:
+                try:
+                    root_tag = handler.root_tag(str(path))
+                except ValueError as e:
+                    result.errors[str(path)] = str(e)
+                    continue
+                if root_tag in OUTPUT_NAMES:
+                    mapping.files.append(str(path))
+                    files.append((mapping, str(path), root_tag))
+            if mapping.files:
+                result.resources.append(mapping)
+
+    if allocator:
+        generator = RemoteIDGenerator(allocator, registry=registry, carcols_range=carcols_range,
+                                      modkit_range=modkit_range)
+    else:
+        generator = IDGenerator(registry=registry, carcols_range=carcols_range, modkit_range=modkit_range)
+    merger = PackMerger(generator, registry.kit_names() if registry is not None else None)
+
+    # Pass 1: identities only, one resource at a time
+    with metrics.span('merge.plan') as span:
+        identities: Dict[str, MetaIdentity] = {}
+        pending = iter(result.resources)
+        current = next(pending, None)
+        for file_path, identity, error in parse_files([path for _, path, _ in files], jobs=jobs):
+            if identity is None:
+                result.errors[file_path] = error
+            else:
+                identities[file_path] = identity
+            while current is not None and all(
+                    path in identities or path in result.errors for path in current.files):
+                merger.plan_resource(current, [identities.pop(path) for path in current.files if path in identities])
+                current = next(pending, None)
+        span.add(resources=len(result.resources), files=len(files))
+
+    # Pass 2: stream every Item through its resource's mapping into per-section spools
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    with metrics.span('merge.stream') as span, tempfile.TemporaryDirectory(dir=str(output)) as spool_dir:
+        spools: Dict[str, 'OrderedDict[str, IO[bytes]]'] = {tag: OrderedDict() for tag in OUTPUT_NAMES}
+        try:
+            for mapping, file_path, root_tag in files:
+                if file_path in result.errors:
+                    continue
+                sections = spools[root_tag]
+                try:
+                    for section, item in iter_section_items(file_path):
+                        if section not in sections:
+                            sections[section] = tempfile.TemporaryFile(dir=spool_dir)
+                        if item is None:
+                            continue
+                        merger.rewrite_item(section, item, mapping)
+                        etree.indent(item, space='  ', level=2)
+                        sections[section].write(b'    ' + etree.tostring(item, encoding='utf-8', with_tail=False) + b'\n')
+                        result.items[section] = result.items.get(section, 0) + 1
+                except etree.XMLSyntaxError as e:
+                    raise ValueError(f"Failed to merge meta file {file_path}: {str(e)}")
+
+            for root_tag, sections in spools.items():
+                if sections:
+                    target = output / OUTPUT_NAMES[root_tag]
+                    _write_output(target, root_tag, sections)
+                    result.outputs[root_tag] = str(target)
+        finally:
+            for sections in spools.values():
+                for spool in sections.values():
+                    spool.close()
+        span.add(items=sum(result.items.values()))
+
+    result.duplicate_models = {
+        model: owners for model, owners in sorted(merger.model_owners.items()) if len(owners) > 1
+    }
+    return result
@@ -1,22 +1,151 @@
 #!/usr/bin/env python3
 
-import os
+import hashlib
+import io
+import re
 import shutil
-from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
 from lxml import etree
 
+from .backup_store import DEFAULT_BACKUP_ROOT, BackupStore, atomic_write, sha256_file
+from .cache import DEFAULT_CACHE_DIR, DocumentCache, IdentityCache, file_key
+from .metrics import metrics
+from .identity import (
+    CARCOLS_ROOT, CARVARIATIONS_ROOT, IDENTITY_PATHS, IdentityNode, MetaIdentity,
+    VALUE_ATTRIBUTE_KINDS, node_value
+)
+
+# Tags that can carry identity values (Item covers both section items and kits/Item)
+IDENTITY_TAGS = ('kitName', 'id', 'modelName', 'sirenSettings', 'Item')
+
+# (start, end, expected old bytes, replacement bytes)
+PatchEdit = Tuple[int, int, bytes, bytes]
+
+COPY_CHUNK_SIZE = 1 << 20
+
+VALUE_ATTRIBUTE = re.compile(rb"""\bvalue\s*=\s*(["'])(.*?)\1""", re.DOTALL)
+
+
+class SourceMap:
+    """
+    Maps (line, tag) positions reported by lxml to byte spans in the raw file.
+
+    Lookups are cheapest when made in increasing line order, which is the
+    order iterparse reports elements in.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._line = 1
+        self._offset = 0
+
+    def line_offset(self, line: int) -> int:
+        """Return the byte offset at which a 1-based line starts."""
+        if line < self._line:
+            self._line, self._offset = 1, 0
+        remaining = line - self._line
+        if remaining <= 0:
+            return self._offset
+
+        # Gallop, then bisect, using bytes.count so newlines are scanned in C;
+        # each window is counted once, keeping the cost linear in the distance
+        data, size = self.data, len(self.data)
+        lo, seen, step = self._offset, 0, remaining * 64
+        while True:
+            hi = min(size, lo + step)
+            found = data.count(b'\n', lo, hi)
+            if seen + found >= remaining:
+                break
+            if hi >= size:
+                return size
+            lo, seen, step = hi, seen + found, step * 2
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            found = data.count(b'\n', lo, mid)
+            if seen + found < remaining:
+                lo, seen = mid, seen + found
+            else:
+                hi = mid
+
+        self._line, self._offset = line, hi
+        return hi
+
+    def locate(self, line: int, tag: str, nth: int = 0, attribute: bool = False) -> Optional[Tuple[int, int]]:
+        """
+        Find the byte span of an element's value.
+
+        Args:
+            line: Source line of the element's start tag
+            tag: Element tag
+            nth: Index among elements with the same tag starting on that line
+            attribute: Locate the ``value`` attribute instead of the text
+
+        Returns:
+            (start, end) byte offsets, or None if the element cannot be found
+        """
+        data = self.data
+        start = self.line_offset(line)
+        line_end = data.find(b'\n', start)
+        if line_end < 0:
+            line_end = len(data)
+
+        opening = b'<' + tag.encode()
+        pos = start
+        found = -1
+        while nth >= 0:
+            found = data.find(opening, pos, line_end)
+            if found < 0:
+                return None
+            pos = found + len(opening)
+            if data[pos:pos + 1] in (b' ', b'\t', b'\r', b'\n', b'/', b'>'):
+                nth -= 1
+
+        tag_end = data.find(b'>', pos)
+        if tag_end < 0:
+            return None
+
+        if attribute:
+            match = VALUE_ATTRIBUTE.search(data, pos, tag_end)
+            return match.span(2) if match else None
+
+        if data[tag_end - 1:tag_end] == b'/':
+            return (tag_end + 1, tag_end + 1)
+        text_start = tag_end + 1
+        text_end = data.find(b'<', text_start)
+        if text_end < 0:
+            return None
+        # Spans cover the stripped text only, so surrounding whitespace survives edits
+        value = data[text_start:text_end]
+        leading = len(value) - len(value.lstrip())
+        return (text_start + leading, text_start + len(value.rstrip()))
+
+
 class MetaFileHandler:
     """Handles XML file operations for GTA V meta files."""
 
-    def __init__(self):
+    # Parsed trees, shared by every handler in the process
+    documents = DocumentCache()
+
+    def __init__(self, backup_root: str = DEFAULT_BACKUP_ROOT, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        """
+        Args:
+            backup_root: Directory of the backup store
+            cache_dir: Directory for the persistent identity cache, or None to disable it
+        """
         self.parser = etree.XMLParser(remove_blank_text=True)
+        self.backup_root = backup_root
+        self.identity_cache = IdentityCache(cache_dir) if cache_dir else None
 
     def load_meta_file(self, file_path: str) -> Tuple[etree._Element, str]:
         """
         Load and parse a meta file.
 
+        A tree parsed ahead by preload() is used if the file has not
+        changed since. Every load gets a tree of its own, so edits that are
+        never saved do not show up in later loads.
+
         Args:
             file_path: Path to the meta file
 
@@ -26,18 +155,141 @@ class MetaFileHandler:
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 xml_content = f.read()
-            root = etree.fromstring(xml_content.encode(), self.parser)
+            root = self.documents.take(file_path)
+            if root is None:
+                root = self._parse(xml_content)
             return root, xml_content
         except (IOError, etree.ParseError) as e:
             raise ValueError(f"Failed to load meta file {file_path}: {str(e)}")
 
-    def save_meta_file(self, file_path: str, root: etree._Element) -> None:
+    def preload(self, file_path: str) -> None:
+        """
+        Parse a meta file into the document cache, for the next load_meta_file of it.
+
+        Raises:
+            ValueError: If the file cannot be read or parsed
+        """
+        try:
+            if file_path in self.documents:
+                return
+            key = file_key(file_path)
+            with open(file_path, 'r', encoding='utf-8') as f:
+                root = self._parse(f.read())
+        except (IOError, etree.ParseError) as e:
+            raise ValueError(f"Failed to load meta file {file_path}: {str(e)}")
+        self.documents.put(file_path, root, key)
+
+    def _parse(self, xml_content: str) -> etree._Element:
+        with metrics.span('handler.parse') as span:
+            root = etree.fromstring(xml_content.encode(), self.parser)
+            span.add(files=1, bytes=len(xml_content))
+            if metrics.enabled:
+                span.add(elements=sum(1 for _ in root.iter()))
+        return root
+
+    def load_identity(self, file_path: str, positions: bool = True) -> MetaIdentity:
+        """
+        Stream a meta file and keep only its identity-bearing nodes.
+
+        Uses iterparse and frees every top-level Item (kits, sirens, lights,
+        variations) as soon as it has been read, so memory stays bounded by
+        the largest single Item rather than the whole document. Results are
+        kept in the identity cache, so unchanged files are not parsed again
+        in later runs.
+
+        Args:
+            file_path: Path to the meta file
+            positions: Also record the byte span of every node's value
+
+        Returns:
+            MetaIdentity: Identity values, with nodes carrying line and span
+        """
+        try:
+            if self.identity_cache is not None:
+                with metrics.span('handler.identity_cache') as span:
+                    identity = self.identity_cache.get(file_path, positions)
+                    span.add(hits=int(identity is not None))
+                if identity is not None:
+                    return identity
+
+            key = file_key(file_path)
+            with metrics.span('handler.identity') as span:
+                with open(file_path, 'rb') as f:
+                    data = f.read()
+                identity = self._parse_identity(data, file_path, positions)
+                span.add(files=1, bytes=len(data), nodes=len(identity.nodes))
+            if self.identity_cache is not None:
+                self.identity_cache.put(key, hashlib.sha256(data).hexdigest(), identity, positions)
+            return identity
+        except (IOError, etree.XMLSyntaxError) as e:
+            raise ValueError(f"Failed to load meta file {file_path}: {str(e)}")
+
+    def _parse_identity(self, data: bytes, file_path: str, positions: bool) -> MetaIdentity:
+        """Extract identity nodes from the raw bytes of a meta file (see load_identity)."""
+        source = SourceMap(data) if positions else None
+        identity = MetaIdentity(path=str(file_path), root_tag='')
+        item_counts: Dict[str, int] = {}
+        line_counts: Dict[Tuple[int, str], int] = {}
+
+        context = etree.iterparse(
+            io.BytesIO(data), events=('end',), tag=IDENTITY_TAGS,
+            remove_blank_text=True, huge_tree=True
+        )
+        root = None
+        for _, elem in context:
+            if root is None:
+                # iterparse only exposes its root once parsing is done
+                root = elem.getroottree().getroot()
+            parent = elem.getparent()
+            if parent is None:
+                continue
+
+            if elem.tag == 'Item':
+                if parent.getparent() is root:
+                    # Section Item finished: drop it and anything before it
+                    item_counts[parent.tag] = item_counts.get(parent.tag, 0) + 1
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del parent[0]
+                    continue
+                if parent.tag != 'kits':
+                    continue
+                item = parent.getparent()
+                tags = (parent.tag, elem.tag)
+            else:
+                item = parent
+                tags = (elem.tag,)
+
+            section = item.getparent() if item is not None else None
+            if section is None or section.getparent() is not root:
+                continue
+            kind = IDENTITY_PATHS.get((section.tag, *tags))
+            if kind is None:
+                continue
+
+            node = IdentityNode(kind, node_value(kind, elem), item_counts.get(section.tag, 0), elem.sourceline)
+            if source is not None and node.line is not None:
+                key = (node.line, elem.tag)
+                nth = line_counts.get(key, 0)
+                line_counts[key] = nth + 1
+                node.span = source.locate(node.line, elem.tag, nth, kind in VALUE_ATTRIBUTE_KINDS)
+            identity.add(node)
+
+        identity.root_tag = context.root.tag
+        return identity
+
+    @metrics.timed('handler.serialize')
+    def save_meta_file(self, file_path: str, root: etree._Element, transaction=None) -> None:
         """
         Save XML content back to file.
 
+        The file is replaced atomically, so a crash leaves either the old or
+        the new contents.
+
         Args:
             file_path: Path to save the file
             root: XML root element
+            transaction: Optional FileTransaction to stage the write in instead
         """
         try:
             xml_content = etree.tostring(
@@ -45,36 +297,207 @@ class MetaFileHandler:
                 pretty_print=True,
                 encoding='utf-8',
                 xml_declaration=True
-            ).decode()
+            )
 
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(xml_content)
+            # Line numbers in the cached tree no longer match the rewritten file
+            self.documents.forget(file_path)
+            if transaction is not None:
+                transaction.write(file_path, lambda f: f.write(xml_content))
+            else:
+                atomic_write(Path(file_path), lambda f: f.write(xml_content))
         except IOError as e:
             raise ValueError(f"Failed to save meta file {file_path}: {str(e)}")
 
-    def backup_files(self, files: list[str]) -> None:
+    @metrics.timed('handler.patch')
+    def patch_meta_file(self, file_path: str, edits: List[PatchEdit], transaction=None) -> None:
+        """
+        Rewrite only the given byte spans of a file.
+
+        The original is streamed into a temporary file next to it, with each
+        span replaced, and the temporary file is then swapped in atomically.
+        Everything outside the spans, including formatting and comments, is
+        copied byte for byte.
+
+        Args:
+            file_path: Path to the file to patch
+            edits: (start, end, expected old bytes, new bytes) tuples
+            transaction: Optional FileTransaction to stage the write in instead
+
+        Raises:
+            ValueError: If spans overlap or the file no longer holds the expected bytes
+        """
+        def write(dst):
+            with open(file_path, 'rb') as src:
+                position = 0
+                for start, end, old, new in sorted(edits):
+                    if start < position:
+                        raise ValueError(f"Overlapping edits at byte {start}")
+                    self._copy_bytes(src, dst, start - position)
+                    if src.read(end - start) != old:
+                        raise ValueError(f"Unexpected content at byte {start}, file changed on disk?")
+                    dst.write(new)
+                    position = end
+                shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+        try:
+            if transaction is not None:
+                transaction.write(file_path, write)
+            else:
+                atomic_write(Path(file_path), write)
+        except (IOError, ValueError) as e:
+            raise ValueError(f"Failed to patch meta file {file_path}: {str(e)}")
+
+    @staticmethod
+    def _copy_bytes(src, dst, count: int) -> None:
+        while count > 0:
+            chunk = src.read(min(count, COPY_CHUNK_SIZE))
+            if not chunk:
+                raise ValueError("Edit beyond end of file")
+            dst.write(chunk)
+            count -= len(chunk)
+
+    def save_changes(self, file_path: str, root: etree._Element,
+                     changes: Dict[etree._Element, Tuple[str, bool]], transaction=None, journal=None) -> bool:
+        """
+        Write modified element values back to the file they were loaded from.
+
+        Patches the changed values in place when every one of them can be
+        located unambiguously in the file; otherwise falls back to a full
+        save_meta_file.
+
+        Args:
+            file_path: Path the root was loaded from
+            root: XML root element
+            changes: {element: (original value, True if stored in the value attribute)}
+            transaction: Optional FileTransaction to stage the write in; the
+                file changes only when it commits
+            journal: Optional ChangeJournal to record the changes in
+
+        Returns:
+            bool: True if the file was patched, False if it was fully re-serialized
+        """
+        located = self._locate_edits(file_path, changes)
+        if journal is not None:
+            spans = {elem: edit[:2] for elem, edit in located} if located is not None else None
+            journal.record(file_path, root, changes, spans, transaction)
+        if located is None:
+            self.save_meta_file(file_path, root, transaction)
+            return False
+        edits = [edit for _, edit in located]
+        if edits:
+            self.patch_meta_file(file_path, edits, transaction)
+            # A tree preloaded before the save no longer matches the file
+            if transaction is not None:
+                transaction.on_commit(lambda: self.documents.forget(file_path))
+            else:
+                self.documents.forget(file_path)
+        return True
+
+    def plan_edits(self, file_path: str, changes: Dict[etree._Element, Tuple[str, bool]]) -> Optional[List[PatchEdit]]:
+        """
+        Turn modified elements into byte-span edits against a file.
+
+        Args:
+            file_path: Path the elements were loaded from
+            changes: {element: (original value, True if stored in the value attribute)}
+
+        Returns:
+            List of edits, or None if any element cannot be located unambiguously
+        """
+        located = self._locate_edits(file_path, changes)
+        return [edit for _, edit in located] if located is not None else None
+
+    @metrics.timed('handler.plan_edits')
+    def _locate_edits(self, file_path: str, changes: Dict[etree._Element, Tuple[str, bool]]
+                      ) -> Optional[List[Tuple[etree._Element, PatchEdit]]]:
+        """plan_edits, keeping the element each edit belongs to."""
+        try:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        except IOError as e:
+            raise ValueError(f"Failed to read meta file {file_path}: {str(e)}")
+
+        source = SourceMap(data)
+        edits = []
+        for elem, (old_value, attribute) in sorted(changes.items(), key=lambda change: change[0].sourceline or 0):
+            new_value = elem.attrib.get('value', '') if attribute else (elem.text or '').strip()
+            if elem.sourceline is None:
+                return None
+            span = source.locate(elem.sourceline, elem.tag, 0, attribute)
+            if span is None or source.locate(elem.sourceline, elem.tag, 1, attribute) is not None:
+                return None
+            old = self._encode_value(old_value, attribute)
+            if data[span[0]:span[1]] != old:
+                return None
+            if old_value != new_value:
+                edits.append((elem, (span[0], span[1], old, self._encode_value(new_value, attribute))))
+        return edits
+
+    @staticmethod
+    def _encode_value(value: str, attribute: bool) -> bytes:
+        if attribute:
+            return escape(value, {'"': '&quot;'}).encode('utf-8')
+        return escape(value).encode('utf-8')
+
+    def backup_files(self, files: list[str]) -> str:
         """
         Create backups of the specified files.
 
+        Backups go to a content-addressed BackupStore, so unchanged files are
+        not copied again.
+
         Args:
             files: List of file paths to backup
+
+        Returns:
+            str: Id of the backup snapshot
         """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_dir = Path(f"backups_{timestamp}")
-        backup_dir.mkdir(exist_ok=True)
+        with metrics.span('handler.backup') as span:
+            span.add(files=len(files))
+            return BackupStore(self.backup_root).backup(files)
 
-        for file_path in files:
-            file_path = Path(file_path)
-            if not file_path.exists():
-                raise ValueError(f"File not found: {file_path}")
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        """
+        Compute the SHA-256 hex digest of a file's contents.
 
-            backup_path = backup_dir / file_path.name
-            shutil.copy2(file_path, backup_path)
+        Args:
+            file_path: Path to the file
+
+        Returns:
+            str: Hex digest
+        """
+        return sha256_file(file_path)
+
+    @staticmethod
+    def root_tag(file_path: str) -> str:
+        """
+        Read a file's root element tag without parsing the rest of the file.
+
+        Args:
+            file_path: Path to the meta file
+
+        Returns:
+            str: The root tag
+
+        Raises:
+            ValueError: If the file cannot be read or does not start with an XML element
+        """
+        try:
+            # iterparse reports the root's start event after reading only the first chunk
+            for _, elem in etree.iterparse(file_path, events=('start',)):
+                return elem.tag
+        except (IOError, etree.XMLSyntaxError) as e:
+            raise ValueError(f"Failed to read meta file {file_path}: {str(e)}")
+        raise ValueError(f"Failed to read meta file {file_path}: no root element")
 
     def validate_meta_file(self, file_path: str) -> bool:
         """
         Validate that the file is a properly formatted meta file.
 
+        Only the file header is read; well-formedness of the rest of the file
+        is checked when it is loaded.
+
         Args:
             file_path: Path to the meta file to validate
 
@@ -82,8 +505,7 @@ class MetaFileHandler:
             bool: True if valid, False otherwise
         """
         try:
-            root, _ = self.load_meta_file(file_path)
             # Basic validation - check for expected root element
-            return root.tag in ['CVehicleModelInfoVarGlobal', 'CVehicleModelInfoVariation']
-        except Exception:
+            return self.root_tag(file_path) in (CARCOLS_ROOT, CARVARIATIONS_ROOT)
+        except ValueError:
             return False
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+"""
+Lightweight stage timing for finding where a slow run spends its time.
+
+Code wraps each stage (parsing, ID collection, planning, saving, backup
+copying, ...) in a span; while collection is off a span is a shared no-op,
+so the instrumentation costs one attribute check. Once enabled, every span
+records its call count and total wall time, any counts the code attaches
+(elements, IDs, changes, bytes) and, if tracemalloc is tracing, the peak
+Python memory allocated inside it. libxml2's own allocations are not seen
+by tracemalloc, so tree sizes show up in the counts rather than the peaks.
+
+Spans with the same name are aggregated; nested spans include the time of
+their children.
+
+Example:
+    metrics.enable(memory=True)
+    with metrics.span('handler.parse') as span:
+        root = parse(data)
+        span.add(bytes=len(data))
+    print(metrics.format_report())
+"""
+
+import functools
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class StageStats:
+    """Aggregated measurements of every span with one name."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.peak_bytes: Optional[int] = None
+        self.counts: Dict[str, int] = {}
+
+    def to_dict(self) -> dict:
+        stats = {'name': self.name, 'calls': self.calls, 'seconds': round(self.seconds, 6)}
+        if self.peak_bytes is not None:
+            stats['peak_kb'] = round(self.peak_bytes / 1024, 1)
+        stats.update(self.counts)
+        return stats
+
+
+class _NullSpan:
+    """Span handed out while collection is off."""
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    def add(self, **counts: int) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+        self.counts: Dict[str, int] = {}
+
+    def add(self, **counts: int) -> None:
+        """Attach counts (elements, IDs, bytes, ...) to this span."""
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def __enter__(self) -> '_Span':
+        self.memory = self.metrics.memory and tracemalloc.is_tracing()
+        if self.memory:
+            stack = self.metrics._memory_stack()
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # Resetting the peak below hides it from the enclosing span
+                stack[-1][1] = max(stack[-1][1], peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            stack.append([current, current])
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.start
+        peak = None
+        if self.memory:
+            stack = self.metrics._memory_stack()
+            start, seen = stack.pop()
+            absolute = max(seen, tracemalloc.get_traced_memory()[1])
+            peak = absolute - start
+            if stack:
+                stack[-1][1] = max(stack[-1][1], absolute)
+        self.metrics._record(self.name, elapsed, peak, self.counts)
+
+
+class Metrics:
+    """Collects stage spans; disabled until enable() is called."""
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self._stages: 'OrderedDict[str, StageStats]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracemalloc = False
+        self._started = None
+        self._stopped = None
+
+    def enable(self, memory: bool = False) -> None:
+        """
+        Start collecting spans.
+
+        Args:
+            memory: Also record peak Python memory per span, starting
+                tracemalloc if needed (this slows the run down noticeably)
+        """
+        self.enabled = True
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._started = time.perf_counter()
+        self._stopped = None
+
+    def disable(self) -> None:
+        """Stop collecting; measurements taken so far are kept."""
+        self.enabled = False
+        self.memory = False
+        self._stopped = time.perf_counter()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def reset(self) -> None:
+        """Drop every measurement."""
+        with self._lock:
+            self._stages.clear()
+        self._started = time.perf_counter() if self.enabled else None
+
+    def span(self, name: str):
+        """
+        Return a context manager timing one stage.
+
+        Args:
+            name: Stage name, e.g. 'handler.parse'; spans with the same name are aggregated
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._open(name)
+
+    def timed(self, name: str):
+        """Decorator running each call of a function inside span(name)."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._open(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _open(self, name: str) -> _Span:
+        with self._lock:
+            # Stages are listed in the order they started, so parents come before children
+            if name not in self._stages:
+                self._stages[name] = StageStats(name)
+        return _Span(self, name)
+
+    def _memory_stack(self) -> List[List[int]]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, name: str, seconds: float, peak: Optional[int], counts: Dict[str, int]) -> None:
+        with self._lock:
+            stats = self._stages.setdefault(name, StageStats(name))
+            stats.calls += 1
+            stats.seconds += seconds
+            if peak is not None:
+                stats.peak_bytes = max(stats.peak_bytes or 0, peak)
+            for key, value in counts.items():
+                stats.counts[key] = stats.counts.get(key, 0) + value
+
+    def stages(self) -> List[StageStats]:
+        """Return the stats of every stage, in the order they first started."""
+        with self._lock:
+            return list(self._stages.values())
+
+    def report(self) -> dict:
+        """
+        Return the measurements as a JSON-serializable dictionary.
+
+        Returns:
+            {'wall_seconds': time from enable() to disable() or now, 'stages': [stage dicts]}
+        """
+        wall = None
+        if self._started is not None:
+            wall = (self._stopped or time.perf_counter()) - self._started
+        return {
+            'wall_seconds': round(wall, 6) if wall is not None else None,
+            'stages': [stats.to_dict() for stats in self.stages()],
+        }
+
+    def format_report(self) -> str:
+        """Return the measurements as a plain-text table."""
+        lines = [f"{'stage':<28} {'calls':>6} {'seconds':>10} {'peak KB':>10}  counts"]
+        for stats in self.stages():
+            peak = f"{stats.peak_bytes / 1024:.1f}" if stats.peak_bytes is not None else '-'
+            counts = ', '.join(f"{key}={value}" for key, value in stats.counts.items())
+            lines.append(f"{stats.name:<28} {stats.calls:>6} {stats.seconds:>10.4f} {peak:>10}  {counts}")
+        report = self.report()
+        if report['wall_seconds'] is not None:
+            lines.append(f"{'total (wall)':<28} {'':>6} {report['wall_seconds']:>10.4f}")
+        return '\n'.join(lines)
+
+
+# Process-wide collector used by the handler, resolver and ID generator
+metrics = Metrics()
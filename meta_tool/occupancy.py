@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+"""
+Bitmap sets of used IDs, for comparing many resources at once.
+
+Siren and modkit IDs are small, dense integers (at most ID_SPACE), so the
+IDs one resource uses fit in a bitmap of about 125 KB. IdOccupancy keeps
+such a bitmap in a NumPy array when NumPy is installed (`pip install
+gta-meta-tool[fast]`) and in a Python integer otherwise; either way union,
+intersection and popcount are single operations over the whole bitmap
+instead of one set operation per ID.
+
+conflict_matrix uses them to count, for every pair of resources, how many
+IDs both use: a running union finds the IDs used more than once, and the
+pair counts are computed on those IDs only.
+
+Example:
+    occupancies = occupancy_by_resource(identities, 'siren_ids', resources)
+    matrix = conflict_matrix(occupancies)
+    for first, second, shared in matrix.pairs():
+        print(first, second, shared)
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .id_generator import MODKIT_ID_RANGE
+from .identity import MetaIdentity
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+# Inclusive range of IDs held in the bitmap; other IDs are kept in a set
+ID_SPACE = (0, MODKIT_ID_RANGE[1])
+
+# Identity fields holding numeric IDs
+ID_KINDS = ('siren_ids', 'modkit_ids')
+
+if np is not None:
+    # Set bits per byte value, for NumPy versions without bitwise_count
+    _POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint32)
+
+
+# Bytes scanned at a time when listing the IDs of an integer bitmap
+_CHUNK = 4096
+
+
+def _popcount_int(bits: int) -> int:
+    return bits.bit_count() if hasattr(bits, 'bit_count') else bin(bits).count('1')
+
+
+class IdOccupancy:
+    """Set of used IDs stored as a bitmap over an inclusive range."""
+
+    def __init__(self, values: Iterable[int] = (), low: int = ID_SPACE[0], high: int = ID_SPACE[1]):
+        """
+        Args:
+            values: IDs in use
+            low: First ID of the bitmap
+            high: Last ID of the bitmap; IDs outside low-high are kept in a plain set
+        """
+        if low > high:
+            raise ValueError(f"Invalid ID range {low}-{high}")
+        self.low = low
+        self.high = high
+        self.size = high - low + 1
+        self.overflow: Set[int] = set()
+
+        inside = []
+        for value in values:
+            if low <= value <= high:
+                inside.append(value - low)
+            else:
+                self.overflow.add(value)
+
+        if np is not None:
+            self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+            offsets = np.fromiter(inside, dtype=np.int64, count=len(inside))
+            np.bitwise_or.at(self.bits, offsets >> 3, np.left_shift(1, offsets & 7).astype(np.uint8))
+        else:
+            # Built as bytes and converted once; or-ing single bits into an int copies it every time
+            buffer = bytearray((self.size + 7) // 8)
+            for offset in inside:
+                buffer[offset >> 3] |= 1 << (offset & 7)
+            self.bits = int.from_bytes(buffer, 'little')
+
+    @classmethod
+    def _from_bits(cls, like: 'IdOccupancy', bits, overflow: Set[int]) -> 'IdOccupancy':
+        occupancy = cls.__new__(cls)
+        occupancy.low, occupancy.high, occupancy.size = like.low, like.high, like.size
+        occupancy.bits = bits
+        occupancy.overflow = overflow
+        return occupancy
+
+    def _check_compatible(self, other: 'IdOccupancy') -> None:
+        if (self.low, self.high) != (other.low, other.high):
+            raise ValueError(f"Cannot combine ID ranges {self.low}-{self.high} and {other.low}-{other.high}")
+
+    def __contains__(self, value: int) -> bool:
+        if not self.low <= value <= self.high:
+            return value in self.overflow
+        offset = value - self.low
+        if np is not None:
+            return bool(self.bits[offset >> 3] & (1 << (offset & 7)))
+        return bool(self.bits >> offset & 1)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __or__(self, other: 'IdOccupancy') -> 'IdOccupancy':
+        return self.union(other)
+
+    def __and__(self, other: 'IdOccupancy') -> 'IdOccupancy':
+        return self.intersection(other)
+
+    def union(self, other: 'IdOccupancy') -> 'IdOccupancy':
+        """Return the IDs used by either set."""
+        self._check_compatible(other)
+        bits = np.bitwise_or(self.bits, other.bits) if np is not None else self.bits | other.bits
+        return self._from_bits(self, bits, self.overflow | other.overflow)
+
+    def intersection(self, other: 'IdOccupancy') -> 'IdOccupancy':
+        """Return the IDs used by both sets."""
+        self._check_compatible(other)
+        bits = np.bitwise_and(self.bits, other.bits) if np is not None else self.bits & other.bits
+        return self._from_bits(self, bits, self.overflow & other.overflow)
+
+    def count(self) -> int:
+        """Return the number of IDs in the set."""
+        if np is not None:
+            if hasattr(np, 'bitwise_count'):
+                used = int(np.bitwise_count(self.bits).sum(dtype=np.uint64))
+            else:
+                used = int(_POPCOUNT[self.bits].sum(dtype=np.uint64))
+        else:
+            used = _popcount_int(self.bits)
+        return used + len(self.overflow)
+
+    def values(self) -> List[int]:
+        """Return the IDs in the set, sorted."""
+        if np is not None:
+            offsets = np.flatnonzero(np.unpackbits(self.bits, bitorder='little')[:self.size])
+            inside = (offsets + self.low).tolist()
+        else:
+            data = self.bits.to_bytes((self.size + 7) // 8, 'little')
+            inside = []
+            # Skip empty stretches in C; most bitmaps are sparse
+            for base in range(0, len(data), _CHUNK):
+                chunk = data[base:base + _CHUNK]
+                if chunk.count(0) == len(chunk):
+                    continue
+                inside.extend(
+                    self.low + (base + index) * 8 + bit
+                    for index, byte in enumerate(chunk) if byte
+                    for bit in range(8) if byte >> bit & 1
+                )
+        return sorted(inside + list(self.overflow))
+
+    def first_free_run(self, length: int, low: Optional[int] = None, high: Optional[int] = None) -> Optional[int]:
+        """
+        Find the lowest run of consecutive unused IDs.
+
+        Args:
+            length: Number of consecutive free IDs needed
+            low: First ID to consider (default: the bitmap's)
+            high: Last ID to consider (default: the bitmap's)
+
+        Returns:
+            Optional[int]: First ID of the run, or None if there is no such run
+        """
+        low = self.low if low is None else max(low, self.low)
+        high = self.high if high is None else min(high, self.high)
+        if length < 1 or high - low + 1 < length:
+            return None
+        start, stop = low - self.low, high - self.low + 1
+
+        if np is not None:
+            free = ~np.unpackbits(self.bits, bitorder='little')[start:stop].astype(bool)
+            # Runs start where free goes 0 -> 1 and end where it goes 1 -> 0
+            edges = np.diff(np.concatenate(([0], free.view(np.int8), [0])))
+            starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+            long_enough = np.flatnonzero(ends - starts >= length)
+            return int(starts[long_enough[0]]) + low if long_enough.size else None
+
+        # Bit i of runs stays set while IDs i .. i+covered-1 are all free; doubling needs log2(length) steps
+        runs = ~self.bits >> start & ((1 << (stop - start)) - 1)
+        covered = 1
+        while covered < length and runs:
+            step = min(covered, length - covered)
+            runs &= runs >> step
+            covered += step
+        if not runs:
+            return None
+        return (runs & -runs).bit_length() - 1 + low
+
+
+@dataclass
+class ConflictMatrix:
+    """Number of IDs each pair of resources both use."""
+    resources: List[str]
+    counts: List[List[int]] = field(default_factory=list)  # [i][j]; [i][i] = IDs of i shared with anyone
+
+    def pairs(self) -> Iterator[Tuple[str, str, int]]:
+        """Yield (resource, other resource, shared IDs) for every pair sharing at least one ID."""
+        for i, first in enumerate(self.resources):
+            for j in range(i + 1, len(self.resources)):
+                if self.counts[i][j]:
+                    yield first, self.resources[j], self.counts[i][j]
+
+
+def occupancy_by_resource(identities: Dict[str, MetaIdentity], kind: str,
+                          resources: Dict[str, str]) -> Dict[str, IdOccupancy]:
+    """
+    Collect the IDs of one kind each resource uses.
+
+    Args:
+        identities: {path: identity} of the files to compare
+        kind: One of ID_KINDS
+        resources: {path: resource name}; files of the same resource are combined
+
+    Returns:
+        Dict[str, IdOccupancy]: Occupancy per resource
+    """
+    values: Dict[str, List[int]] = {}
+    for file_path, identity in identities.items():
+        found = values.setdefault(resources[file_path], [])
+        found.extend(int(value) for value in getattr(identity, kind) if str(value).isdigit())
+    return {resource: IdOccupancy(ids) for resource, ids in values.items()}
+
+
+def conflict_matrix(occupancies: Dict[str, IdOccupancy]) -> ConflictMatrix:
+    """
+    Count the IDs every pair of resources has in common.
+
+    Args:
+        occupancies: IdOccupancy per resource, all over the same range
+
+    Returns:
+        ConflictMatrix: Resources in the given order with their pair counts
+    """
+    resources = list(occupancies)
+    matrix = ConflictMatrix(resources, [[0] * len(resources) for _ in resources])
+    if not resources:
+        return matrix
+    sets = [occupancies[resource] for resource in resources]
+
+    # IDs used by more than one resource
+    seen = sets[0]
+    shared = IdOccupancy(low=seen.low, high=seen.high)
+    for occupancy in sets[1:]:
+        shared = shared.union(seen.intersection(occupancy))
+        seen = seen.union(occupancy)
+    if not shared.count():
+        return matrix
+
+    if np is not None:
+        # Only the bytes holding shared IDs matter: one resources x shared-bits product
+        columns = np.flatnonzero(shared.bits)
+        rows = np.stack([occupancy.bits[columns] & shared.bits[columns] for occupancy in sets])
+        # Float products run on BLAS and are exact far beyond any count of IDs
+        hits = np.unpackbits(rows, axis=1).astype(np.float32)
+        matrix.counts = (hits @ hits.T).astype(np.int64).tolist()
+        owners: Dict[int, List[int]] = {}
+        for index, occupancy in enumerate(sets):
+            for value in occupancy.overflow & shared.overflow:
+                owners.setdefault(value, []).append(index)
+    else:
+        # Pairwise popcounts would touch every bitmap once per pair; shared IDs are few, so count per ID
+        owners = {}
+        for index, occupancy in enumerate(sets):
+            for value in occupancy.intersection(shared).values():
+                owners.setdefault(value, []).append(index)
+
+    for indexes in owners.values():
+        for i in indexes:
+            for j in indexes:
+                matrix.counts[i][j] += 1
+    return matrix
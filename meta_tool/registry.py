@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""
+Persistent SQLite registry of the IDs used across a server's resources.
+
+The registry records the siren IDs, modkit IDs and kitNames of every meta
+file under a resources directory together with the file's stat data (size,
+mtime, ctime and inode; see cache.file_key) and content hash. refresh()
+only re-parses files whose stat data changed and whose content hash no
+longer matches, so keeping the registry current after the first indexing
+pass is cheap.
+
+Example:
+    with IDRegistry('meta_registry.db') as registry:
+        registry.refresh('server/resources')
+        generator = IDGenerator(registry=registry)
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .cache import file_key
+from .meta_file_handler import MetaFileHandler
+from .scanner import DUPLICATE_KINDS, discover_meta_files, parse_files
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    resource TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL DEFAULT 0,
+    inode INTEGER NOT NULL DEFAULT 0,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ids (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ids_kind_value ON ids(kind, value);
+CREATE INDEX IF NOT EXISTS ids_file ON ids(file_id);
+"""
+
+# Columns added after the first release; older databases get them on open
+ADDED_FILE_COLUMNS = (
+    ('ctime_ns', 'INTEGER NOT NULL DEFAULT 0'),
+    ('inode', 'INTEGER NOT NULL DEFAULT 0'),
+)
+
+# Identity kinds whose values are numeric IDs
+NUMERIC_KINDS = ('siren_ids', 'modkit_ids')
+
+
+class IDRegistry:
+    """Persistent index of the IDs used by every meta file on a server."""
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        for name, definition in ADDED_FILE_COLUMNS:
+            if name not in columns:
+                # Zero never matches a real stat, so such files are hashed once on the next refresh
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {name} {definition}")
+
+    def __enter__(self) -> 'IDRegistry':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def refresh(self, resources_dir: str, jobs: Optional[int] = None) -> Dict[str, int]:
+        """
+        Bring the registry up to date with a resources directory.
+
+        Files are re-parsed only if their stat data changed and their
+        content hash differs from the recorded one. Files that disappeared
+        from the directory are dropped.
+
+        Args:
+            resources_dir: Root of the resources tree
+            jobs: Number of parser processes (default: CPU count)
+
+        Returns:
+            Dictionary of counts: {'added', 'updated', 'unchanged', 'removed', 'errors'}
+        """
+        stats = dict.fromkeys(('added', 'updated', 'unchanged', 'removed', 'errors'), 0)
+        known = {
+            row[0]: row[1:]
+            for row in self.conn.execute("SELECT path, id, size, mtime_ns, ctime_ns, inode, sha256 FROM files")
+        }
+
+        seen = set()
+        pending: List[Tuple[str, str, Tuple[int, int, int, int], str]] = []
+        for resource, paths in discover_meta_files(resources_dir).items():
+            for path in paths:
+                file_path = str(path.resolve())
+                seen.add(file_path)
+                _, *stat = file_key(file_path)
+                stat = tuple(stat)
+                record = known.get(file_path)
+                if record and record[1:5] == stat:
+                    stats['unchanged'] += 1
+                    continue
+
+                digest = MetaFileHandler.file_hash(file_path)
+                if record and record[5] == digest:
+                    # Touched but not modified; only the stat data is stale
+                    self.conn.execute(
+                        "UPDATE files SET size = ?, mtime_ns = ?, ctime_ns = ?, inode = ? WHERE id = ?",
+                        (*stat, record[0]),
+                    )
+                    stats['unchanged'] += 1
+                    continue
+
+                pending.append((file_path, resource, stat, digest))
+
+        base = os.path.join(str(Path(resources_dir).resolve()), '')
+        for file_path, (file_id, *_) in known.items():
+            if file_path not in seen and file_path.startswith(base):
+                self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                stats['removed'] += 1
+
+        details = {file_path: (resource, stat, digest) for file_path, resource, stat, digest in pending}
+        for file_path, identity, error in parse_files(list(details), jobs=jobs):
+            if identity is None:
+                stats['errors'] += 1
+                continue
+            resource, stat, digest = details[file_path]
+            record = known.get(file_path)
+            stats['updated' if record else 'added'] += 1
+            self._store(record[0] if record else None, file_path, resource, stat, digest, (
+                (kind, value) for kind in DUPLICATE_KINDS for value in getattr(identity, kind)
+            ))
+
+        self.conn.commit()
+        return stats
+
+    def _store(self, file_id: Optional[int], file_path: str, resource: str, stat: Tuple[int, int, int, int],
+               digest: str, values: Iterable[Tuple[str, object]]) -> None:
+        """Record a file's values; stat is (size, mtime, ctime, inode) as in file_key."""
+        if file_id is None:
+            cursor = self.conn.execute(
+                "INSERT INTO files (path, resource, size, mtime_ns, ctime_ns, inode, sha256) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (file_path, resource, *stat, digest),
+            )
+            file_id = cursor.lastrowid
+        else:
+            self.conn.execute(
+                "UPDATE files SET resource = ?, size = ?, mtime_ns = ?, ctime_ns = ?, inode = ?, sha256 = ? "
+                "WHERE id = ?",
+                (resource, *stat, digest, file_id),
+            )
+            self.conn.execute("DELETE FROM ids WHERE file_id = ?", (file_id,))
+        self.conn.executemany(
+            "INSERT INTO ids (file_id, kind, value) VALUES (?, ?, ?)",
+            ((file_id, kind, str(value)) for kind, value in values),
+        )
+
+    def used_ids(self, kinds: Iterable[str] = NUMERIC_KINDS) -> Set[int]:
+        """
+        Return every numeric ID recorded in the registry.
+
+        Args:
+            kinds: Identity kinds to include ('siren_ids', 'modkit_ids')
+
+        Returns:
+            Set of IDs in use anywhere on the server
+        """
+        kinds = tuple(kinds)
+        placeholders = ', '.join('?' for _ in kinds)
+        rows = self.conn.execute(
+            f"SELECT DISTINCT value FROM ids WHERE kind IN ({placeholders})", kinds
+        )
+        return {int(value) for value, in rows}
+
+    def kit_names(self) -> Set[str]:
+        """Return every kitName recorded in the registry."""
+        rows = self.conn.execute("SELECT DISTINCT value FROM ids WHERE kind = 'kit_names'")
+        return {value for value, in rows}
+
+    def definitions(self, kind: str, exclude: Iterable[str] = ()) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        Return every recorded value of one kind with the files defining it.
+
+        Args:
+            kind: Identity kind ('siren_ids', 'modkit_ids' or 'kit_names')
+            exclude: Paths of files to leave out, e.g. the ones being checked
+
+        Returns:
+            Dictionary of {value: [(resource, path), ...]}
+        """
+        excluded = {os.path.realpath(path) for path in exclude}
+        rows = self.conn.execute(
+            "SELECT ids.value, files.resource, files.path FROM ids JOIN files ON files.id = ids.file_id "
+            "WHERE ids.kind = ? ORDER BY files.resource, files.path",
+            (kind,),
+        )
+        found: Dict[str, List[Tuple[str, str]]] = {}
+        for value, resource, file_path in rows:
+            if file_path not in excluded:
+                found.setdefault(value, []).append((resource, file_path))
+        return found
+
+    def owners(self, kind: str, value: object) -> List[Tuple[str, str]]:
+        """
+        Find the files that define a value.
+
+        Args:
+            kind: Identity kind ('siren_ids', 'modkit_ids' or 'kit_names')
+            value: The ID or kitName to look up
+
+        Returns:
+            List of (resource, path) tuples
+        """
+        rows = self.conn.execute(
+            "SELECT files.resource, files.path FROM ids JOIN files ON files.id = ids.file_id "
+            "WHERE ids.kind = ? AND ids.value = ? ORDER BY files.resource, files.path",
+            (kind, str(value)),
+        )
+        return rows.fetchall()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+"""
+Server-wide discovery and conflict reporting for vehicle meta files.
+
+Walks a FiveM resources/ tree, finds every carcols/carvariations meta file
+(by file name and by fxmanifest.lua ``data_file`` entries), parses them in a
+process pool and reports IDs and kitNames that are defined more than once.
+
+Example:
+    report = scan_resources('server/resources', jobs=8)
+    for siren_id, resources in report.duplicates('siren_ids').items():
+        print(siren_id, resources)
+"""
+
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .identity import MetaIdentity
+from .meta_file_handler import MetaFileHandler
+
+MANIFEST_NAMES = ('fxmanifest.lua', '__resource.lua')
+
+# data_file types that point at files this tool understands
+META_DATA_FILES = {
+    'CARCOLS_FILE': 'carcols',
+    'VEHICLE_VARIATION_FILE': 'carvariations',
+}
+
+# Matches both `data_file 'TYPE' 'path'` and `data_file('TYPE')('path')`
+DATA_FILE_PATTERN = re.compile(
+    r"""data_file\s*\(?\s*['"](?P<type>\w+)['"]\s*\)?\s*\(?\s*['"](?P<path>[^'"]+)['"]"""
+)
+
+# Identity fields that must be unique across the whole server
+DUPLICATE_KINDS = ('siren_ids', 'modkit_ids', 'kit_names')
+
+
+def is_meta_file_name(name: str) -> bool:
+    """Return True if a file name looks like a carcols or carvariations meta file."""
+    lowered = name.lower()
+    return lowered.endswith('.meta') and ('carcols' in lowered or 'carvariations' in lowered)
+
+
+def parse_manifest(manifest_path: Path) -> List[Tuple[str, str]]:
+    """
+    Extract relevant data_file entries from an fxmanifest.lua / __resource.lua.
+
+    Args:
+        manifest_path: Path to the manifest
+
+    Returns:
+        List of (data_file type, relative path or glob) tuples
+    """
+    try:
+        text = manifest_path.read_text(encoding='utf-8', errors='replace')
+    except OSError:
+        return []
+
+    entries = []
+    for match in DATA_FILE_PATTERN.finditer(text):
+        if match.group('type') in META_DATA_FILES:
+            entries.append((match.group('type'), match.group('path')))
+    return entries
+
+
+def discover_meta_files(resources_dir: str) -> Dict[str, List[Path]]:
+    """
+    Find meta files under a resources directory, grouped by resource.
+
+    A resource is any directory containing an fxmanifest.lua or __resource.lua;
+    meta files outside a resource are grouped by their containing directory.
+
+    Args:
+        resources_dir: Root of the resources tree
+
+    Returns:
+        Dictionary of {resource name: [meta file paths]}
+    """
+    base = Path(resources_dir)
+    found: Dict[Path, set] = defaultdict(set)
+    resource_dirs = set()
+
+    for dirpath, dirnames, filenames in os.walk(base):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        current = Path(dirpath)
+
+        manifest = next((name for name in MANIFEST_NAMES if name in filenames), None)
+        if manifest:
+            resource_dirs.add(current)
+            for _, pattern in parse_manifest(current / manifest):
+                for match in current.glob(pattern.replace('\\', '/')):
+                    # Hidden files are the tool's own: locks, journals, temporary files
+                    if match.is_file() and not match.name.startswith('.'):
+                        found[current].add(match)
+
+        for name in filenames:
+            if is_meta_file_name(name):
+                found[_owning_resource(current, base, resource_dirs)].add(current / name)
+
+    return {
+        _resource_name(resource, base): sorted(paths)
+        for resource, paths in sorted(found.items())
+    }
+
+
+def _owning_resource(directory: Path, base: Path, resource_dirs: set) -> Path:
+    # os.walk is top-down, so an enclosing resource has always been seen already
+    for candidate in (directory, *directory.parents):
+        if candidate in resource_dirs:
+            return candidate
+        if candidate == base:
+            break
+    return directory
+
+
+def _resource_name(resource: Path, base: Path) -> str:
+    if resource == base:
+        return base.name or str(base)
+    return resource.relative_to(base).as_posix()
+
+
+def load_identity(file_path: str) -> Tuple[str, Optional[MetaIdentity], Optional[str]]:
+    """
+    Stream one meta file and extract its identity values.
+
+    Runs in worker processes, so errors are returned rather than raised.
+
+    Returns:
+        Tuple of (path, identity or None, error message or None)
+    """
+    try:
+        return file_path, MetaFileHandler().load_identity(file_path, positions=False), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+@dataclass
+class ScanReport:
+    """Result of scanning a resources tree."""
+    resources: Dict[str, List[str]] = field(default_factory=dict)
+    identities: Dict[str, MetaIdentity] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def duplicates(self, kind: str) -> Dict[object, List[str]]:
+        """
+        Find values of one identity field defined more than once.
+
+        Args:
+            kind: One of 'siren_ids', 'modkit_ids' or 'kit_names'
+
+        Returns:
+            Dictionary of {value: [resource, ...]} with one entry per definition
+        """
+        owners: Dict[object, List[str]] = defaultdict(list)
+        for resource, paths in self.resources.items():
+            for file_path in paths:
+                identity = self.identities.get(file_path)
+                if identity is None:
+                    continue
+                for value in getattr(identity, kind):
+                    owners[value].append(resource)
+        return {value: names for value, names in sorted(owners.items()) if len(names) > 1}
+
+    def to_dict(self) -> dict:
+        return {
+            'resources': self.resources,
+            'errors': self.errors,
+            'duplicates': {
+                kind: {str(value): names for value, names in self.duplicates(kind).items()}
+                for kind in DUPLICATE_KINDS
+            },
+        }
+
+
+def scan_resources(resources_dir: str, jobs: Optional[int] = None) -> ScanReport:
+    """
+    Discover and parse every meta file under a resources directory.
+
+    Args:
+        resources_dir: Root of the resources tree
+        jobs: Number of worker processes (default: CPU count)
+
+    Returns:
+        ScanReport: Parsed identities and parse errors
+    """
+    discovered = discover_meta_files(resources_dir)
+    report = ScanReport(resources={
+        resource: [str(path) for path in paths] for resource, paths in discovered.items()
+    })
+
+    files = [path for paths in report.resources.values() for path in paths]
+    for file_path, identity, error in parse_files(files, jobs=jobs):
+        if identity is not None:
+            report.identities[file_path] = identity
+        else:
+            report.errors[file_path] = error
+
+    return report
+
+
+def parse_files(files: List[str], jobs: Optional[int] = None) -> Iterator[Tuple[str, Optional[MetaIdentity], Optional[str]]]:
+    """
+    Run load_identity over many files, in a process pool when worthwhile.
+
+    Args:
+        files: Meta file paths
+        jobs: Number of worker processes (default: CPU count)
+
+    Yields:
+        (path, identity or None, error message or None) in input order
+    """
+    if not files:
+        return
+
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(files)))
+    if workers == 1:
+        yield from map(load_identity, files)
+        return
+
+    chunksize = max(1, len(files) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(load_identity, files, chunksize=chunksize)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""
+Resolver sessions: several resolutions over one load of a file pair.
+
+Calling resolve_carcols_conflicts and then resolve_modkit_conflicts on a
+ConflictResolver writes both files after each call. A ResolverSession runs
+any number of resolutions against the same in-memory trees and indexes,
+then takes one backup and writes each file once when it is committed.
+What was written is recorded in a change journal (see journal.py), stored
+next to the backups so the run can be undone or replayed.
+
+Example:
+    resolver = ConflictResolver('carcols.meta', 'carvariations.meta')
+    with ResolverSession(resolver) as session:
+        session.resolve_carcols()
+        session.resolve_modkits()
+    print(session.snapshot_id, session.journal_id, session.changes)
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .conflict_resolver import ConflictResolver, ResolutionPlan
+from .journal import ChangeJournal, JournalStore
+
+logger = logging.getLogger(__name__)
+
+
+class ResolverSession:
+    """Batches resolutions on one ConflictResolver into a single backup and save."""
+
+    def __init__(self, resolver: ConflictResolver, backup: bool = True, store_journal: bool = True):
+        """
+        Args:
+            resolver: Resolver over the file pair; it stops saving on its own
+            backup: Snapshot both files before the changes are written
+            store_journal: Store the change journal in the backup store; it is kept in
+                self.journal either way
+        """
+        self.resolver = resolver
+        self.resolver.autosave = False
+        self.backup = backup
+        self.store_journal = store_journal
+        self.changes: Dict[str, List[Tuple[str, str]]] = {'carcols': [], 'variations': []}
+        self.snapshot_id: Optional[str] = None
+        self.journal: Optional[ChangeJournal] = None
+        self.journal_id: Optional[str] = None
+
+    def __enter__(self) -> 'ResolverSession':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _record(self, changes: Dict[str, List[Tuple[str, str]]]) -> Dict[str, List[Tuple[str, str]]]:
+        for key, values in changes.items():
+            self.changes[key].extend(values)
+        return changes
+
+    def resolve_carcols(self, vehicles: Union[str, Iterable[str], None] = None,
+                        match: str = 'exact') -> Dict[str, List[Tuple[str, str]]]:
+        """Resolve carcols ID conflicts in memory (see ConflictResolver.resolve_carcols_conflicts)."""
+        return self._record(self.resolver.resolve_carcols_conflicts(vehicles, match))
+
+    def resolve_modkits(self, vehicles: Union[str, Iterable[str], None] = None,
+                        match: str = 'exact') -> Dict[str, List[Tuple[str, str]]]:
+        """Resolve modkit ID conflicts in memory (see ConflictResolver.resolve_modkit_conflicts)."""
+        return self._record(self.resolver.resolve_modkit_conflicts(vehicles, match))
+
+    def compact(self, kind: str) -> Dict[str, List[Tuple[str, str]]]:
+        """Renumber IDs into a dense block in memory (see ConflictResolver.compact_ids)."""
+        return self._record(self.resolver.compact_ids(kind))
+
+    def apply(self, plan: ResolutionPlan) -> Dict[str, List[Tuple[str, str]]]:
+        """Apply a previewed plan in memory (see ConflictResolver.apply_plan)."""
+        return self._record(self.resolver.apply_plan(plan))
+
+    def commit(self) -> Optional[str]:
+        """
+        Back up both files and write every change made in this session.
+
+        Returns:
+            The backup snapshot id, or None if nothing changed or backups are off
+        """
+        if not self.resolver.has_pending_changes():
+            logger.debug("Session has no changes to write")
+            return None
+
+        paths = [str(self.resolver.carcols_path), str(self.resolver.carvariations_path)]
+        if self.backup:
+            self.snapshot_id = self.resolver.file_handler.backup_files(paths)
+        self.journal = ChangeJournal(self.snapshot_id)
+        self.resolver.save(self.journal)
+        if self.store_journal:
+            self.journal_id = JournalStore(self.resolver.file_handler.backup_root).record(self.journal)
+        return self.snapshot_id
+
+    def rollback(self) -> None:
+        """Discard the session's changes; the files on disk are left untouched."""
+        for path in (self.resolver.carcols_path, self.resolver.carvariations_path):
+            # The cached trees hold the discarded edits
+            self.resolver.file_handler.documents.forget(str(path))
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+"""
+Split a monolithic carcols/carvariations pair into per-vehicle fragments.
+
+Each vehicle (see VehicleIndex) gets its own carcols.meta and
+carvariations.meta holding its variationData Item and the Kits, Sirens
+and Lights Items that only it uses. Items used by several vehicles, or by
+none, go to a shared fragment, so every Item is still defined exactly once.
+Editing or checking one vehicle afterwards reads kilobytes instead of the
+whole pack.
+
+Layout:
+    <output>/_shared/carcols.meta
+    <output>/<vehicle>/carcols.meta
+    <output>/<vehicle>/carvariations.meta
+
+Example:
+    result = split_meta_files('carcols.meta', 'carvariations.meta', 'data')
+    print('\n'.join(result.data_files(Path('.'))))
+"""
+
+import copy
+import os
+import re
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from lxml import etree
+
+from .backup_store import atomic_write
+from .identity import CARCOLS_ROOT, CARVARIATIONS_ROOT
+from .meta_file_handler import MetaFileHandler
+from .metrics import metrics
+from .scanner import DATA_FILE_PATTERN, META_DATA_FILES
+from .vehicle_index import VehicleIndex
+
+# Fragment holding Items that belong to no single vehicle
+SHARED_FRAGMENT = '_shared'
+
+# data_file type per root tag
+DATA_FILE_TYPES = {
+    CARCOLS_ROOT: 'CARCOLS_FILE',
+    CARVARIATIONS_ROOT: 'VEHICLE_VARIATION_FILE',
+}
+
+OUTPUT_NAMES = {
+    CARCOLS_ROOT: 'carcols.meta',
+    CARVARIATIONS_ROOT: 'carvariations.meta',
+}
+
+# Fewer fragments than this per extra process are written in-process
+MIN_FRAGMENTS_PER_WORKER = 50
+
+_UNSAFE_NAME_CHARS = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+@dataclass
+class Fragment:
+    """
+    Items of one output directory, in document order.
+
+    Items are stored as positions rather than elements, so fragments can be
+    sent to worker processes that loaded the same files.
+    """
+    name: str
+    # root tag -> {(section position, section tag): [item positions]}
+    sections: Dict[str, 'OrderedDict[Tuple[int, str], List[int]]'] = field(
+        default_factory=lambda: {tag: OrderedDict() for tag in OUTPUT_NAMES}
+    )
+
+    def add(self, root_tag: str, section: Tuple[int, str], item: int) -> None:
+        self.sections[root_tag].setdefault(section, []).append(item)
+
+
+@dataclass
+class SplitResult:
+    """Outcome of split_meta_files."""
+    files: List[Tuple[str, str]] = field(default_factory=list)  # (data_file type, written path)
+    vehicles: int = 0
+    shared_items: Dict[str, int] = field(default_factory=dict)  # section -> Items in the shared fragment
+
+    def data_files(self, resource_dir: Path) -> List[str]:
+        """
+        Return fxmanifest.lua data_file lines loading the fragments.
+
+        Args:
+            resource_dir: Directory of the manifest; fragment paths are relative to it
+
+        Raises:
+            ValueError: If a fragment lies outside resource_dir
+        """
+        lines = []
+        for file_type, path in self.files:
+            relative = os.path.relpath(path, str(resource_dir)).replace(os.sep, '/')
+            if relative.startswith('../'):
+                raise ValueError(f"Fragment {path} is outside the resource {resource_dir}")
+            lines.append(f"data_file '{file_type}' '{relative}'")
+        return lines
+
+
+def _fragment_dir_names(fragments: List[Fragment]) -> List[str]:
+    """
+    Give every fragment its own directory name.
+
+    Unsafe characters become underscores, so different vehicle names can
+    map to the same directory ("car 1" and "car_1", names differing only in
+    case on a case-insensitive file system, or a vehicle named _shared);
+    later ones get a -2, -3, ... suffix instead of overwriting the earlier
+    fragment.
+    """
+    taken = set()
+    names = []
+    for fragment in fragments:
+        if fragment.name == SHARED_FRAGMENT and not names:
+            base = SHARED_FRAGMENT
+        else:
+            # No leading dots: scans skip hidden directories, and . and .. are not names
+            base = _UNSAFE_NAME_CHARS.sub('_', fragment.name).strip('.') or '_'
+        name, suffix = base, 1
+        while name.lower() in taken:
+            suffix += 1
+            name = f"{base}-{suffix}"
+        taken.add(name.lower())
+        names.append(name)
+    return names
+
+
+def _item_id(item: etree._Element) -> Optional[str]:
+    id_elem = item.find('id')
+    return id_elem.attrib.get('value') if id_elem is not None else None
+
+
+# Parsed source trees by root tag, in each worker process
+_roots: Dict[str, etree._Element] = {}
+
+
+def _load_roots(carcols_path: str, carvariations_path: str) -> None:
+    """Worker initializer: parse the file pair once per process."""
+    handler = MetaFileHandler()
+    for path in (carcols_path, carvariations_path):
+        root, _ = handler.load_meta_file(path)
+        _roots[root.tag] = root
+
+
+def _write_fragment(fragment: Fragment, directory: Path) -> List[Tuple[str, str]]:
+    """Serialize one fragment's files from the trees loaded by _load_roots."""
+    written = []
+    for root_tag, sections in fragment.sections.items():
+        if not any(sections.values()):
+            continue
+        source = _roots[root_tag]
+        root = etree.Element(root_tag)
+        for (section_position, section), items in sections.items():
+            section_elem = etree.SubElement(root, section)
+            source_section = source[section_position]
+            for position in items:
+                section_elem.append(copy.deepcopy(source_section[position]))
+        data = etree.tostring(root, pretty_print=True, xml_declaration=True, encoding='UTF-8')
+
+        target = directory / OUTPUT_NAMES[root_tag]
+        atomic_write(target, lambda f: f.write(data))
+        written.append((DATA_FILE_TYPES[root_tag], str(target)))
+    return written
+
+
+def assign_items(carcols_root: etree._Element, carvariations_root: etree._Element) -> Tuple[List[Fragment], int]:
+    """
+    Work out which fragment every section Item of a file pair goes to.
+
+    Args:
+        carcols_root: Parsed carcols.meta
+        carvariations_root: Parsed carvariations.meta
+
+    Returns:
+        Tuple of (fragments, shared first, then one per vehicle; number of vehicles)
+    """
+    vehicles = VehicleIndex(carcols_root, carvariations_root).entries()
+
+    # Item value -> vehicles using it
+    kit_owners: Dict[str, set] = defaultdict(set)
+    siren_owners: Dict[str, set] = defaultdict(set)
+    light_owners: Dict[str, set] = defaultdict(set)
+    item_owner: Dict[etree._Element, str] = {}
+    for entry in vehicles:
+        for kit_name in entry.kit_names():
+            kit_owners[kit_name].add(entry.name)
+        for siren_id in entry.siren_ids():
+            siren_owners[siren_id].add(entry.name)
+        for item in entry.variation_items:
+            item_owner[item] = entry.name
+            for light in item.iterfind('lightSettings'):
+                light_owners[light.attrib.get('value')].add(entry.name)
+
+    def owner_of(section: str, item: etree._Element) -> Optional[str]:
+        if section == 'Kits':
+            owners = kit_owners.get((item.findtext('kitName') or '').strip(), ())
+        elif section == 'Sirens':
+            owners = siren_owners.get(_item_id(item), ())
+        elif section == 'Lights':
+            owners = light_owners.get(_item_id(item), ())
+        elif section == 'variationData':
+            owner = item_owner.get(item)
+            owners = (owner,) if owner else ()
+        else:
+            owners = ()
+        return next(iter(owners)) if len(owners) == 1 else None
+
+    shared = Fragment(SHARED_FRAGMENT)
+    fragments: Dict[str, Fragment] = OrderedDict((entry.name, Fragment(entry.name)) for entry in vehicles)
+    for root in (carcols_root, carvariations_root):
+        for section_position, section in enumerate(root):
+            if not isinstance(section.tag, str):
+                continue
+            for position, item in enumerate(section):
+                if not isinstance(item.tag, str):
+                    continue
+                owner = owner_of(section.tag, item)
+                (fragments[owner] if owner else shared).add(root.tag, (section_position, section.tag), position)
+
+    return [shared, *fragments.values()], len(vehicles)
+
+
+def split_meta_files(carcols_path: str, carvariations_path: str, output_dir: str,
+                     jobs: Optional[int] = None) -> SplitResult:
+    """
+    Write per-vehicle fragments of a carcols/carvariations pair.
+
+    Args:
+        carcols_path: Path to carcols.meta
+        carvariations_path: Path to carvariations.meta
+        output_dir: Directory the fragment directories are created in
+        jobs: Number of processes writing fragments (default: CPU count)
+
+    Returns:
+        SplitResult: Written files, in the order they should be loaded
+    """
+    handler = MetaFileHandler()
+    carcols_root, _ = handler.load_meta_file(carcols_path)
+    carvariations_root, _ = handler.load_meta_file(carvariations_path)
+    if carcols_root.tag != CARCOLS_ROOT or carvariations_root.tag != CARVARIATIONS_ROOT:
+        raise ValueError(f"Expected a {CARCOLS_ROOT} and a {CARVARIATIONS_ROOT} file")
+
+    with metrics.span('split.assign') as span:
+        fragments, vehicles = assign_items(carcols_root, carvariations_root)
+        span.add(vehicles=vehicles)
+
+    result = SplitResult(vehicles=vehicles)
+    for sections in fragments[0].sections.values():
+        for (_, section), items in sections.items():
+            result.shared_items[section] = len(items)
+
+    output = Path(output_dir)
+    directories = [output / name for name in _fragment_dir_names(fragments)]
+    with metrics.span('split.write') as span:
+        # Each worker parses the pair once; only worth it with enough fragments to share out
+        workers = max(1, min(jobs or os.cpu_count() or 1, len(fragments) // MIN_FRAGMENTS_PER_WORKER))
+        if workers == 1:
+            _roots.update({carcols_root.tag: carcols_root, carvariations_root.tag: carvariations_root})
+            try:
+                for fragment, directory in zip(fragments, directories):
+                    result.files.extend(_write_fragment(fragment, directory))
+            finally:
+                _roots.clear()
+        else:
+            chunksize = max(1, len(fragments) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_load_roots,
+                                     initargs=(carcols_path, carvariations_path)) as executor:
+                for written in executor.map(_write_fragment, fragments, directories, chunksize=chunksize):
+                    result.files.extend(written)
+        span.add(files=len(result.files), workers=workers)
+    return result
+
+
+def update_manifest(manifest_path: str, replaced: List[str], lines: List[str]) -> int:
+    """
+    Swap a manifest's data_file lines for the given files with new ones.
+
+    The new lines go where the first replaced line was, or at the end of the
+    manifest if none of the files was listed.
+
+    Args:
+        manifest_path: Path to fxmanifest.lua or __resource.lua
+        replaced: Paths of the files whose data_file lines are removed
+        lines: data_file lines to insert
+
+    Returns:
+        int: Number of lines removed
+    """
+    manifest = Path(manifest_path)
+    targets = {os.path.realpath(path) for path in replaced}
+    try:
+        original = manifest.read_text(encoding='utf-8')
+    except OSError as e:
+        raise ValueError(f"Failed to read manifest {manifest_path}: {str(e)}")
+
+    kept, position, removed = [], None, 0
+    for line in original.splitlines():
+        match = DATA_FILE_PATTERN.search(line)
+        if match and match.group('type') in META_DATA_FILES and \
+                os.path.realpath(manifest.parent / match.group('path')) in targets:
+            if position is None:
+                position = len(kept)
+            removed += 1
+            continue
+        kept.append(line)
+
+    if position is None:
+        position = len(kept)
+        if kept and kept[-1].strip():
+            kept.append('')
+            position += 1
+    kept[position:position] = lines
+
+    content = '\n'.join(kept) + '\n'
+    atomic_write(manifest, lambda f: f.write(content.encode('utf-8')))
+    return removed
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+"""
+Synthetic carcols.meta / carvariations.meta generator.
+
+Produces structurally valid meta file pairs of arbitrary size so that the
+resolver can be exercised and benchmarked without shipping large fixtures.
+
+Example:
+    carcols, carvariations = write_meta_pair('out/', vehicles=1000)
+"""
+
+from pathlib import Path
+from typing import Tuple
+
+
+def generate_carcols(vehicles: int, siren_base: int = 10000, kit_base: int = 100,
+                     kits_per_vehicle: int = 1, sirens_per_vehicle: int = 1,
+                     lights_per_siren: int = 1) -> str:
+    """
+    Build a carcols.meta document with modkits and sirens for each vehicle.
+
+    Vehicle ``n`` owns kit IDs ``kit_base + n * kits_per_vehicle + k`` and
+    siren IDs ``siren_base + n * sirens_per_vehicle + k``; its first siren is
+    the one carvariations.meta refers to.
+
+    Args:
+        vehicles: Number of vehicles to generate
+        siren_base: First siren ID
+        kit_base: First modkit ID
+        kits_per_vehicle: Modkits per vehicle
+        sirens_per_vehicle: Siren settings per vehicle
+        lights_per_siren: Light Items per siren setting (real packs use up to 20)
+
+    Returns:
+        str: The XML document
+    """
+    lines = ["<?xml version='1.0' encoding='utf-8'?>", "<CVehicleModelInfoVarGlobal>", "  <Kits>"]
+    for n in range(vehicles):
+        for k in range(kits_per_vehicle):
+            kit_id = kit_base + n * kits_per_vehicle + k
+            lines += [
+                "    <Item>",
+                f"      <kitName>{kit_id}_synth{n}_modkit</kitName>",
+                f'      <id value="{kit_id}"/>',
+                "      <kitType>MKT_SPECIAL</kitType>",
+                "      <visibleMods/>",
+                "    </Item>",
+            ]
+    lines += ["  </Kits>", "  <Sirens>"]
+    for n in range(vehicles):
+        for k in range(sirens_per_vehicle):
+            lines += [
+                "    <Item>",
+                f'      <id value="{siren_base + n * sirens_per_vehicle + k}"/>',
+                f"      <name>synth{n}</name>",
+                '      <sequencerBpm value="600"/>',
+                "      <sirens>",
+            ]
+            for _ in range(lights_per_siren):
+                lines += [
+                    "        <Item>",
+                    '          <rotation><delta value="0.0"/><start value="0.0"/><speed value="3.0"/></rotation>',
+                    '          <intensity value="1.0"/>',
+                    "        </Item>",
+                ]
+            lines += [
+                "      </sirens>",
+                "    </Item>",
+            ]
+    lines += ["  </Sirens>", "</CVehicleModelInfoVarGlobal>", ""]
+    return "\n".join(lines)
+
+
+def generate_carvariations(vehicles: int, siren_base: int = 10000, kit_base: int = 100,
+                           kits_per_vehicle: int = 1, sirens_per_vehicle: int = 1,
+                           lights_per_siren: int = 1) -> str:
+    """
+    Build a carvariations.meta document matching ``generate_carcols``.
+
+    Args:
+        vehicles: Number of vehicles to generate
+        siren_base: First siren ID, must match the carcols document
+        kit_base: First modkit ID, must match the carcols document
+        kits_per_vehicle: Modkits per vehicle, must match the carcols document
+        sirens_per_vehicle: Siren settings per vehicle, must match the carcols document
+        lights_per_siren: Unused; accepted so both generators take the same options
+
+    Returns:
+        str: The XML document
+    """
+    lines = ["<?xml version='1.0' encoding='utf-8'?>", "<CVehicleModelInfoVariation>", "  <variationData>"]
+    for n in range(vehicles):
+        lines += [
+            "    <Item>",
+            f"      <modelName>synth{n}</modelName>",
+            "      <kits>",
+        ]
+        for k in range(kits_per_vehicle):
+            kit_id = kit_base + n * kits_per_vehicle + k
+            lines.append(f"        <Item>{kit_id}_synth{n}_modkit</Item>")
+        lines += [
+            "      </kits>",
+            '      <lightSettings value="1"/>',
+            f'      <sirenSettings value="{siren_base + n * sirens_per_vehicle}"/>',
+            "    </Item>",
+        ]
+    lines += ["  </variationData>", "</CVehicleModelInfoVariation>", ""]
+    return "\n".join(lines)
+
+
+def write_meta_pair(directory: str, vehicles: int, **kwargs) -> Tuple[Path, Path]:
+    """
+    Write a synthetic carcols/carvariations pair into a directory.
+
+    Args:
+        directory: Target directory, created if missing
+        vehicles: Number of vehicles to generate
+        **kwargs: Passed through to the generator functions
+
+    Returns:
+        Tuple of (carcols path, carvariations path)
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    carcols = directory / "carcols.meta"
+    carvariations = directory / "carvariations.meta"
+    carcols.write_text(generate_carcols(vehicles, **kwargs), encoding='utf-8')
+    carvariations.write_text(generate_carvariations(vehicles, **kwargs), encoding='utf-8')
+    return carcols, carvariations
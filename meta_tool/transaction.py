@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+
+"""
+All-or-nothing replacement of several files, with advisory locks per resource.
+
+A resolution rewrites carcols.meta and carvariations.meta together; if the
+process dies between the two writes, or another run rewrites one of them
+in between, the pair no longer agrees. FileTransaction prevents both:
+
+1. Locking: every resource directory involved is locked (an advisory lock
+   on a .meta_tool.lock file, in sorted order so runs never deadlock).
+   Runs touching other resources proceed in parallel. Once all locks are
+   held, transactions a crashed run left unfinished are rolled back.
+2. Prepare: each new file is written and fsynced to a temporary file next
+   to its target. Nothing visible has changed yet; an error here just
+   deletes the temporary files.
+3. Commit: each target is hard-linked to an .orig file, a journal listing
+   the targets is written to every resource directory involved, and the
+   temporary files are renamed over the targets. Deleting the journals is
+   the commit point; the .orig files are removed afterwards.
+
+If anything fails during the renames, the .orig files are moved back. If
+the process dies instead, the next transaction that locks one of the
+resource directories finds the journal and does the same, so the files end
+up either all old or all new.
+
+Example:
+    with FileTransaction([carcols, carvariations]) as transaction:
+        transaction.write(carcols, lambda f: f.write(new_carcols))
+        transaction.write(carvariations, lambda f: f.write(new_carvariations))
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .backup_store import fsync_directory, write_temp
+from .scanner import MANIFEST_NAMES
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = '.meta_tool.lock'
+JOURNAL_SUFFIX = '.meta_tool.journal'
+
+# Seconds to wait for another run to release a resource
+LOCK_TIMEOUT = 30.0
+LOCK_POLL_INTERVAL = 0.05
+
+
+def resource_dir(file_path: str) -> Path:
+    """Return the resource directory a file belongs to: the nearest one with a manifest, else its own."""
+    path = Path(os.path.realpath(file_path))
+    for directory in path.parents:
+        if any((directory / name).exists() for name in MANIFEST_NAMES):
+            return directory
+    return path.parent
+
+
+class ResourceLock:
+    """
+    Advisory, exclusive lock on a resource directory, held by one run at a time.
+
+    The .meta_tool.lock file stays in the directory after release: deleting
+    it would let a run waiting on the old file and a run creating a new one
+    both hold "the" lock. Like the tool's other files it is hidden, and the
+    scanner skips hidden files.
+    """
+
+    def __init__(self, directory: Path, timeout: float = LOCK_TIMEOUT):
+        """
+        Args:
+            directory: Resource directory; the lock file is created in it
+            timeout: Seconds to wait for another run to release it
+        """
+        self.directory = directory
+        self.timeout = timeout
+        self._file = None
+
+    def _try_lock(self) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    def acquire(self) -> None:
+        """
+        Raises:
+            ValueError: If the lock is still held by another run after the timeout
+        """
+        self._file = open(self.directory / LOCK_NAME, 'a+b')
+        deadline = time.monotonic() + self.timeout
+        while not self._try_lock():
+            if time.monotonic() >= deadline:
+                self._file.close()
+                self._file = None
+                raise ValueError(f"Resource {self.directory} is locked by another run")
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self) -> None:
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+    def __enter__(self) -> 'ResourceLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+def _orig_path(target: Path, transaction_id: str) -> Path:
+    return target.with_name(f".{target.name}.{transaction_id}.orig")
+
+
+def _roll_back(journal: dict) -> None:
+    """Put every file of an unfinished transaction back the way it was; safe to repeat."""
+    for entry in journal['files']:
+        target, orig = Path(entry['target']), entry['orig']
+        if orig is not None and os.path.exists(orig):
+            if target.exists() and os.path.samefile(orig, target):
+                # Never replaced; renaming a hard link over its own file would do nothing
+                os.unlink(orig)
+            else:
+                os.replace(orig, target)
+        elif orig is None and entry['renamed'] and target.exists():
+            # The file did not exist before this transaction
+            target.unlink()
+        if os.path.exists(entry['temp']):
+            os.unlink(entry['temp'])
+
+
+def recover(directory: Path) -> int:
+    """
+    Roll back transactions a crashed run left unfinished in a resource directory.
+
+    The caller must hold the directory's ResourceLock.
+
+    Returns:
+        int: Number of transactions rolled back
+    """
+    recovered = 0
+    for journal_path in sorted(directory.glob(f".*{JOURNAL_SUFFIX}")):
+        try:
+            journal = json.loads(journal_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            # Crashed while writing the journal, so nothing was renamed yet
+            journal_path.unlink()
+            continue
+        logger.warning("Rolling back unfinished transaction %s in %s", journal['id'], directory)
+        for entry in journal['files']:
+            entry['renamed'] = True
+        _roll_back(journal)
+        for copy in journal['journals']:
+            if os.path.exists(copy):
+                os.unlink(copy)
+        recovered += 1
+    return recovered
+
+
+class FileTransaction:
+    """Replaces a set of files all-or-nothing under per-resource locks; see the module docstring."""
+
+    def __init__(self, paths: Iterable[str], timeout: float = LOCK_TIMEOUT):
+        """
+        Args:
+            paths: Files the transaction may write; their resource directories are locked
+            timeout: Seconds to wait for each resource lock
+        """
+        self.id = uuid.uuid4().hex[:12]
+        directories = sorted({resource_dir(str(path)) for path in paths})
+        self.locks = [ResourceLock(directory, timeout) for directory in directories]
+        self._staged: Dict[Path, str] = {}  # target -> temporary file
+        self._on_commit: List[Callable[[], None]] = []
+
+    def __enter__(self) -> 'FileTransaction':
+        acquired = []
+        try:
+            for lock in self.locks:
+                lock.acquire()
+                acquired.append(lock)
+            # A journal left behind may list files in any of the directories, so recover only once all are locked
+            for lock in self.locks:
+                recover(lock.directory)
+        except BaseException:
+            for lock in reversed(acquired):
+                lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            for lock in reversed(self.locks):
+                lock.release()
+
+    def write(self, target: str, write: Callable) -> None:
+        """
+        Prepare a file's new contents; nothing is visible until commit.
+
+        Args:
+            target: File to replace
+            write: Callable writing the new contents to a binary file object
+        """
+        target = Path(os.path.realpath(target))
+        if target in self._staged:
+            os.unlink(self._staged.pop(target))
+        self._staged[target] = write_temp(target, write)
+
+    def on_commit(self, callback: Callable[[], None]) -> None:
+        """Run callback once the transaction has committed."""
+        self._on_commit.append(callback)
+
+    def commit(self) -> None:
+        """Move every prepared file into place, or none of them."""
+        if not self._staged:
+            return
+        directories = sorted({target.parent for target in self._staged} | {lock.directory for lock in self.locks})
+        journal = {'id': self.id, 'files': [], 'journals': [
+            str(lock.directory / f".{self.id}{JOURNAL_SUFFIX}") for lock in self.locks
+        ]}
+        try:
+            for target, temp_path in self._staged.items():
+                orig: Optional[Path] = None
+                if target.exists():
+                    orig = _orig_path(target, self.id)
+                    try:
+                        os.link(target, orig)
+                    except OSError:  # no hard links on this filesystem
+                        shutil.copy2(str(target), str(orig))
+                journal['files'].append({
+                    'target': str(target), 'temp': temp_path, 'orig': str(orig) if orig else None, 'renamed': False,
+                })
+            data = json.dumps(journal).encode('utf-8')
+            for copy in journal['journals']:
+                with open(copy, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            for directory in directories:
+                fsync_directory(directory)
+
+            for entry in journal['files']:
+                os.replace(entry['temp'], entry['target'])
+                entry['renamed'] = True
+            for directory in directories:
+                fsync_directory(directory)
+        except BaseException:
+            _roll_back(journal)
+            for copy in journal['journals']:
+                if os.path.exists(copy):
+                    os.unlink(copy)
+            self._staged.clear()
+            raise
+
+        # Commit point: without a journal, recovery no longer rolls these files back
+        for copy in journal['journals']:
+            os.unlink(copy)
+        for directory in directories:
+            fsync_directory(directory)
+        for entry in journal['files']:
+            if entry['orig'] is not None:
+                os.unlink(entry['orig'])
+        self._staged.clear()
+
+        for callback in self._on_commit:
+            callback()
+
+    def rollback(self) -> None:
+        """Discard every prepared file."""
+        for temp_path in self._staged.values():
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+        self._staged.clear()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+Index of the vehicles in a carcols.meta / carvariations.meta pair.
+
+Vehicles are named by carvariations modelName and by the NUMBER_NAME_modkit
+pattern of carcols kitNames. Each entry holds the elements that belong to
+the vehicle, so selecting any number of vehicles is one lookup per name
+rather than a search of both documents per vehicle. The index holds
+elements rather than values, so it stays current while a resolver rewrites
+IDs in place.
+"""
+
+import fnmatch
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from lxml import etree
+
+# Vehicle name in a kitName such as "680357_24valor18sedan_modkit"
+KIT_NAME_PATTERN = re.compile(r'\d+_([^_]+)_modkit')
+
+MATCH_MODES = ('exact', 'prefix')
+
+_GLOB_CHARS = set('*?[')
+
+
+@dataclass
+class VehicleEntry:
+    """Elements of both meta files that belong to one vehicle."""
+    name: str
+    variation_items: List[etree._Element] = field(default_factory=list)
+    siren_settings: List[etree._Element] = field(default_factory=list)
+    kit_refs: List[etree._Element] = field(default_factory=list)
+    kit_name_elems: List[etree._Element] = field(default_factory=list)
+
+    def siren_ids(self) -> List[str]:
+        """Return the vehicle's sirenSettings values, in document order."""
+        return [siren.attrib['value'] for siren in self.siren_settings if 'value' in siren.attrib]
+
+    def kit_names(self) -> List[str]:
+        """Return the kits named after the vehicle or referenced by its variations."""
+        names = [elem.text for elem in self.kit_name_elems if elem.text]
+        names.extend(item.text for item in self.kit_refs if item.text)
+        return list(dict.fromkeys(names))
+
+
+class VehicleIndex:
+    """Maps vehicle names to their kits, siren IDs and variation Items."""
+
+    def __init__(self, carcols_root: etree._Element, carvariations_root: etree._Element):
+        """
+        Args:
+            carcols_root: Parsed carcols.meta
+            carvariations_root: Parsed carvariations.meta
+        """
+        # Keyed by lower-case name; model names are case-insensitive in game
+        self._entries: Dict[str, VehicleEntry] = {}
+
+        for item in carvariations_root.iterfind(".//variationData/Item"):
+            name = (item.findtext("modelName") or '').strip()
+            if not name:
+                continue
+            entry = self._entry(name)
+            entry.variation_items.append(item)
+            entry.siren_settings.extend(item.iterfind("sirenSettings"))
+            entry.kit_refs.extend(item.iterfind("kits/Item"))
+
+        for name_elem in carcols_root.iterfind(".//Kits/Item/kitName"):
+            match = KIT_NAME_PATTERN.match(name_elem.text or '')
+            if match:
+                self._entry(match.group(1)).kit_name_elems.append(name_elem)
+
+    def _entry(self, name: str) -> VehicleEntry:
+        key = name.lower()
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = VehicleEntry(name)
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name.lower() in self._entries
+
+    def get(self, name: str) -> Optional[VehicleEntry]:
+        """Return a vehicle's entry by exact (case-insensitive) name."""
+        return self._entries.get(name.lower())
+
+    def entries(self) -> List[VehicleEntry]:
+        """Return every vehicle, in document order."""
+        return list(self._entries.values())
+
+    def names(self) -> List[str]:
+        """Return every vehicle name, sorted."""
+        return sorted(entry.name for entry in self._entries.values())
+
+    def select(self, patterns: Iterable[str], match: str = 'exact') -> List[VehicleEntry]:
+        """
+        Return the vehicles matching any of the given names or glob patterns.
+
+        Patterns containing *, ? or [ are shell-style globs; other names
+        match the whole vehicle name ('exact') or its start ('prefix').
+        Matching ignores case.
+
+        Args:
+            patterns: Vehicle names or glob patterns
+            match: 'exact' or 'prefix'
+
+        Returns:
+            Matching vehicles, each once, in document order
+
+        Raises:
+            ValueError: If a pattern matches no vehicle, or match is unknown
+        """
+        if match not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {match}")
+
+        selected = set()
+        for pattern in patterns:
+            key = pattern.lower()
+            if _GLOB_CHARS & set(key):
+                found = fnmatch.filter(self._entries, key)
+            elif match == 'prefix':
+                found = [name for name in self._entries if name.startswith(key)]
+            else:
+                found = [key] if key in self._entries else []
+            if not found:
+                raise ValueError(f"No vehicle matches {pattern!r}")
+            selected.update(found)
+
+        return [entry for key, entry in self._entries.items() if key in selected]
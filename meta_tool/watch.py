@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+"""
+Watch a resources tree and re-check meta files as they are saved.
+
+MetaWatcher polls the stat data (size, mtime) of the meta files found by
+discover_meta_files, which costs one stat call per file per poll; the tree
+itself is walked again only every few seconds to pick up new files. Changes
+are debounced: a batch is reported once no file changed for `quiet`
+seconds, or at the latest `max_delay` seconds after its first change, so an
+editor saving several files (or one file in several writes) triggers a
+single re-check.
+
+Only the changed files are parsed again (identity values only, see
+MetaFileHandler.load_identity); ConflictIndex keeps every other file's
+values in memory and reports which conflicts a batch introduced or fixed.
+
+Example:
+    watcher = MetaWatcher('server/resources')
+    for batch in watcher.watch():
+        for conflict in batch.new_conflicts:
+            print(conflict.kind, conflict.value, conflict.owners)
+"""
+
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .conflicts import Conflict, _value_order
+from .identity import MetaIdentity
+from .metrics import metrics
+from .scanner import DUPLICATE_KINDS, discover_meta_files, load_identity, parse_files
+
+# Seconds between polls, of quiet before a batch is reported, and before a burst is reported anyway
+POLL_INTERVAL = 0.02
+QUIET_PERIOD = 0.05
+MAX_DELAY = 1.0
+
+# Seconds between walks of the whole tree looking for new meta files
+RESCAN_INTERVAL = 2.0
+
+
+class ConflictIndex:
+    """In-memory map of every identity value to the files defining it."""
+
+    def __init__(self):
+        # (kind, value) -> one path per definition
+        self._owners: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        # path -> the (kind, value) keys it defines
+        self._files: Dict[str, List[Tuple[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def update(self, file_path: str, identity: Optional[MetaIdentity]) -> None:
+        """Replace one file's values; None removes the file."""
+        for key in self._files.pop(file_path, ()):
+            owners = self._owners[key]
+            owners.remove(file_path)
+            if not owners:
+                del self._owners[key]
+
+        if identity is not None:
+            keys = [(kind, str(value)) for kind in DUPLICATE_KINDS for value in getattr(identity, kind)]
+            self._files[file_path] = keys
+            for key in keys:
+                self._owners[key].append(file_path)
+
+    def keys(self, file_path: str) -> List[Tuple[str, str]]:
+        """Return the (kind, value) keys a file defines."""
+        return self._files.get(file_path, [])
+
+    def conflicts(self, keys: Optional[Iterable[Tuple[str, str]]] = None) -> List[Conflict]:
+        """Return the current conflicts, optionally only among the given (kind, value) keys."""
+        keys = self._owners if keys is None else keys
+        found = [
+            Conflict(key[0], key[1], sorted(self._owners[key]))
+            for key in keys if len(self._owners.get(key, ())) > 1
+        ]
+        return sorted(found, key=lambda c: (DUPLICATE_KINDS.index(c.kind), _value_order(c.value)))
+
+
+@dataclass
+class WatchBatch:
+    """One debounced batch of changes and what it did to the conflicts."""
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    new_conflicts: List[Conflict] = field(default_factory=list)
+    resolved: List[Conflict] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)  # path -> why it could not be parsed
+    latency: float = 0.0  # seconds from the last change being seen to the batch being checked
+
+
+class MetaWatcher:
+    """Polls a resources tree and keeps a ConflictIndex of it up to date."""
+
+    def __init__(self, resources_dir: str, interval: float = POLL_INTERVAL, quiet: float = QUIET_PERIOD,
+                 max_delay: float = MAX_DELAY, rescan_interval: float = RESCAN_INTERVAL):
+        """
+        Args:
+            resources_dir: Root of the resources tree
+            interval: Seconds between polls
+            quiet: Seconds without further changes before a batch is checked
+            max_delay: Seconds after a batch's first change it is checked at the latest
+            rescan_interval: Seconds between walks of the tree for new files
+        """
+        self.resources_dir = resources_dir
+        self.interval = interval
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self.rescan_interval = rescan_interval
+        self.index = ConflictIndex()
+        self.errors: Dict[str, str] = {}
+        self._stats: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._last_rescan = 0.0
+
+    def _discover(self) -> List[str]:
+        self._last_rescan = time.monotonic()
+        return [str(path) for paths in discover_meta_files(self.resources_dir).values() for path in paths]
+
+    @staticmethod
+    def _stat(file_path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def start(self, jobs: Optional[int] = None) -> List[Conflict]:
+        """
+        Parse every meta file in the tree and return the conflicts already present.
+
+        Args:
+            jobs: Number of parser processes for this first pass (default: CPU count)
+        """
+        files = self._discover()
+        self._stats = {file_path: self._stat(file_path) for file_path in files}
+        with metrics.span('watch.start') as span:
+            for file_path, identity, error in parse_files(files, jobs=jobs):
+                if identity is None:
+                    self.errors[file_path] = error
+                self.index.update(file_path, identity)
+            span.add(files=len(files))
+        return self.index.conflicts()
+
+    def poll(self) -> Set[str]:
+        """Return the files created, modified or deleted since the last poll."""
+        known = list(self._stats)
+        if time.monotonic() - self._last_rescan >= self.rescan_interval:
+            known.extend(file_path for file_path in self._discover() if file_path not in self._stats)
+
+        changed = set()
+        for file_path in known:
+            stat = self._stat(file_path)
+            if stat != self._stats.get(file_path, ()):
+                changed.add(file_path)
+                if stat is None:
+                    self._stats.pop(file_path, None)
+                else:
+                    self._stats[file_path] = stat
+        return changed
+
+    def check(self, files: Iterable[str]) -> WatchBatch:
+        """
+        Re-parse the given files and update the index.
+
+        Args:
+            files: Paths that changed; paths that no longer exist are dropped
+
+        Returns:
+            WatchBatch: Conflicts the changes introduced or resolved
+        """
+        batch = WatchBatch()
+        with metrics.span('watch.check') as span:
+            parsed = []
+            for file_path in sorted(files):
+                if os.path.exists(file_path):
+                    batch.changed.append(file_path)
+                    parsed.append(load_identity(file_path))
+                else:
+                    batch.removed.append(file_path)
+                    parsed.append((file_path, None, None))
+
+            affected = set()
+            for file_path, identity, _ in parsed:
+                affected.update(self.index.keys(file_path))
+                if identity is not None:
+                    affected.update((kind, str(value)) for kind in DUPLICATE_KINDS for value in getattr(identity, kind))
+            before = {conflict.key: conflict for conflict in self.index.conflicts(affected)}
+
+            for file_path, identity, error in parsed:
+                self.errors.pop(file_path, None)
+                if error is not None:
+                    # Most likely caught mid-save; the next write triggers another check
+                    self.errors[file_path] = batch.errors[file_path] = error
+                self.index.update(file_path, identity)
+
+            after = self.index.conflicts(affected)
+            # A conflict is new if it just appeared or a file just joined it
+            batch.new_conflicts = [
+                conflict for conflict in after
+                if conflict.key not in before or set(conflict.owners) - set(before[conflict.key].owners)
+            ]
+            still = {conflict.key for conflict in after}
+            batch.resolved = [conflict for key, conflict in before.items() if key not in still]
+            span.add(files=len(parsed))
+        return batch
+
+    def watch(self, stop: Optional[threading.Event] = None) -> Iterator[WatchBatch]:
+        """
+        Poll until stopped, yielding a WatchBatch per debounced batch of changes.
+
+        Args:
+            stop: Event ending the loop once set (default: run until interrupted)
+        """
+        pending: Set[str] = set()
+        first_change = last_change = 0.0
+        while stop is None or not stop.is_set():
+            changed = self.poll()
+            now = time.monotonic()
+            if changed:
+                if not pending:
+                    first_change = now
+                pending |= changed
+                last_change = now
+
+            if pending and (now - last_change >= self.quiet or now - first_change >= self.max_delay):
+                batch = self.check(pending)
+                batch.latency = time.monotonic() - last_change
+                pending = set()
+                yield batch
+
+            time.sleep(self.interval)
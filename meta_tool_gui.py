@@ -1,24 +1,211 @@
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QFileDialog, QComboBox, QGroupBox,
-    QRadioButton, QMessageBox
+    QRadioButton, QMessageBox, QProgressBar, QTableView, QHeaderView
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import (
+    Qt, QObject, QRunnable, QThreadPool, pyqtSignal, QAbstractTableModel, QModelIndex
+)
+import argparse
 import sys
 import os
+import threading
 from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.meta_file_handler import MetaFileHandler
+from meta_tool.session import ResolverSession
 import logging
 
 logger = logging.getLogger('MetaTool')
 
+
+class TaskCancelled(Exception):
+    """Raised inside a worker when the user cancelled the task."""
+
+
+class WorkerSignals(QObject):
+    """Signals a Worker uses to talk to the UI thread."""
+    progress = pyqtSignal(int, str)
+    result = pyqtSignal(object)
+    error = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """
+    Runs fn(report, *args) on the thread pool.
+
+    fn calls report(percent, message) before each step; that updates the
+    progress bar and raises TaskCancelled once the user has pressed Cancel,
+    so a task stops at the next step boundary. Once fn returns, its result
+    stands: the worker reports completion itself, without checking for
+    Cancel, so a task that already wrote its files is never shown as
+    cancelled.
+    """
+
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = WorkerSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def report(self, percent, message):
+        if self._cancel.is_set():
+            raise TaskCancelled()
+        self.signals.progress.emit(percent, message)
+
+    def run(self):
+        try:
+            result = self.fn(self.report, *self.args)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            logger.exception("Error in background task")
+            self.signals.error.emit(str(e))
+        else:
+            self.signals.progress.emit(100, "Done")
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+def load_files(report, carcols_path, variations_path, allocator=None):
+    """
+    Parse the selected files and, once both are known, index them. Runs on
+    a worker thread; each file is preloaded into the handler's document
+    cache when it is selected, and the resolver takes the trees from there,
+    so each file is parsed only once.
+
+    Returns:
+        Tuple of (resolver or None, vehicle names)
+    """
+    handler = MetaFileHandler()
+    paths = [path for path in (carcols_path, variations_path) if path]
+    for step, path in enumerate(paths):
+        if path not in handler.documents:
+            report(step * 80 // len(paths), f"Parsing {os.path.basename(path)}...")
+            handler.preload(path)
+
+    if not (carcols_path and variations_path):
+        return None, []
+
+    report(80, "Indexing IDs...")
+    resolver = ConflictResolver(carcols_path, variations_path, allocator=allocator)
+    return resolver, resolver.get_vehicle_list()
+
+
+def plan_files(report, resolver, operation, vehicle):
+    """
+    Work out the changes of one resolution without writing. Runs on a worker thread.
+
+    Cancel is only honoured before planning starts: once the plan has
+    reserved its IDs it is returned, to be applied or discarded from the
+    preview.
+    """
+    report(10, f"Planning {operation.lower()} changes...")
+    if operation == "Carcols":
+        return resolver.plan_carcols_conflicts(vehicle)
+    return resolver.plan_modkit_conflicts(vehicle)
+
+
+def apply_files(report, resolver, plan):
+    """Apply a previewed plan and save the files, recording a change journal. Runs on a worker thread."""
+    report(10, f"Writing {len(plan.changes)} changes...")
+    with ResolverSession(resolver, backup=False) as session:
+        session.apply(plan)
+    return session.journal_id
+
+
+class ChangeTableModel(QAbstractTableModel):
+    """
+    Table of the PlannedChanges of a resolution plan.
+
+    The view only asks for the rows on screen, and filtering just rebuilds
+    a list of row references, so plans with tens of thousands of changes
+    stay responsive.
+    """
+
+    COLUMNS = ("Vehicle", "Change", "File", "Old Value", "New Value")
+    KIND_LABELS = {
+        'siren_id': "Siren ID",
+        'siren_ref': "Siren reference",
+        'kit_name': "Kit name",
+        'modkit_id': "Modkit ID",
+        'kit_ref': "Kit reference",
+    }
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._changes = []
+        self._rows = []
+
+    def set_changes(self, changes):
+        self.beginResetModel()
+        self._changes = list(changes)
+        self._rows = self._changes
+        self.endResetModel()
+
+    def set_filter(self, vehicle=None, kind=None):
+        """Show only the changes of one vehicle and/or change kind (None shows all)."""
+        self.beginResetModel()
+        self._rows = [
+            change for change in self._changes
+            if (vehicle is None or vehicle in change.vehicle.split(', '))
+            and (kind is None or change.kind == kind)
+        ]
+        self.endResetModel()
+
+    def vehicles(self):
+        return sorted({name for change in self._changes for name in change.vehicle.split(', ') if name})
+
+    def kinds(self):
+        return sorted({change.kind for change in self._changes}, key=list(self.KIND_LABELS).index)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        change = self._rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return change.vehicle
+        if column == 1:
+            return self.KIND_LABELS.get(change.kind, change.kind)
+        if column == 2:
+            return "carcols.meta" if change.file == 'carcols' else "carvariations.meta"
+        if column == 3:
+            return change.old_value
+        return change.new_value
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+
 class MetaToolGUI(QMainWindow):
-    def __init__(self):
+    def __init__(self, allocator=None):
         try:
             logger.info("Initializing MetaToolGUI")
             super().__init__()
+            # Address of a shared ID allocation service, if any (see `serve-allocator`)
+            self.allocator = allocator
             self.carcols_path = ""
             self.variations_path = ""
             self.resolver = None
+            # Plan shown in the preview, waiting for Apply or Discard
+            self.plan = None
+            self.worker = None
+            self.thread_pool = QThreadPool.globalInstance()
             logger.info("Calling init_ui")
             self.init_ui()
             logger.info("GUI initialization complete")
@@ -44,19 +231,19 @@ class MetaToolGUI(QMainWindow):
             # Carcols selection
             carcols_layout = QHBoxLayout()
             self.carcols_label = QLabel("No carcols.meta selected")
-            carcols_btn = QPushButton("Select Carcols.meta")
-            carcols_btn.clicked.connect(self.select_carcols)
+            self.carcols_btn = QPushButton("Select Carcols.meta")
+            self.carcols_btn.clicked.connect(self.select_carcols)
             carcols_layout.addWidget(self.carcols_label)
-            carcols_layout.addWidget(carcols_btn)
+            carcols_layout.addWidget(self.carcols_btn)
             file_layout.addLayout(carcols_layout)
 
             # Variations selection
             variations_layout = QHBoxLayout()
             self.variations_label = QLabel("No carvariations.meta selected")
-            variations_btn = QPushButton("Select Carvariations.meta")
-            variations_btn.clicked.connect(self.select_variations)
+            self.variations_btn = QPushButton("Select Carvariations.meta")
+            self.variations_btn.clicked.connect(self.select_variations)
             variations_layout.addWidget(self.variations_label)
-            variations_layout.addWidget(variations_btn)
+            variations_layout.addWidget(self.variations_btn)
             file_layout.addLayout(variations_layout)
 
             file_group.setLayout(file_layout)
@@ -82,11 +269,62 @@ class MetaToolGUI(QMainWindow):
             vehicle_group.setLayout(vehicle_layout)
             layout.addWidget(vehicle_group)
 
+            # Progress
+            progress_layout = QHBoxLayout()
+            self.status_label = QLabel("")
+            self.progress_bar = QProgressBar()
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setVisible(False)
+            self.cancel_btn = QPushButton("Cancel")
+            self.cancel_btn.clicked.connect(self.cancel_task)
+            self.cancel_btn.setVisible(False)
+            progress_layout.addWidget(self.status_label)
+            progress_layout.addWidget(self.progress_bar)
+            progress_layout.addWidget(self.cancel_btn)
+            layout.addLayout(progress_layout)
+
             # Process Button
-            self.process_btn = QPushButton("Process")
+            self.process_btn = QPushButton("Preview Changes")
             self.process_btn.clicked.connect(self.process_files)
             self.process_btn.setEnabled(False)
             layout.addWidget(self.process_btn)
+
+            # Change Preview
+            preview_group = QGroupBox("Preview")
+            preview_layout = QVBoxLayout()
+            filter_layout = QHBoxLayout()
+            self.vehicle_filter = QComboBox()
+            self.kind_filter = QComboBox()
+            self.vehicle_filter.currentIndexChanged.connect(self.apply_filter)
+            self.kind_filter.currentIndexChanged.connect(self.apply_filter)
+            self.preview_count = QLabel("")
+            filter_layout.addWidget(QLabel("Vehicle:"))
+            filter_layout.addWidget(self.vehicle_filter)
+            filter_layout.addWidget(QLabel("Change:"))
+            filter_layout.addWidget(self.kind_filter)
+            filter_layout.addWidget(self.preview_count)
+            preview_layout.addLayout(filter_layout)
+
+            self.change_model = ChangeTableModel(self)
+            self.change_table = QTableView()
+            self.change_table.setModel(self.change_model)
+            # Fixed row heights let the view skip measuring every row
+            self.change_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+            self.change_table.verticalHeader().setVisible(False)
+            self.change_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+            preview_layout.addWidget(self.change_table)
+
+            apply_layout = QHBoxLayout()
+            self.apply_btn = QPushButton("Apply")
+            self.apply_btn.clicked.connect(self.apply_plan)
+            self.discard_btn = QPushButton("Discard")
+            self.discard_btn.clicked.connect(self.discard_plan)
+            apply_layout.addWidget(self.apply_btn)
+            apply_layout.addWidget(self.discard_btn)
+            preview_layout.addLayout(apply_layout)
+            preview_group.setLayout(preview_layout)
+            layout.addWidget(preview_group)
+            self.show_plan(None)
             logger.info("UI setup complete")
         except Exception as e:
             logger.exception("Error in MetaToolGUI initialization")
@@ -113,49 +351,156 @@ class MetaToolGUI(QMainWindow):
             self.update_vehicle_list()
 
     def update_process_button(self):
-        self.process_btn.setEnabled(bool(self.carcols_path and self.variations_path))
+        self.process_btn.setEnabled(
+            bool(self.carcols_path and self.variations_path and self.resolver and not self.worker)
+        )
+        self.apply_btn.setEnabled(bool(self.plan and not self.worker))
+        self.discard_btn.setEnabled(bool(self.plan and not self.worker))
+
+    def start_task(self, fn, *args, on_result, on_error):
+        """Run fn on the thread pool, showing its progress until it finishes."""
+        self.worker = Worker(fn, *args)
+        self.worker.signals.progress.connect(self.on_progress)
+        self.worker.signals.result.connect(on_result)
+        self.worker.signals.error.connect(on_error)
+        self.worker.signals.cancelled.connect(lambda: self.status_label.setText("Cancelled"))
+        self.worker.signals.finished.connect(lambda worker=self.worker: self.on_task_finished(worker))
+
+        for widget in (self.carcols_btn, self.variations_btn, self.process_btn, self.apply_btn, self.discard_btn):
+            widget.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.setVisible(True)
+        self.thread_pool.start(self.worker)
+
+    def cancel_task(self):
+        if self.worker:
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Cancelling...")
+
+    def on_progress(self, percent, message):
+        self.progress_bar.setValue(percent)
+        self.status_label.setText(message)
+
+    def on_task_finished(self, worker):
+        if worker is not self.worker:
+            # A newer task was started from this task's result or error handler
+            return
+        self.worker = None
+        self.progress_bar.setVisible(False)
+        self.cancel_btn.setVisible(False)
+        self.carcols_btn.setEnabled(True)
+        self.variations_btn.setEnabled(True)
+        self.update_process_button()
 
     def update_vehicle_list(self):
-        if self.carcols_path and self.variations_path:
-            try:
-                self.resolver = ConflictResolver(self.carcols_path, self.variations_path)
-                self.vehicle_combo.clear()
-                self.vehicle_combo.addItem("All Vehicles")
-                # Add vehicles from meta files
-                vehicles = self.resolver.get_vehicle_list()
-                self.vehicle_combo.addItems(vehicles)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error loading files: {str(e)}")
+        self.show_plan(None)
+        self.resolver = None
+        self.update_process_button()
+        self.start_task(
+            load_files, self.carcols_path, self.variations_path, self.allocator,
+            on_result=self.on_files_loaded,
+            on_error=lambda message: QMessageBox.critical(self, "Error", f"Error loading files: {message}"),
+        )
+
+    def on_files_loaded(self, result):
+        resolver, vehicles = result
+        self.resolver = resolver
+        self.vehicle_combo.clear()
+        self.vehicle_combo.addItem("All Vehicles")
+        # Add vehicles from meta files
+        self.vehicle_combo.addItems(vehicles)
 
     def process_files(self):
         if not self.resolver:
             return
 
-        try:
-            selected_vehicle = None
-            if self.vehicle_combo.currentText() != "All Vehicles":
-                selected_vehicle = self.vehicle_combo.currentText()
-
-            if self.carcols_radio.isChecked():
-                self.resolver.resolve_carcols_conflicts(selected_vehicle)
-                operation = "Carcols"
-            else:
-                self.resolver.resolve_modkit_conflicts(selected_vehicle)
-                operation = "Modkit"
-
-            msg = f"{operation} conflicts resolved successfully!"
-            if selected_vehicle:
-                msg += f" for vehicle: {selected_vehicle}"
-            QMessageBox.information(self, "Success", msg)
+        selected_vehicle = None
+        if self.vehicle_combo.currentText() != "All Vehicles":
+            selected_vehicle = self.vehicle_combo.currentText()
+        operation = "Carcols" if self.carcols_radio.isChecked() else "Modkit"
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error processing files: {str(e)}")
+        self.discard_plan()
+        self.start_task(
+            plan_files, self.resolver, operation, selected_vehicle,
+            on_result=lambda plan: self.show_plan(plan, operation, selected_vehicle),
+            on_error=lambda message: QMessageBox.critical(self, "Error", f"Error processing files: {message}"),
+        )
+
+    def show_plan(self, plan, operation=None, selected_vehicle=None):
+        """Show a plan in the preview table, or clear the preview if plan is None."""
+        self.plan = plan
+        self.plan_operation = (operation, selected_vehicle)
+        changes = plan.changes if plan else []
+        self.change_model.set_changes(changes)
+
+        for combo, label, values in (
+            (self.vehicle_filter, "All Vehicles", self.change_model.vehicles()),
+            (self.kind_filter, "All Changes", self.change_model.kinds()),
+        ):
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(label, None)
+            for value in values:
+                combo.addItem(ChangeTableModel.KIND_LABELS.get(value, value), value)
+            combo.blockSignals(False)
+
+        self.preview_count.setText(f"{len(changes)} changes" if plan else "")
+        self.update_process_button()
+
+    def apply_filter(self):
+        self.change_model.set_filter(self.vehicle_filter.currentData(), self.kind_filter.currentData())
+        self.preview_count.setText(f"{self.change_model.rowCount()} of {len(self.plan.changes)} changes")
+
+    def discard_plan(self):
+        if self.plan and self.resolver:
+            self.resolver.discard_plan(self.plan)
+        self.show_plan(None)
+
+    def apply_plan(self):
+        if not (self.plan and self.resolver):
+            return
+
+        operation, selected_vehicle = self.plan_operation
+        self.start_task(
+            apply_files, self.resolver, self.plan,
+            on_result=lambda journal_id: self.on_files_processed(operation, selected_vehicle, journal_id),
+            on_error=self.on_process_error,
+        )
+
+    def on_files_processed(self, operation, selected_vehicle, journal_id=None):
+        self.show_plan(None)
+
+        msg = f"{operation} conflicts resolved successfully!"
+        if selected_vehicle:
+            msg += f" for vehicle: {selected_vehicle}"
+        if journal_id:
+            msg += f"\n\nChange journal {journal_id} (undo with `meta-tool undo {journal_id}`)"
+        QMessageBox.information(self, "Success", msg)
+
+    def on_process_error(self, message):
+        self.resolver = None
+        self.show_plan(None)
+        QMessageBox.critical(self, "Error", f"Error processing files: {message}")
+        self.update_vehicle_list()
+
+    def closeEvent(self, event):
+        if self.worker:
+            self.worker.cancel()
+        self.thread_pool.waitForDone()
+        super().closeEvent(event)
 
 def main():
-    app = QApplication(sys.argv)
-    window = MetaToolGUI()
+    parser = argparse.ArgumentParser(description='FiveM Meta Tool')
+    parser.add_argument('--allocator', metavar='URL', default=os.environ.get('META_TOOL_ALLOCATOR'),
+                        help='Claim new IDs from a shared allocation service')
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MetaToolGUI(allocator=args.allocator)
     window.show()
     sys.exit(app.exec())
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -9,6 +9,11 @@ setup(
         'Click',
         'lxml',
     ],
+    extras_require={
+        'zstd': ['zstandard'],
+        'fast': ['numpy'],
+        'bench': ['pytest', 'pytest-benchmark'],
+    },
     entry_points={
         'console_scripts': [
             'gta-meta-tool=meta_tool.cli:cli',
@@ -0,0 +1,65 @@
+import threading
+
+from meta_tool.allocator import AllocatorServer, AllocatorState, RemoteIDGenerator
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.synthetic import write_meta_pair
+
+
+def start_server(state):
+    server = AllocatorServer(('127.0.0.1', 0), state)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server
+
+
+def test_concurrent_clients_never_get_the_same_id(tmp_path):
+    server = start_server(AllocatorState(str(tmp_path / 'ids.jsonl'), used={10000}))
+    allocated = []
+
+    def client():
+        generator = RemoteIDGenerator(server.url, carcols_range=(10000, 10999))
+        for _ in range(20):
+            allocated.extend(generator.generate_carcols_ids(5))
+        generator.client.close()
+
+    threads = [threading.Thread(target=client) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    server.server_close()
+
+    assert len(allocated) == len(set(allocated)) == 400
+    assert 10000 not in allocated
+
+    # The claims survive a restart; the seeded ID is not stored
+    state = AllocatorState(str(tmp_path / 'ids.jsonl'))
+    assert state.used == set(allocated)
+
+
+def test_resolver_claims_ids_from_the_service(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=3)
+    server = start_server(AllocatorState())
+
+    resolver = ConflictResolver(str(carcols), str(carvariations), allocator=server.url)
+    plan = resolver.plan_carcols_conflicts()
+    server.shutdown()
+    server.server_close()
+
+    new_ids = {int(new_id) for new_id in plan.mapping.values()}
+    assert len(new_ids) == 3
+    # The files' own IDs were claimed first, so the new ones differ from them
+    assert server.state.used >= new_ids | {10000, 10001, 10002, 100, 101, 102}
+    assert not new_ids & {10000, 10001, 10002}
+
+
+def test_clients_only_release_ids_they_alone_claimed():
+    state = AllocatorState(used={10000})
+    mine = state.allocate((10000, 10999), 3, client='a')
+    state.reserve([10500, 10501], client='a')
+    state.reserve([10501], client='b')
+
+    # Seeded IDs, another client's IDs and IDs claimed by two clients stay claimed
+    assert state.release([10000, *mine], client='b') == 0
+    assert state.release([10000, 10500, 10501, *mine], client='a') == 4
+    assert state.check([10000, 10500, 10501, *mine]) == [10000, 10501]
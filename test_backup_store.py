@@ -0,0 +1,56 @@
+import os
+
+from meta_tool.backup_store import BackupStore
+
+
+def _blobs(store):
+    return sorted(path.name for path in store.objects.glob('*/*'))
+
+
+def test_unchanged_files_are_stored_once(tmp_path):
+    store = BackupStore(str(tmp_path / 'store'))
+    meta = tmp_path / 'carcols.meta'
+    meta.write_text('<CVehicleModelInfoVarGlobal/>')
+
+    first = store.backup([str(meta)])
+    second = store.backup([str(meta)])
+
+    assert first != second
+    assert len(_blobs(store)) == 1
+
+    meta.write_text('<CVehicleModelInfoVarGlobal><Kits/></CVehicleModelInfoVarGlobal>')
+    store.backup([str(meta)])
+    assert len(_blobs(store)) == 2
+
+
+def test_restore_and_prune(tmp_path):
+    store = BackupStore(str(tmp_path / 'store'))
+    meta = tmp_path / 'carcols.meta'
+    meta.write_text('v1')
+    v1 = store.backup([str(meta)])
+    meta.write_text('v2')
+    store.backup([str(meta)])
+
+    assert store.restore(v1) == [str(meta.resolve())]
+    assert meta.read_text() == 'v1'
+    assert store.restore(v1) == []
+
+    removed = store.prune(keep_last=1)
+    assert removed == {'snapshots': 1, 'objects': 1}
+    assert [manifest['id'] for manifest in store.list_snapshots()] != [v1]
+
+
+def test_same_size_edit_with_mtime_kept_is_backed_up(tmp_path):
+    store = BackupStore(str(tmp_path / 'store'))
+    meta = tmp_path / 'carcols.meta'
+    meta.write_text('<a>1</a>')
+    store.backup([str(meta)])
+    stat = meta.stat()
+
+    meta.write_text('<a>2</a>')
+    os.utime(meta, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    second = store.backup([str(meta)])
+    meta.write_text('<a>3</a>')
+    store.restore(second)
+
+    assert meta.read_text() == '<a>2</a>'
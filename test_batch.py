@@ -0,0 +1,69 @@
+import threading
+
+from click.testing import CliRunner
+
+from meta_tool.allocator import AllocatorServer, AllocatorState
+from meta_tool.batch import resolve_batch
+from meta_tool.cli import cli
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.meta_file_handler import MetaFileHandler
+from meta_tool.synthetic import write_meta_pair
+
+
+def siren_ids(carcols):
+    handler = MetaFileHandler()
+    return handler.load_identity(str(carcols)).siren_ids
+
+
+def test_parallel_batch_never_hands_out_the_same_id_twice(tmp_path):
+    resources = tmp_path / 'resources'
+    pairs = [write_meta_pair(resources / name, vehicles=4) for name in ('a', 'b', 'c', 'd')]
+
+    result = resolve_batch([str(resources)], jobs=2, backup_root=str(tmp_path / 'backups'))
+
+    assert not result.errors and not result.failed
+    assert sorted(outcome.resource for outcome in result.resources) == ['a', 'b', 'c', 'd']
+    assert result.snapshot_id is not None
+    ids = [siren_id for carcols, _ in pairs for siren_id in siren_ids(carcols)]
+    assert len(ids) == len(set(ids)) == 16
+    # The IDs the files started with were claimed before any new one was drawn
+    assert not set(ids) & {10000, 10001, 10002, 10003}
+
+
+def test_manifest_lists_pairs_and_failures_exit_non_zero(tmp_path):
+    write_meta_pair(tmp_path / 'a', vehicles=2)
+    write_meta_pair(tmp_path / 'b', vehicles=2)
+    (tmp_path / 'broken').mkdir()
+    (tmp_path / 'broken' / 'carcols.meta').write_text('<CVehicleModelInfoVarGlobal>')
+    manifest = tmp_path / 'batch.txt'
+    manifest.write_text("# resources to resolve\n"
+                        "a/carcols.meta a/carvariations.meta\n"
+                        "b\n"
+                        "broken/carcols.meta 'broken/carvariations.meta'\n")
+
+    result = CliRunner().invoke(cli, ['resolve-batch', str(manifest), '--jobs', '1', '--no-backup'])
+
+    assert result.exit_code == 1
+    assert 'a: 4 carcols' in result.output
+    assert 'b: 4 carcols' in result.output
+    assert 'Skipped (2)' in result.output
+
+
+def test_failed_resource_releases_the_ids_it_claimed(tmp_path, monkeypatch):
+    write_meta_pair(tmp_path / 'a', vehicles=3)
+    server = AllocatorServer(('127.0.0.1', 0), AllocatorState())
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def fail_to_save(self, journal=None):
+        raise ValueError("disk full")
+
+    monkeypatch.setattr(ConflictResolver, 'save', fail_to_save)
+    try:
+        result = resolve_batch([str(tmp_path / 'a')], jobs=1, allocator=server.url, backup_root=None)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert [outcome.error for outcome in result.resources] == ["disk full"]
+    # Only the IDs the files already use stay claimed
+    assert server.state.used == {10000, 10001, 10002, 100, 101, 102}
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from meta_tool.cache import DocumentCache
+from meta_tool.meta_file_handler import MetaFileHandler
+from meta_tool.synthetic import write_meta_pair
+
+
+def test_identity_cache_skips_parsing_unchanged_files(tmp_path, monkeypatch):
+    carcols, _ = write_meta_pair(tmp_path, vehicles=3)
+    handler = MetaFileHandler(cache_dir=str(tmp_path / 'cache'))
+    parsed = handler.load_identity(str(carcols))
+
+    def fail(*args):
+        raise AssertionError("parsed again")
+    monkeypatch.setattr(handler, '_parse_identity', fail)
+
+    assert handler.load_identity(str(carcols)).nodes == parsed.nodes
+    # Touched but not modified: the content hash still matches
+    os.utime(carcols, ns=(0, 0))
+    assert handler.load_identity(str(carcols), positions=False).siren_ids == parsed.siren_ids
+
+    carcols.write_text(carcols.read_text().replace('10001', '20001'))
+    with pytest.raises(AssertionError):
+        handler.load_identity(str(carcols))
+
+
+def test_document_cache_hands_each_tree_out_once(tmp_path):
+    carcols, _ = write_meta_pair(tmp_path, vehicles=2)
+    cache = DocumentCache(maxsize=1)
+    cache.put(str(carcols), 'tree')
+
+    assert str(carcols) in cache
+    assert cache.take(str(carcols)) == 'tree'
+    assert cache.take(str(carcols)) is None
+
+    cache.put(str(carcols), 'tree')
+    cache.put(str(tmp_path / 'carvariations.meta'), 'other')
+    assert cache.take(str(carcols)) is None
+
+    cache.put(str(carcols), 'tree')
+    carcols.write_text(carcols.read_text() + '\n')
+    assert cache.take(str(carcols)) is None
+
+
+def test_unsaved_edits_do_not_reach_later_loads(tmp_path):
+    carcols, _ = write_meta_pair(tmp_path, vehicles=2)
+    handler = MetaFileHandler(cache_dir=None)
+    handler.preload(str(carcols))
+
+    root, _ = handler.load_meta_file(str(carcols))
+    root.find('.//Sirens/Item/id').set('value', '1')
+
+    again, _ = handler.load_meta_file(str(carcols))
+    assert again is not root
+    assert again.find('.//Sirens/Item/id').get('value') == '10000'
+
+
+def test_same_size_edit_within_mtime_resolution_is_a_miss(tmp_path):
+    carcols, _ = write_meta_pair(tmp_path, vehicles=2)
+    handler = MetaFileHandler(cache_dir=str(tmp_path / 'cache'))
+    handler.load_identity(str(carcols))
+    stat = os.stat(carcols)
+
+    # Patched in place, keeping the size and the mtime
+    with open(carcols, 'r+b') as f:
+        data = f.read()
+        f.seek(0)
+        f.write(data.replace(b'10001', b'20001'))
+    os.utime(carcols, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert 20001 in handler.load_identity(str(carcols)).siren_ids
+
+
+def test_root_tag_reads_only_the_header(tmp_path):
+    path = tmp_path / 'carcols.meta'
+    path.write_text('<?xml version="1.0"?>\n<!-- header -->\n<CVehicleModelInfoVarGlobal><Kits>')
+    handler = MetaFileHandler(cache_dir=None)
+
+    # Truncated after the root start tag, but the header is enough
+    assert handler.validate_meta_file(str(path))
+    path.write_text('not xml')
+    assert not handler.validate_meta_file(str(path))
@@ -0,0 +1,107 @@
+import pytest
+
+from lxml import etree
+
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.synthetic import write_meta_pair
+
+
+def _siren_values(path, xpath):
+    root = etree.parse(str(path)).getroot()
+    return [elem.attrib['value'] for elem in root.iterfind(xpath)]
+
+
+def test_carcols_resolution_keeps_references_in_sync(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=20)
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+
+    changes = resolver.resolve_carcols_conflicts()
+
+    assert len(changes['carcols']) == 20
+    assert len(changes['variations']) == 20
+    sirens = _siren_values(carcols, ".//Sirens/Item/id")
+    settings = _siren_values(carvariations, ".//sirenSettings")
+    assert sorted(sirens) == sorted(settings)
+    assert not set(sirens) & {str(10000 + n) for n in range(20)}
+
+
+def test_shared_siren_id_is_remapped_once(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=3)
+    text = carvariations.read_text().replace('value="10001"', 'value="10000"')
+    carvariations.write_text(text)
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+
+    resolver.resolve_carcols_conflicts()
+
+    settings = _siren_values(carvariations, ".//sirenSettings")
+    assert settings[0] == settings[1]
+    assert settings[0] in _siren_values(carcols, ".//Sirens/Item/id")
+
+
+def test_modkit_resolution_updates_kit_id_and_variations(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=5)
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+
+    changes = resolver.resolve_modkit_conflicts()
+
+    assert len(changes['carcols']) == 5
+    assert len(changes['variations']) == 5
+    root = etree.parse(str(carcols)).getroot()
+    for kit in root.iterfind(".//Kits/Item"):
+        assert kit.findtext("kitName").split('_')[0] == kit.find("id").attrib['value']
+    kit_names = {kit.text for kit in root.iterfind(".//kitName")}
+    variation_kits = {item.text for item in etree.parse(str(carvariations)).getroot().iterfind(".//kits/Item")}
+    assert kit_names == variation_kits
+
+
+def test_modkit_resolution_single_vehicle(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=5)
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+
+    changes = resolver.resolve_modkit_conflicts('synth3')
+
+    assert [old for old, _ in changes['carcols']] == ['103_synth3_modkit']
+
+
+def test_plan_previews_changes_without_writing(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=4)
+    before = carcols.read_bytes(), carvariations.read_bytes()
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+
+    plan = resolver.plan_modkit_conflicts()
+
+    assert (carcols.read_bytes(), carvariations.read_bytes()) == before
+    assert sorted({change.kind for change in plan.changes}) == ['kit_name', 'kit_ref', 'modkit_id']
+    assert {change.vehicle for change in plan.changes} == {f'synth{n}' for n in range(4)}
+
+    changes = resolver.apply_plan(plan)
+
+    planned = [(c.old_value, c.new_value) for c in plan.changes if c.kind == 'kit_name']
+    assert changes['carcols'] == planned
+
+
+def test_discarded_plan_releases_ids(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=4)
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+
+    plan = resolver.plan_carcols_conflicts()
+    new_ids = [int(new_id) for new_id in plan.mapping.values()]
+    assert not any(resolver.id_generator.validate_id_availability(new_id) for new_id in new_ids)
+
+    resolver.discard_plan(plan)
+
+    assert all(resolver.id_generator.validate_id_availability(new_id) for new_id in new_ids)
+
+
+def test_applied_plan_cannot_be_applied_again(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=4)
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+    plan = resolver.plan_modkit_conflicts()
+    resolver.apply_plan(plan)
+
+    with pytest.raises(ValueError):
+        resolver.apply_plan(plan)
+
+    # Its IDs are in use now; discarding must not free them
+    resolver.discard_plan(plan)
+    assert not any(resolver.id_generator.validate_id_availability(int(new_id)) for new_id in plan.mapping.values())
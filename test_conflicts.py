@@ -0,0 +1,46 @@
+import json
+
+from click.testing import CliRunner
+
+from meta_tool.cli import cli
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.registry import IDRegistry
+from meta_tool.session import ResolverSession
+from meta_tool.synthetic import write_meta_pair
+
+
+def test_check_exits_non_zero_on_conflicts(tmp_path):
+    resources = tmp_path / 'resources'
+    write_meta_pair(resources / 'a', vehicles=2)
+    write_meta_pair(resources / 'b', vehicles=2, siren_base=10001, kit_base=500)
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ['check', str(resources), '--json'])
+    assert result.exit_code == 1
+    conflicts = json.loads(result.output)['conflicts']
+    assert [(c['kind'], c['value'], len(c['owners'])) for c in conflicts] == [('siren_ids', '10001', 2)]
+
+    assert runner.invoke(cli, ['check', str(resources / 'a')]).exit_code == 0
+
+
+def test_only_conflicts_remaps_colliding_ids_and_leaves_clean_files_unwritten(tmp_path):
+    resources = tmp_path / 'resources'
+    write_meta_pair(resources / 'a', vehicles=2)
+    carcols, carvariations = write_meta_pair(resources / 'b', vehicles=2, siren_base=10001, kit_base=500)
+    before = carcols.read_bytes(), carvariations.read_bytes()
+
+    with IDRegistry(str(tmp_path / 'ids.db')) as registry:
+        registry.refresh(str(resources))
+        resolver = ConflictResolver(str(carcols), str(carvariations), registry=registry, only_conflicts=True)
+    resolver.file_handler.backup_root = str(tmp_path / 'backups')
+
+    with ResolverSession(resolver) as session:
+        session.resolve_modkits()
+    assert session.snapshot_id is None
+    assert (carcols.read_bytes(), carvariations.read_bytes()) == before
+
+    with ResolverSession(resolver) as session:
+        session.resolve_carcols()
+    assert [old for old, _ in session.changes['carcols']] == ['10001']
+    assert set(resolver.siren_id_index) >= {'10002'}
+    assert '10001' not in resolver.siren_id_index
@@ -4,16 +4,16 @@ from meta_tool.conflict_resolver import ConflictResolver
 from meta_tool.meta_file_handler import MetaFileHandler
 from meta_tool.id_generator import IDGenerator
 import shutil
+import tempfile
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 def setup_test_files():
-    """Create copies of meta files for testing."""
-    attachments_dir = Path.home() / "attachments"
-    test_dir = Path.home() / "test_files"
-    test_dir.mkdir(exist_ok=True)
+    """Create copies of the bundled meta files for testing."""
+    attachments_dir = Path(__file__).resolve().parent / "attachments"
+    test_dir = Path(tempfile.mkdtemp(prefix="meta_tool_test_"))
 
     # Copy test files
     shutil.copy2(attachments_dir / "carcols.meta", test_dir / "carcols.meta")
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.id_generator import IDGenerator, IdAllocator
+from meta_tool.synthetic import write_meta_pair
+
+
+def test_allocator_exhausts_range_then_raises():
+    allocator = IdAllocator(1, 50, used={3, 7, 49}, rng=random.Random(0))
+
+    allocated = allocator.allocate_many(47)
+
+    assert sorted(allocated) == sorted(set(range(1, 51)) - {3, 7, 49})
+    assert allocator.free_count == 0
+    with pytest.raises(ValueError):
+        allocator.allocate()
+
+
+def test_allocator_release_merges_intervals():
+    allocator = IdAllocator(1, 10, used=range(1, 11))
+
+    for value in (4, 6, 5):
+        allocator.release(value)
+
+    assert allocator.free_intervals() == [(4, 6)]
+    assert allocator.allocate_block(3) == 4
+    with pytest.raises(ValueError):
+        allocator.allocate_block(1)
+
+
+def test_allocator_matches_a_plain_set_under_random_operations():
+    rng = random.Random(5)
+    used = set(rng.sample(range(1, 2001), 1000))
+    allocator = IdAllocator(1, 2000, used=used, rng=random.Random(3))
+    free = set(range(1, 2001)) - used
+
+    for _ in range(5000):
+        value, roll = rng.randint(1, 2000), rng.random()
+        if roll < 0.4 and free:
+            value = allocator.allocate()
+            assert value in free
+            free.discard(value)
+        elif roll < 0.8:
+            allocator.release(value)
+            free.add(value)
+        elif roll < 0.9:
+            assert allocator.reserve(value) == (value in free)
+            free.discard(value)
+        else:
+            long_enough = [start for start, end in allocator.free_intervals() if end - start >= 2]
+            if not long_enough:
+                continue
+            start = allocator.allocate_block(3)
+            # The lowest run that is long enough
+            assert start == long_enough[0]
+            assert {start, start + 1, start + 2} <= free
+            free -= {start, start + 1, start + 2}
+
+    assert allocator.free_count == len(free)
+    assert sorted(free) == [value for start, end in allocator.free_intervals() for value in range(start, end + 1)]
+
+
+def test_generator_respects_ranges_and_cross_kind_uniqueness():
+    generator = IDGenerator({100, 200}, carcols_range=(100, 102), modkit_range=(100, 300))
+
+    carcols_ids = generator.generate_carcols_ids(2)
+
+    assert sorted(carcols_ids) == [101, 102]
+    assert not generator.modkit_ids.is_free(101)
+    assert generator.generate_modkit_id() not in {100, 101, 102, 200}
+
+
+def test_compaction_renumbers_into_dense_block(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=4, siren_base=500, kit_base=7000)
+    resolver = ConflictResolver(str(carcols), str(carvariations), carcols_range=(1, 255))
+
+    resolver.compact_ids('carcols')
+    resolver.compact_ids('modkit')
+
+    assert sorted(int(value) for value in resolver.siren_id_index) == [1, 2, 3, 4]
+    assert sorted(resolver.siren_settings_index) == sorted(resolver.siren_id_index)
+    assert sorted(name.split('_')[0] for name in resolver._modkit_names()) == ['10', '11', '12', '13']
+
+
+def test_compaction_keeps_ids_the_other_kind_still_uses(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=4, siren_base=500, kit_base=502)
+    resolver = ConflictResolver(str(carcols), str(carvariations), carcols_range=(1, 255))
+
+    resolver.compact_ids('carcols')
+
+    # 500 and 501 were only siren IDs; 502 and 503 are modkit IDs too
+    assert [resolver.id_generator.validate_id_availability(value) for value in range(500, 504)] == [
+        True, True, False, False
+    ]
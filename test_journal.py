@@ -0,0 +1,87 @@
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+from meta_tool.cli import cli
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.journal import JournalStore, apply_journal
+from meta_tool.session import ResolverSession
+from meta_tool.synthetic import write_meta_pair
+
+
+def resolve(directory, store):
+    carcols, carvariations = directory / 'carcols.meta', directory / 'carvariations.meta'
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+    resolver.file_handler.backup_root = str(store)
+    with ResolverSession(resolver) as session:
+        session.resolve_carcols()
+        session.resolve_modkits()
+    return session
+
+
+def read_pair(directory):
+    return [(directory / name).read_bytes() for name in ('carcols.meta', 'carvariations.meta')]
+
+
+def test_undo_restores_the_files_and_replay_repeats_the_run_on_a_copy(tmp_path):
+    write_meta_pair(tmp_path / 'dev' / 'cars', vehicles=4)
+    shutil.copytree(tmp_path / 'dev', tmp_path / 'prod')
+    original = read_pair(tmp_path / 'dev' / 'cars')
+
+    session = resolve(tmp_path / 'dev' / 'cars', tmp_path / 'backups')
+    resolved = read_pair(tmp_path / 'dev' / 'cars')
+    store = JournalStore(str(tmp_path / 'backups'))
+    journal = store.get()
+    assert journal.id == session.journal_id
+    assert len(journal) == 4 * 5  # siren ID, sirenSettings, kitName, modkit ID, kit reference per vehicle
+
+    # Same bytes as when the run started: patched from the recorded spans
+    applied = apply_journal(journal, root=str(tmp_path / 'prod' / 'cars'))
+    assert read_pair(tmp_path / 'prod' / 'cars') == resolved
+    assert all(change.span for entry in applied.files for change in entry.changes)
+
+    undone = apply_journal(journal, reverse=True)
+    store.record(undone)
+    assert read_pair(tmp_path / 'dev' / 'cars') == original
+    with pytest.raises(ValueError, match='No change journal left'):
+        store.get()
+
+    # Undoing the undo redoes the run
+    apply_journal(undone, reverse=True)
+    assert read_pair(tmp_path / 'dev' / 'cars') == resolved
+
+
+def test_replay_on_a_reformatted_copy_locates_values_by_element_path(tmp_path):
+    write_meta_pair(tmp_path / 'dev', vehicles=3)
+    prod = tmp_path / 'prod'
+    write_meta_pair(prod, vehicles=3)
+    carcols = prod / 'carcols.meta'
+    carcols.write_text(carcols.read_text().replace('<Kits>', '<!-- production -->\n  <Kits>'))
+
+    resolve(tmp_path / 'dev', tmp_path / 'backups')
+    journal = JournalStore(str(tmp_path / 'backups')).get()
+
+    apply_journal(journal, root=str(prod))
+    assert carcols.read_text().count('<!-- production -->') == 1
+    assert (prod / 'carvariations.meta').read_bytes() == (tmp_path / 'dev' / 'carvariations.meta').read_bytes()
+
+    # A value that differs from the journal's aborts the whole replay
+    third = tmp_path / 'third'
+    write_meta_pair(third, vehicles=3, siren_base=20000)
+    before = read_pair(third)
+    with pytest.raises(ValueError, match='expected'):
+        apply_journal(journal, root=str(third))
+    assert read_pair(third) == before
+
+
+def test_undo_command(tmp_path):
+    write_meta_pair(tmp_path / 'cars', vehicles=2)
+    original = read_pair(tmp_path / 'cars')
+    resolve(tmp_path / 'cars', tmp_path / 'backups')
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ['undo', '--store', str(tmp_path / 'backups')])
+    assert result.exit_code == 0, result.output
+    assert read_pair(tmp_path / 'cars') == original
+    assert 'undoes' in runner.invoke(cli, ['history', '--store', str(tmp_path / 'backups')]).output
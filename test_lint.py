@@ -0,0 +1,66 @@
+import json
+
+from click.testing import CliRunner
+
+from meta_tool.cli import cli
+from meta_tool.lint import LintRule, lint_file, lint_paths
+from meta_tool.synthetic import write_meta_pair
+
+
+def break_pair(carcols, carvariations):
+    carcols.write_text(carcols.read_text()
+                       .replace('<kitName>101_synth1_modkit', '<kitName>synth1modkit')
+                       .replace('<id value="10002"/>', '<id value="10001"/>')
+                       .replace('<sequencerBpm value="600"/>', '<sequencerBpm value="0"/>', 1))
+    carvariations.write_text(carvariations.read_text()
+                             .replace('<sirenSettings value="10000"/>', '<sirenSettings value="77777"/>'))
+
+
+def test_rules_find_broken_values_and_references(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path / 'cars', vehicles=3)
+    assert not lint_paths([str(tmp_path)], jobs=1).issues
+    break_pair(carcols, carvariations)
+
+    report = lint_paths([str(tmp_path)], jobs=2)
+
+    found = sorted((issue.path.rsplit('/', 1)[-1], issue.rule, issue.severity) for issue in report.issues)
+    assert found == [
+        ('carcols.meta', 'duplicate-id', 'error'),
+        ('carcols.meta', 'kit-name', 'error'),
+        ('carcols.meta', 'sequencer-range', 'error'),
+        ('carvariations.meta', 'missing-kit', 'warning'),
+        ('carvariations.meta', 'missing-siren', 'error'),
+        # Siren 10002 was renumbered to 10001 above
+        ('carvariations.meta', 'missing-siren', 'error'),
+    ]
+    assert all(issue.line for issue in report.issues)
+
+
+def test_custom_rule_and_syntax_errors(tmp_path):
+    carcols, _ = write_meta_pair(tmp_path, vehicles=2)
+
+    class CountSirens(LintRule):
+        name = 'count-sirens'
+        severity = 'warning'
+        paths = ('Sirens/Item',)
+
+        def element(self, elem, context):
+            context.report(self, elem, elem.findtext('name'))
+
+    assert [issue.message for issue in lint_file(str(carcols), [CountSirens]).issues] == ['synth0', 'synth1']
+
+    carcols.write_text('<CVehicleModelInfoVarGlobal><Kits>')
+    assert [issue.rule for issue in lint_file(str(carcols)).issues] == ['xml-syntax']
+
+
+def test_lint_command_exits_non_zero_on_errors(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=2)
+    runner = CliRunner()
+    assert runner.invoke(cli, ['lint', str(tmp_path)]).exit_code == 0
+
+    break_pair(carcols, carvariations)
+    result = runner.invoke(cli, ['lint', str(tmp_path), '--json', '--disable', 'missing-kit'])
+    assert result.exit_code == 1
+    assert {issue['rule'] for issue in json.loads(result.output)['issues']} == {
+        'kit-name', 'sequencer-range', 'missing-siren',
+    }
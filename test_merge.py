@@ -0,0 +1,35 @@
+from collections import Counter
+
+from meta_tool.meta_file_handler import MetaFileHandler
+from meta_tool.merge import merge_resources
+from meta_tool.synthetic import write_meta_pair
+
+
+def test_merge_renumbers_collisions_and_keeps_references(tmp_path):
+    resources = tmp_path / 'resources'
+    for n in range(3):
+        resource = resources / f'pack{n}'
+        resource.mkdir(parents=True)
+        (resource / 'fxmanifest.lua').write_text("fx_version 'cerulean'\n")
+        # Every resource uses the same siren IDs and kits
+        write_meta_pair(resource, vehicles=4)
+
+    result = merge_resources([str(resources)], str(tmp_path / 'out'), jobs=1)
+
+    assert [resource.name for resource in result.resources] == ['pack0', 'pack1', 'pack2']
+    assert result.resources[0].sirens == {} and result.resources[0].kits == {}
+    assert len(result.resources[2].sirens) == 4 and len(result.resources[2].kits) == 4
+    assert result.items == {'Kits': 12, 'Sirens': 12, 'variationData': 12}
+    assert set(result.duplicate_models['synth0']) == {'pack0', 'pack1', 'pack2'}
+
+    handler = MetaFileHandler(cache_dir=None)
+    carcols = handler.load_identity(str(tmp_path / 'out' / 'carcols.meta'))
+    variations = handler.load_identity(str(tmp_path / 'out' / 'carvariations.meta'))
+    assert max(Counter(carcols.siren_ids).values()) == 1
+    assert max(Counter(carcols.kit_names).values()) == 1
+    assert set(carcols.modkit_ids).isdisjoint(carcols.siren_ids)
+    # Every reference points at a definition in the merged pack
+    assert set(variations.siren_refs) == set(carcols.siren_ids)
+    assert set(variations.kit_refs) == set(carcols.kit_names)
+    for kit_name, kit_id in zip(carcols.kit_names, carcols.modkit_ids):
+        assert kit_name.split('_')[0] == str(kit_id)
@@ -0,0 +1,81 @@
+from pathlib import Path
+
+from meta_tool.identity import extract_identity
+from meta_tool.meta_file_handler import MetaFileHandler, SourceMap
+from meta_tool.synthetic import write_meta_pair
+
+ATTACHMENTS = Path(__file__).parent / 'attachments'
+
+
+def _summary(identity):
+    return [(node.kind, node.value, node.item, node.line) for node in identity.nodes]
+
+
+def test_streaming_identity_matches_full_parse():
+    handler = MetaFileHandler()
+    for name in ('carcols.meta', 'carvariations.meta'):
+        path = str(ATTACHMENTS / name)
+        root, _ = handler.load_meta_file(path)
+
+        streamed = handler.load_identity(path)
+
+        assert _summary(streamed) == _summary(extract_identity(root, path))
+        assert streamed.root_tag == root.tag
+
+
+def test_streaming_identity_spans_point_at_values(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=3)
+    handler = MetaFileHandler()
+
+    for path in (carcols, carvariations):
+        data = path.read_bytes()
+        identity = handler.load_identity(str(path))
+        assert identity.nodes
+        for node in identity.nodes:
+            start, end = node.span
+            assert data[start:end].decode() == node.value
+
+
+def test_source_map_handles_several_elements_per_line():
+    data = b'<a>\n<id value="1"/><id value="22"/>\n<kitName> 5_x_modkit </kitName>\n</a>'
+    source = SourceMap(data)
+
+    assert data[slice(*source.locate(2, 'id', 1, attribute=True))] == b'22'
+    assert data[slice(*source.locate(3, 'kitName'))] == b'5_x_modkit'
+    assert source.locate(2, 'id', 2, attribute=True) is None
+
+
+def test_patch_writer_only_touches_changed_values(tmp_path):
+    path = tmp_path / 'carcols.meta'
+    original = (
+        '<?xml version="1.0" encoding="UTF-8"?>\r\n'
+        '<CVehicleModelInfoVarGlobal>\r\n'
+        '  <!-- keep me -->\r\n'
+        '  <Sirens>\r\n'
+        '    <Item>\r\n'
+        '      <id   value="123"/>\r\n'
+        '    </Item>\r\n'
+        '  </Sirens>\r\n'
+        '</CVehicleModelInfoVarGlobal>\r\n'
+    )
+    path.write_bytes(original.encode())
+    handler = MetaFileHandler()
+    root, _ = handler.load_meta_file(str(path))
+    id_elem = root.find('Sirens/Item/id')
+    id_elem.attrib['value'] = '45678'
+
+    assert handler.save_changes(str(path), root, {id_elem: ('123', True)})
+    assert path.read_bytes() == original.replace('"123"', '"45678"').encode()
+
+
+def test_patch_writer_falls_back_when_ambiguous(tmp_path):
+    path = tmp_path / 'carcols.meta'
+    path.write_text('<CVehicleModelInfoVarGlobal><Sirens><Item><id value="1"/></Item>'
+                    '<Item><id value="2"/></Item></Sirens></CVehicleModelInfoVarGlobal>')
+    handler = MetaFileHandler()
+    root, _ = handler.load_meta_file(str(path))
+    id_elem = root.findall('Sirens/Item/id')[1]
+    id_elem.attrib['value'] = '3'
+
+    assert not handler.save_changes(str(path), root, {id_elem: ('2', True)})
+    assert [e.attrib['value'] for e in handler.load_meta_file(str(path))[0].iter('id')] == ['1', '3']
@@ -0,0 +1,53 @@
+import json
+
+from click.testing import CliRunner
+
+from meta_tool.cli import cli
+from meta_tool.metrics import Metrics
+from meta_tool.synthetic import write_meta_pair
+
+
+def test_spans_aggregate_time_counts_and_nested_memory_peaks():
+    metrics = Metrics()
+    with metrics.span('off') as span:
+        span.add(items=1)
+    assert metrics.stages() == []
+
+    metrics.enable(memory=True)
+    try:
+        for _ in range(2):
+            with metrics.span('outer') as span:
+                with metrics.span('inner'):
+                    block = bytearray(1 << 20)
+                del block
+                span.add(items=3)
+    finally:
+        metrics.disable()
+
+    outer, inner = metrics.stages()
+    assert (outer.name, outer.calls, outer.counts) == ('outer', 2, {'items': 6})
+    assert outer.seconds >= inner.seconds
+    # The inner allocation counts towards both peaks
+    assert inner.peak_bytes >= 1 << 20
+    assert outer.peak_bytes >= inner.peak_bytes
+    assert metrics.report()['stages'][0]['items'] == 6
+
+
+def test_cli_writes_stage_metrics_and_profile(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=3)
+    metrics_path = tmp_path / 'metrics.json'
+    profile_path = tmp_path / 'run.prof'
+
+    result = CliRunner().invoke(cli, [
+        '--metrics-json', str(metrics_path), '--profile', str(profile_path),
+        'resolve-all', str(carcols), str(carvariations),
+    ])
+
+    assert result.exit_code == 0, result.output
+    report = json.loads(metrics_path.read_text())
+    stages = {stage['name']: stage for stage in report['stages']}
+    assert report['command'] == 'resolve-all'
+    assert stages['handler.parse']['files'] == 2
+    assert stages['resolver.plan']['calls'] == 2
+    assert {'resolver.collect_ids', 'ids.allocate', 'resolver.save', 'handler.backup'} <= set(stages)
+    assert profile_path.stat().st_size > 0
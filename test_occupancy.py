@@ -0,0 +1,54 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+from meta_tool import occupancy
+from meta_tool.cli import cli
+from meta_tool.occupancy import IdOccupancy, conflict_matrix
+from meta_tool.synthetic import write_meta_pair
+
+
+@pytest.fixture(params=['numpy', 'int'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(occupancy, 'np', None)
+    return request.param
+
+
+def test_set_operations_and_free_runs(backend):
+    first = IdOccupancy([1, 2, 3, 10, 11, 12, 13, 2000000])
+    second = IdOccupancy([3, 12, 50, 2000000])
+
+    assert (first | second).values() == [1, 2, 3, 10, 11, 12, 13, 50, 2000000]
+    assert (first & second).values() == [3, 12, 2000000]
+    assert len(first) == 8 and 12 in first and 4 not in first and 2000000 in second
+
+    assert first.first_free_run(1) == 0
+    assert first.first_free_run(5, low=1) == 4
+    assert first.first_free_run(3, low=10, high=16) == 14
+    assert first.first_free_run(4, low=10, high=16) is None
+
+
+def test_conflict_matrix_counts_shared_ids_per_pair(backend):
+    matrix = conflict_matrix({
+        'a': IdOccupancy([3, 12, 40]),
+        'b': IdOccupancy([3, 12, 50]),
+        'c': IdOccupancy([12, 99]),
+        'd': IdOccupancy([7]),
+    })
+
+    assert matrix.counts[0] == [2, 2, 1, 0]
+    assert list(matrix.pairs()) == [('a', 'b', 2), ('a', 'c', 1), ('b', 'c', 1)]
+
+
+def test_check_matrix_lists_resources_sharing_ids(tmp_path):
+    resources = tmp_path / 'resources'
+    write_meta_pair(resources / 'a', vehicles=3)
+    write_meta_pair(resources / 'b', vehicles=3, siren_base=10001, kit_base=500)
+
+    result = CliRunner().invoke(cli, ['check', str(resources), '--matrix', '--json'])
+
+    assert json.loads(result.output)['shared']['siren_ids'] == [['a', 'b', 2]]
@@ -37,5 +37,5 @@ def analyze_meta_file(file_path, max_elements=5):
         print(f"Error processing {file_path}: {str(e)}")
 
 if __name__ == "__main__":
-    analyze_meta_file("~/attachments/carcols.meta")
-    analyze_meta_file("~/attachments/carvariations.meta")
+    analyze_meta_file(Path(__file__).resolve().parent / "attachments" / "carcols.meta")
+    analyze_meta_file(Path(__file__).resolve().parent / "attachments" / "carvariations.meta")
@@ -0,0 +1,57 @@
+import os
+
+from meta_tool.id_generator import IDGenerator
+from meta_tool.registry import IDRegistry
+from meta_tool.synthetic import write_meta_pair
+
+
+def test_refresh_is_incremental(tmp_path):
+    resources = tmp_path / 'resources'
+    write_meta_pair(resources / 'a', vehicles=2)
+    carcols_b, _ = write_meta_pair(resources / 'b', vehicles=2, siren_base=20000, kit_base=500)
+
+    with IDRegistry(str(tmp_path / 'ids.db')) as registry:
+        assert registry.refresh(str(resources))['added'] == 4
+        assert registry.refresh(str(resources))['unchanged'] == 4
+
+        # Touching a file without changing it does not trigger a reparse
+        os.utime(carcols_b, ns=(0, 0))
+        stats = registry.refresh(str(resources))
+        assert stats['unchanged'] == 4 and stats['updated'] == 0
+
+        carcols_b.write_text(carcols_b.read_text().replace('20001', '30001'))
+        assert registry.refresh(str(resources))['updated'] == 1
+        assert 30001 in registry.used_ids()
+        assert 20001 not in registry.used_ids()
+        assert registry.owners('siren_ids', 30001) == [('b', str(carcols_b.resolve()))]
+
+        (resources / 'a' / 'carcols.meta').unlink()
+        assert registry.refresh(str(resources))['removed'] == 1
+        assert 10000 not in registry.used_ids()
+
+
+def test_generator_avoids_registry_ids(tmp_path):
+    write_meta_pair(tmp_path / 'resources' / 'a', vehicles=3)
+
+    with IDRegistry(str(tmp_path / 'ids.db')) as registry:
+        registry.refresh(str(tmp_path / 'resources'))
+        generator = IDGenerator(registry=registry)
+
+    assert {10000, 10001, 10002, 100, 101, 102} <= generator.existing_ids
+    assert not generator.validate_id_availability(10001)
+
+
+def test_same_size_edit_with_mtime_kept_is_reparsed(tmp_path):
+    resources = tmp_path / 'resources'
+    carcols, _ = write_meta_pair(resources / 'a', vehicles=2)
+
+    with IDRegistry(str(tmp_path / 'ids.db')) as registry:
+        registry.refresh(str(resources))
+        stat = carcols.stat()
+        carcols.write_text(carcols.read_text().replace('10001', '10009'))
+        os.utime(carcols, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert carcols.stat().st_size == stat.st_size
+
+        assert registry.refresh(str(resources))['updated'] == 1
+        assert 10009 in registry.used_ids()
+        assert 10001 not in registry.used_ids()
@@ -0,0 +1,58 @@
+from meta_tool.scanner import discover_meta_files, parse_manifest, scan_resources
+from meta_tool.synthetic import write_meta_pair
+from meta_tool.transaction import LOCK_NAME, FileTransaction
+
+
+def _make_resource(directory, manifest=''):
+    directory.mkdir(parents=True)
+    (directory / 'fxmanifest.lua').write_text(manifest)
+    return directory
+
+
+def test_parse_manifest_supports_both_call_styles(tmp_path):
+    manifest = tmp_path / 'fxmanifest.lua'
+    manifest.write_text(
+        "data_file 'CARCOLS_FILE' 'data/carcols.meta'\n"
+        'data_file("VEHICLE_VARIATION_FILE")("data/carvariations.meta")\n'
+        "data_file 'HANDLING_FILE' 'data/handling.meta'\n"
+    )
+
+    assert parse_manifest(manifest) == [
+        ('CARCOLS_FILE', 'data/carcols.meta'),
+        ('VEHICLE_VARIATION_FILE', 'data/carvariations.meta'),
+    ]
+
+
+def test_discover_uses_names_and_manifest_entries(tmp_path):
+    police = _make_resource(tmp_path / '[cars]' / 'police', "data_file 'CARCOLS_FILE' 'stream/sirens.xml'\n")
+    write_meta_pair(police / 'data', vehicles=1)
+    (police / 'stream').mkdir()
+    (police / 'stream' / 'sirens.xml').write_text('<CVehicleModelInfoVarGlobal/>')
+
+    found = discover_meta_files(str(tmp_path))
+
+    assert [path.name for path in found['[cars]/police']] == ['carcols.meta', 'carvariations.meta', 'sirens.xml']
+
+
+def test_discover_skips_the_tools_own_files(tmp_path):
+    police = _make_resource(tmp_path / 'police', "data_file 'CARCOLS_FILE' '*.*'\n")
+    carcols, _ = write_meta_pair(police, vehicles=1)
+    with FileTransaction([carcols]) as transaction:
+        transaction.write(carcols, lambda f: f.write(carcols.read_bytes()))
+
+    found = discover_meta_files(str(tmp_path))
+
+    assert (police / LOCK_NAME).exists()
+    assert [path.name for path in found['police']] == ['carcols.meta', 'carvariations.meta', 'fxmanifest.lua']
+
+
+def test_scan_reports_cross_resource_duplicates(tmp_path):
+    write_meta_pair(_make_resource(tmp_path / 'a'), vehicles=3)
+    write_meta_pair(_make_resource(tmp_path / 'b'), vehicles=2, siren_base=10002, kit_base=500)
+
+    report = scan_resources(str(tmp_path), jobs=2)
+
+    assert not report.errors
+    assert report.duplicates('siren_ids') == {10002: ['a', 'b']}
+    assert report.duplicates('modkit_ids') == {}
+    assert report.duplicates('kit_names') == {}
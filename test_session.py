@@ -0,0 +1,41 @@
+from meta_tool.backup_store import BackupStore
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.session import ResolverSession
+from meta_tool.synthetic import write_meta_pair
+
+
+def test_session_writes_each_file_once(tmp_path, monkeypatch):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=5)
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+    resolver.file_handler.backup_root = str(tmp_path / 'backups')
+    writes = []
+    save_changes = resolver.file_handler.save_changes
+    monkeypatch.setattr(resolver.file_handler, 'save_changes',
+                        lambda path, *args: writes.append(path) or save_changes(path, *args))
+
+    with ResolverSession(resolver) as session:
+        session.resolve_carcols()
+        session.resolve_modkits()
+        assert writes == []
+
+    assert sorted(writes) == sorted([str(carcols), str(carvariations)])
+    assert len(session.changes['carcols']) == 10
+    assert [s['id'] for s in BackupStore(str(tmp_path / 'backups')).list_snapshots()] == [session.snapshot_id]
+
+
+def test_session_rollback_leaves_files_untouched(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=3)
+    before = carcols.read_bytes()
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+
+    try:
+        with ResolverSession(resolver, backup=False) as session:
+            session.resolve_carcols()
+            raise RuntimeError("stop")
+    except RuntimeError:
+        pass
+
+    assert carcols.read_bytes() == before
+    assert ConflictResolver(str(carcols), str(carvariations)).siren_id_index.keys() == {
+        str(10000 + n) for n in range(3)
+    }
@@ -0,0 +1,78 @@
+import filecmp
+import shutil
+from collections import Counter
+from pathlib import Path
+
+from lxml import etree
+
+from meta_tool.split import split_meta_files, update_manifest
+from meta_tool.synthetic import write_meta_pair
+
+ATTACHMENTS = Path(__file__).parent / 'attachments'
+
+
+def section_items(paths):
+    counts = Counter()
+    for path in paths:
+        for section in etree.parse(str(path)).getroot():
+            counts[section.tag] += len(section)
+    return counts
+
+
+def test_split_defines_every_item_once_and_updates_manifest(tmp_path):
+    for name in ('carcols.meta', 'carvariations.meta'):
+        shutil.copyfile(ATTACHMENTS / name, tmp_path / name)
+    manifest = tmp_path / 'fxmanifest.lua'
+    manifest.write_text("fx_version 'cerulean'\n"
+                        "data_file 'CARCOLS_FILE' 'carcols.meta'\n"
+                        "data_file 'VEHICLE_VARIATION_FILE' 'carvariations.meta'\n"
+                        "files { 'data/**/*.meta' }\n")
+
+    result = split_meta_files(str(tmp_path / 'carcols.meta'), str(tmp_path / 'carvariations.meta'),
+                              str(tmp_path / 'data'), jobs=1)
+
+    assert result.vehicles == 48
+    written = [path for _, path in result.files]
+    originals = section_items([tmp_path / 'carcols.meta', tmp_path / 'carvariations.meta'])
+    assert section_items(written) == originals
+    # 24valor18sedan2 uses the kit of 24valor18sedan, so that kit is shared
+    own = etree.parse(str(tmp_path / 'data' / '24valor18sedan2' / 'carvariations.meta')).getroot()
+    assert own.findtext('variationData/Item/modelName') == '24valor18sedan2'
+    assert result.shared_items['Kits'] > 0
+
+    lines = result.data_files(tmp_path)
+    assert lines[0] == "data_file 'CARCOLS_FILE' 'data/_shared/carcols.meta'"
+    assert update_manifest(str(manifest), [str(tmp_path / 'carcols.meta'), str(tmp_path / 'carvariations.meta')],
+                           lines) == 2
+    text = manifest.read_text().splitlines()
+    assert text[1:1 + len(lines)] == lines
+    assert text[-1] == "files { 'data/**/*.meta' }"
+
+
+def test_split_in_worker_processes_matches_in_process(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=120)
+    split_meta_files(str(carcols), str(carvariations), str(tmp_path / 'serial'), jobs=1)
+    split_meta_files(str(carcols), str(carvariations), str(tmp_path / 'parallel'), jobs=2)
+
+    comparison = filecmp.dircmp(str(tmp_path / 'serial'), str(tmp_path / 'parallel'))
+    # Synthetic vehicles share nothing, so there is no _shared fragment
+    assert len(comparison.common_dirs) == 120
+    assert not comparison.left_only and not comparison.right_only
+    assert all(not filecmp.dircmp(str(tmp_path / 'serial' / d), str(tmp_path / 'parallel' / d)).diff_files
+               for d in comparison.common_dirs)
+
+
+def test_vehicles_with_colliding_directory_names_keep_their_own_fragments(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=3)
+    for path in (carcols, carvariations):
+        text = path.read_text()
+        for old, new in (('synth0', 'car 1'), ('synth1', 'car_1'), ('synth2', '_shared')):
+            text = text.replace(old, new)
+        path.write_text(text)
+
+    result = split_meta_files(str(carcols), str(carvariations), str(tmp_path / 'data'), jobs=1)
+
+    written = [path for _, path in result.files]
+    assert len(written) == len(set(written)) == 6
+    assert section_items(written) == section_items([carcols, carvariations])
+    assert sorted(path.name for path in (tmp_path / 'data').iterdir()) == ['_shared-2', 'car_1', 'car_1-2']
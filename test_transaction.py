@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from meta_tool import transaction as transaction_module
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.synthetic import write_meta_pair
+from meta_tool.transaction import FileTransaction, ResourceLock
+
+
+def fail_second_replace(monkeypatch):
+    replace = os.replace
+    calls = []
+
+    def flaky(source, target):
+        calls.append(target)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        replace(source, target)
+
+    monkeypatch.setattr(transaction_module.os, 'replace', flaky)
+
+
+def test_failed_commit_leaves_every_file_unchanged(tmp_path, monkeypatch):
+    first, second = tmp_path / 'carcols.meta', tmp_path / 'carvariations.meta'
+    first.write_bytes(b'old 1')
+    second.write_bytes(b'old 2')
+    fail_second_replace(monkeypatch)
+
+    with pytest.raises(OSError):
+        with FileTransaction([first, second]) as transaction:
+            transaction.write(str(first), lambda f: f.write(b'new 1'))
+            transaction.write(str(second), lambda f: f.write(b'new 2'))
+
+    assert (first.read_bytes(), second.read_bytes()) == (b'old 1', b'old 2')
+    assert sorted(os.listdir(tmp_path)) == ['.meta_tool.lock', 'carcols.meta', 'carvariations.meta']
+
+
+def test_next_transaction_rolls_back_a_crashed_one(tmp_path):
+    first, second = tmp_path / 'carcols.meta', tmp_path / 'carvariations.meta'
+    first.write_bytes(b'old 1')
+    second.write_bytes(b'old 2')
+    # The process dies between the two renames
+    crash = f"""
+import os
+from meta_tool.transaction import FileTransaction
+replace = os.replace
+def crash(source, target):
+    if target.endswith('carvariations.meta'):
+        os._exit(3)
+    replace(source, target)
+os.replace = crash
+with FileTransaction([{str(first)!r}, {str(second)!r}]) as transaction:
+    transaction.write({str(first)!r}, lambda f: f.write(b'new 1'))
+    transaction.write({str(second)!r}, lambda f: f.write(b'new 2'))
+"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, '-c', crash], env=env).returncode == 3
+    assert first.read_bytes() == b'new 1'
+
+    with FileTransaction([first]):
+        pass
+    assert (first.read_bytes(), second.read_bytes()) == (b'old 1', b'old 2')
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(('.orig', '.journal'))]
+
+
+def test_resource_lock_and_concurrent_change_are_detected(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=2)
+    (tmp_path / 'fxmanifest.lua').write_text("fx_version 'cerulean'\n")
+
+    with ResourceLock(tmp_path):
+        with pytest.raises(ValueError, match='locked'):
+            with FileTransaction([carcols], timeout=0.1):
+                pass
+
+    resolver = ConflictResolver(str(carcols), str(carvariations))
+    resolver.autosave = False
+    resolver.resolve_carcols_conflicts()
+    carvariations.write_text(carvariations.read_text() + '\n')
+    with pytest.raises(ValueError, match='changed on disk'):
+        resolver.save()
@@ -0,0 +1,41 @@
+import pytest
+
+from meta_tool.conflict_resolver import ConflictResolver
+from meta_tool.synthetic import write_meta_pair
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    carcols, carvariations = write_meta_pair(tmp_path, vehicles=12)
+    return ConflictResolver(str(carcols), str(carvariations))
+
+
+def test_select_by_exact_name_prefix_and_glob(resolver):
+    index = resolver.vehicle_index
+    assert len(index) == 12
+    assert index.get('SYNTH1').siren_ids() == ['10001']
+    assert index.get('synth1').kit_names() == ['101_synth1_modkit']
+
+    def names(patterns, match='exact'):
+        return [entry.name for entry in index.select(patterns, match)]
+
+    # "synth1" alone no longer matches synth10 and synth11
+    assert names(['synth1']) == ['synth1']
+    assert names(['synth1'], 'prefix') == ['synth1', 'synth10', 'synth11']
+    assert names(['synth?', 'synth1*', 'synth2']) == [f'synth{n}' for n in range(12)]
+    with pytest.raises(ValueError):
+        index.select(['valor'])
+
+
+def test_plans_cover_only_selected_vehicles(resolver):
+    carcols = resolver.plan_carcols_conflicts(['synth2', 'synth1*'])
+    assert sorted(carcols.mapping) == ['10001', '10002', '10010', '10011']
+    assert {change.vehicle for change in carcols.changes} == {'synth1', 'synth2', 'synth10', 'synth11'}
+
+    modkits = resolver.plan_modkit_conflicts('synth3')
+    assert list(modkits.mapping) == ['103_synth3_modkit']
+
+    resolver.apply_plan(modkits)
+    new_kit = f"{modkits.mapping['103_synth3_modkit']}_synth3_modkit"
+    # The index holds elements, so it follows the rename
+    assert resolver.vehicle_index.get('synth3').kit_names() == [new_kit]
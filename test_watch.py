@@ -0,0 +1,51 @@
+import os
+import threading
+
+from meta_tool.synthetic import write_meta_pair
+from meta_tool.watch import MetaWatcher
+
+
+def test_watcher_reports_new_and_resolved_conflicts(tmp_path):
+    write_meta_pair(tmp_path / 'a', vehicles=2)
+    carcols_b, _ = write_meta_pair(tmp_path / 'b', vehicles=2, siren_base=20000, kit_base=500)
+    watcher = MetaWatcher(str(tmp_path))
+    assert watcher.start(jobs=1) == []
+    assert watcher.poll() == set()
+
+    original = carcols_b.read_text()
+    carcols_b.write_text(original.replace('20001', '10001'))
+    os.utime(carcols_b, ns=(1, 1))
+    assert watcher.poll() == {str(carcols_b)}
+    batch = watcher.check([str(carcols_b)])
+    assert [(c.kind, c.value) for c in batch.new_conflicts] == [('siren_ids', '10001')]
+
+    carcols_b.unlink()
+    batch = watcher.check(watcher.poll())
+    assert batch.removed == [str(carcols_b)]
+    assert [(c.kind, c.value) for c in batch.resolved] == [('siren_ids', '10001')]
+
+
+def test_watch_debounces_a_burst_of_saves_into_one_batch(tmp_path):
+    carcols_a, carvariations_a = write_meta_pair(tmp_path / 'a', vehicles=2)
+    carcols_b, _ = write_meta_pair(tmp_path / 'b', vehicles=2, siren_base=20000, kit_base=500)
+    watcher = MetaWatcher(str(tmp_path), interval=0.005, quiet=0.1)
+    watcher.start(jobs=1)
+
+    stop = threading.Event()
+    batches = []
+
+    def collect():
+        for batch in watcher.watch(stop):
+            batches.append(batch)
+            stop.set()
+
+    thread = threading.Thread(target=collect)
+    thread.start()
+    for path, size in ((carcols_a, 1), (carvariations_a, 2), (carcols_b, 3)):
+        path.write_text(path.read_text())
+        os.utime(path, ns=(size, size))
+    thread.join(timeout=5)
+
+    assert len(batches) == 1
+    assert sorted(batches[0].changed) == sorted(map(str, (carcols_a, carvariations_a, carcols_b)))
+    assert batches[0].new_conflicts == []